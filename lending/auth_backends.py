@@ -2,27 +2,33 @@
 
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from lending.models import MemberProfile
+from lending.services.identifiers import resolve_users
 
 User = get_user_model()
 
 class EmailOrPhoneBackend(ModelBackend):
-    """Authenticate using email OR phone number and password."""
+    """
+    Authenticate using email, phone number or username and password.
+
+    The identifier is normalized and resolved through the LoginIdentifier
+    index in a single query, and the password is hashed once per candidate
+    user (twice only when a phone number is also someone's username), so no
+    fallback backend is needed.
+    """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
-        user = None
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
 
-        # Try email first
-        try:
-            user = User.objects.get(email=username)
-        except User.DoesNotExist:
-            # Try phone number from MemberProfile
-            try:
-                profile = MemberProfile.objects.get(phone_number=username)
-                user = profile.user
-            except MemberProfile.DoesNotExist:
-                return None
+        users = resolve_users(username)
+        if not users:
+            # Run the hasher once anyway so unknown identifiers take as long as wrong passwords
+            User().set_password(password)
+            return None
 
-        if user and user.check_password(password):
-            return user
+        for user in users:
+            if user.check_password(password) and self.user_can_authenticate(user):
+                return user
         return None
@@ -0,0 +1,35 @@
+# lending/checks.py
+"""Deployment checks (`manage.py check --deploy`) for settings the app relies on."""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Error(
+        "The default cache is local to each process.",
+        hint=(
+            "Set LENDING_CACHE_URL to a shared cache. Cached principals, member summaries and "
+            "workload counters are invalidated only in the process that made the change."
+        ),
+        id="lending.E001",
+    )]
+
+
+@register(Tags.security, deploy=True)
+def check_callback_secret(app_configs, **kwargs):
+    if getattr(settings, "LENDING_CALLBACK_SECRET", ""):
+        return []
+    return [Error(
+        "LENDING_CALLBACK_SECRET is empty, so every payment callback is refused.",
+        hint="Set it to the secret the payment provider signs callbacks with.",
+        id="lending.E002",
+    )]
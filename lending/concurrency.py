@@ -0,0 +1,76 @@
+# lending/concurrency.py
+"""
+Concurrent ORM reads for async views.
+
+Django's async ORM (afirst, acount, aaggregate, ...) runs every query of a
+request on the same thread and connection, so asyncio.gather over them
+still runs the queries one at a time. gather_queries instead runs each
+callable on a worker thread of its own. Each worker keeps its own database
+connection, so the database works on the queries at once and the page
+waits for its slowest query instead of the sum of all of them. Set
+CONN_MAX_AGE so the workers keep their connections between requests.
+
+Other connections can't see rows a transaction hasn't committed. So inside
+a transaction (the tests, ATOMIC_REQUESTS) the callables run one after
+another on the request's own connection. settings.LENDING_CONCURRENT_QUERIES
+= False does the same everywhere; that is the serial path the dashboard
+benchmark compares against.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+DEFAULT_THREADS = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "LENDING_QUERY_THREADS", DEFAULT_THREADS),
+                thread_name_prefix="lending-query",
+            )
+        return _executor
+
+
+def _run(query):
+    # what Django does around a request: drop connections past CONN_MAX_AGE or broken
+    close_old_connections()
+    try:
+        return query()
+    finally:
+        close_old_connections()
+
+
+def _serial(queries):
+    """Results of `queries` run on this connection, or None when they can run concurrently."""
+    if len(queries) > 1 and getattr(settings, "LENDING_CONCURRENT_QUERIES", True) and not connection.in_atomic_block:
+        return None
+    return [query() for query in queries]
+
+
+async def gather_queries(*queries):
+    """
+    Run the zero-argument callables `queries` (each doing its own ORM reads)
+    concurrently and return their results in order:
+
+        totals, recent = await gather_queries(
+            lambda: loans.aggregate(total=Sum("principal_amount")),
+            lambda: list(repayments[:5]),
+        )
+    """
+    results = await sync_to_async(_serial)(queries)
+    if results is not None:
+        return results
+    # a bounded pool of long-lived threads, so their connections can be reused
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(loop.run_in_executor(_pool(), _run, query) for query in queries))
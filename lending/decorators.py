@@ -30,25 +30,41 @@ def admin_required(view_func):
 
 # lending/decorators.py
 from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.shortcuts import redirect
 from django.contrib import messages
 
+from .principal import aget_principal, get_principal
+
 def role_required(role):
     """
     Generic decorator to ensure the logged in user has the given role.
+    The check uses the cached principal, which is left on `request.principal`
+    for the view's own scoping. Works on sync and async views.
     Usage: @role_required("MANAGER")
     """
+    def refuse(request, principal):
+        if principal is None:
+            return redirect("login")
+        if principal.role != role:
+            messages.error(request, "You are not authorized to access this page.")
+            # redirect to a safe page — adjust 'dashboard' if you use different names
+            return redirect("dashboard")
+        return None
+
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                principal = await aget_principal(request)
+                if principal is None or principal.role != role:
+                    return await sync_to_async(refuse)(request, principal)
+                return await view_func(request, *args, **kwargs)
+            return async_wrapper
+
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            if not request.user.is_authenticated:
-                return redirect("login")
-            # ensure user has `role` attribute
-            if not hasattr(request.user, "role") or request.user.role != role:
-                messages.error(request, "You are not authorized to access this page.")
-                # redirect to a safe page — adjust 'dashboard' if you use different names
-                return redirect("dashboard")
-            return view_func(request, *args, **kwargs)
+            return refuse(request, get_principal(request)) or view_func(request, *args, **kwargs)
         return wrapper
     return decorator
 
@@ -3,6 +3,7 @@ from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import get_user_model
 from .models import MemberProfile, Loan
 from .models import MemberProfile, Loan, LoanPolicy
+from .services.member_import import UsernameAllocator, base_username
 
 User = get_user_model()
 
@@ -77,14 +78,10 @@ class MemberRegistrationForm(forms.ModelForm):
     def save(self, commit=True):
         user = super().save(commit=False)
 
-        # Auto-generate username
-        base_username = (self.cleaned_data["first_name"] + self.cleaned_data["last_name"]).lower()
-        username = base_username
-        counter = 1
-        while User.objects.filter(username=username).exists():
-            username = f"{base_username}{counter}"
-            counter += 1
-        user.username = username
+        # Auto-generate username: the first free one of name, name1, name2, ... (one query)
+        user.username = UsernameAllocator().allocate(
+            base_username(self.cleaned_data["first_name"], self.cleaned_data["last_name"])
+        )
 
         user.set_password(self.cleaned_data["password1"])
         user.role = "MEMBER"
@@ -129,13 +126,16 @@ class LoanApplicationForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         self.member = kwargs.pop("member", None)
+        # callers holding the request principal pass the company id and skip the lookup
+        company_id = kwargs.pop("company_id", None)
         super().__init__(*args, **kwargs)
 
         if self.member:
-            office = getattr(self.member.user, "office", None)
-            company = office.company if office else None
-            if company:
-                self.fields["policy"].queryset = company.loan_policies.all()
+            if company_id is None:
+                office = getattr(self.member.user, "office", None)
+                company_id = office.company_id if office else None
+            if company_id:
+                self.fields["policy"].queryset = LoanPolicy.objects.filter(company_id=company_id)
             else:
                 self.fields["policy"].queryset = LoanPolicy.objects.none()
 
@@ -298,12 +298,12 @@ from .models import User, ManagerOfficerAssignment
 
 class AdminAssignOfficersForm(forms.Form):
     manager = forms.ModelChoiceField(
-        queryset=User.objects.filter(role="MANAGER"),
+        queryset=User.objects.filter(role="MANAGER").select_related("office"),  # office is in each label
         label="Select Manager",
         widget=forms.Select(attrs={"class": "form-select"})
     )
     officers = forms.ModelMultipleChoiceField(
-        queryset=User.objects.filter(role="OFFICER"),
+        queryset=User.objects.filter(role="OFFICER").select_related("office"),
         label="Assign Officers",
         widget=forms.SelectMultiple(attrs={"class": "form-select"})
     )
@@ -322,14 +322,25 @@ class AdminAssignOfficersForm(forms.Form):
 class LoanPolicyForm(forms.ModelForm):
     class Meta:
         model = LoanPolicy
-        fields = ["company", "name", "interest_rate", "min_amount", "max_amount", "max_term_months"]
+        fields = [
+            "company", "name", "interest_rate", "interest_method", "min_amount", "max_amount", "max_term_months",
+            "penalty_rate", "penalty_grace_days", "default_interest_rate",
+        ]
         widgets = {
             "company": forms.Select(attrs={"class": "form-select"}),
             "name": forms.TextInput(attrs={"class": "form-control"}),
             "interest_rate": forms.NumberInput(attrs={"class": "form-control", "step": "0.01"}),
+            "interest_method": forms.Select(attrs={"class": "form-select"}),
             "min_amount": forms.NumberInput(attrs={"class": "form-control"}),
             "max_amount": forms.NumberInput(attrs={"class": "form-control"}),
             "max_term_months": forms.NumberInput(attrs={"class": "form-control"}),
+            "penalty_rate": forms.NumberInput(attrs={"class": "form-control", "step": "0.01"}),
+            "penalty_grace_days": forms.NumberInput(attrs={"class": "form-control"}),
+            "default_interest_rate": forms.NumberInput(attrs={"class": "form-control", "step": "0.01"}),
+        }
+        labels = {
+            "penalty_rate": "Penalty (% a year of the amount overdue)",
+            "default_interest_rate": "Default interest (% a year of the balance, while past due)",
         }
 
 # lending/forms.py (append these classes)
@@ -338,6 +349,12 @@ from django import forms
 from .models import User, Loan
 
 class ManagerReportForm(forms.Form):
+    GROUP_BY_CHOICES = [
+        ("", "No grouping"),
+        ("officer", "By officer"),
+        ("month", "By month"),
+    ]
+
     start_date = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
     end_date = forms.DateField(required=False, widget=forms.DateInput(attrs={"type": "date"}))
     officer = forms.ModelChoiceField(
@@ -349,6 +366,80 @@ class ManagerReportForm(forms.Form):
         required=False,
         choices=[("", "All statuses")] + list(Loan.STATUS_CHOICES)
     )
+    group_by = forms.ChoiceField(required=False, choices=GROUP_BY_CHOICES)
+
+    def __init__(self, *args, **kwargs):
+        # office: limit the officer choices; officer: report is for one officer, drop the choice
+        office = kwargs.pop("office", None)
+        officer = kwargs.pop("officer", None)
+        super().__init__(*args, **kwargs)
+
+        if officer is not None:
+            del self.fields["officer"]
+            self.fields["group_by"].choices = [c for c in self.GROUP_BY_CHOICES if c[0] != "officer"]
+        elif office is not None:
+            self.fields["officer"].queryset = User.objects.filter(role="OFFICER", office=office)
+
+        for field in self.fields.values():
+            css = "form-select" if isinstance(field.widget, forms.Select) else "form-control"
+            field.widget.attrs.update({"class": css})
+
+class TrendForm(forms.Form):
+    """Date range and bucket size of a trend series (GET parameters of the trend endpoints)."""
+    INTERVAL_CHOICES = [
+        ("day", "Daily"),
+        ("week", "Weekly"),
+        ("month", "Monthly"),
+    ]
+
+    start_date = forms.DateField(required=False)
+    end_date = forms.DateField(required=False)
+    interval = forms.ChoiceField(required=False, choices=INTERVAL_CHOICES)
+    # narrower scopes, where the caller may see them
+    office = forms.IntegerField(required=False, min_value=1)
+    officer = forms.IntegerField(required=False, min_value=1)
+    policy = forms.IntegerField(required=False, min_value=1)
+
+    def clean(self):
+        cleaned = super().clean()
+        start, end = cleaned.get("start_date"), cleaned.get("end_date")
+        if start and end and start > end:
+            raise forms.ValidationError("start_date is after end_date.")
+        if len([name for name in ("office", "officer", "policy") if cleaned.get(name)]) > 1:
+            raise forms.ValidationError("Give one of office, officer or policy.")
+        return cleaned
+
+
+class BalanceAsOfForm(forms.Form):
+    """?as_of=YYYY-MM-DD on the loan pages: the balance at the end of that day."""
+    as_of = forms.DateField(required=False)
+
+    def day(self):
+        return self.cleaned_data["as_of"] if self.is_valid() else None
 
 class MemberSearchForm(forms.Form):
     q = forms.CharField(required=False, label="Search", widget=forms.TextInput(attrs={"placeholder": "name, email, national id"}))
+
+
+# -------------------------------
+# Bulk Member Import
+# -------------------------------
+class MemberImportForm(forms.Form):
+    file = forms.FileField(
+        label="Members file (CSV or XLSX)",
+        help_text="Columns: first_name, last_name, email, national_id, phone_number; optional middle_name, "
+                  "alternative_phone, address, date_of_birth (YYYY-MM-DD), password.",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,.xlsx"}),
+    )
+    office = forms.ModelChoiceField(
+        queryset=Office.objects.select_related("company"),
+        required=False,
+        empty_label="No office",
+        widget=forms.Select(attrs={"class": "form-select"}),
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data["file"]
+        if not upload.name.lower().endswith((".csv", ".xlsx")):
+            raise forms.ValidationError("Upload a .csv or .xlsx file.")
+        return upload
@@ -0,0 +1,37 @@
+# lending/management/commands/accrue_charges.py
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.services.accrual import DEFAULT_CHUNK_SIZE, accrue_charges, np
+
+
+class Command(BaseCommand):
+    help = (
+        "Nightly, after age_portfolio: charge loans in arrears their policy's late penalty and "
+        "default interest for the days since they were last charged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--as-of", help="Charge up to this day (YYYY-MM-DD), defaults to today")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options["as_of"]:
+            try:
+                as_of = datetime.date.fromisoformat(options["as_of"])
+            except ValueError:
+                raise CommandError("--as-of must be a date in YYYY-MM-DD format.")
+        if np is None:
+            self.stdout.write(self.style.WARNING(
+                "NumPy is not installed (see requirements.txt); computing the charges in a plain loop, "
+                "which is much slower on a large loan book."
+            ))
+
+        summary = accrue_charges(as_of=as_of, chunk_size=options["chunk_size"], log=lambda line: self.stdout.write(line))
+        self.stdout.write(self.style.SUCCESS(
+            f"Charged {summary['loans']} loans: {summary['penalties']} in penalties, "
+            f"{summary['interest']} in default interest."
+        ))
@@ -0,0 +1,26 @@
+# lending/management/commands/age_portfolio.py
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.services.aging import DEFAULT_CHUNK_SIZE, age_portfolio
+
+
+class Command(BaseCommand):
+    help = "Nightly arrears sweep: recompute days past due and PAR buckets for every disbursed loan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--as-of", help="Aging date (YYYY-MM-DD), defaults to today")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options["as_of"]:
+            try:
+                as_of = datetime.date.fromisoformat(options["as_of"])
+            except ValueError:
+                raise CommandError("--as-of must be a date in YYYY-MM-DD format.")
+
+        total = age_portfolio(as_of=as_of, chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Aged {total} disbursed loans."))
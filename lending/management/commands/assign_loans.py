@@ -0,0 +1,16 @@
+# lending/management/commands/assign_loans.py
+
+from django.core.management.base import BaseCommand
+
+from lending.services.assignment import assign_unassigned_loans
+
+
+class Command(BaseCommand):
+    help = (
+        "Give every pending or approved loan without an officer to an officer of the "
+        "member's office, using LENDING_ASSIGNMENT_STRATEGY."
+    )
+
+    def handle(self, *args, **options):
+        assigned = assign_unassigned_loans()
+        self.stdout.write(self.style.SUCCESS(f"Assigned {assigned} loans."))
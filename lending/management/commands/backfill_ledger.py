@@ -0,0 +1,16 @@
+# lending/management/commands/backfill_ledger.py
+
+from django.core.management.base import BaseCommand
+
+from lending.services.ledger import DEFAULT_CHUNK_SIZE, backfill_ledger
+
+
+class Command(BaseCommand):
+    help = "Journal the loans that have no ledger entries yet (disbursement, interest, repayments). Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        written = backfill_ledger(chunk_size=options["chunk_size"], log=lambda line: self.stdout.write(line))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} journal entries."))
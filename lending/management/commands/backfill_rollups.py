@@ -0,0 +1,35 @@
+# lending/management/commands/backfill_rollups.py
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.services.rollups import DEFAULT_CHUNK_MONTHS, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily rollups behind the trend charts from loans and repayments, "
+        "a few months per transaction (whole history by default)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First month to rebuild (YYYY-MM-DD), defaults to the oldest record")
+        parser.add_argument("--end", help="Last day to rebuild (YYYY-MM-DD), defaults to today")
+        parser.add_argument("--chunk-months", type=int, default=DEFAULT_CHUNK_MONTHS)
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ("start", "end"):
+            if options[name]:
+                try:
+                    dates[name] = datetime.date.fromisoformat(options[name])
+                except ValueError:
+                    raise CommandError(f"--{name} must be a date in YYYY-MM-DD format.")
+        if options["chunk_months"] < 1:
+            raise CommandError("--chunk-months must be at least 1.")
+
+        rows = rebuild_rollups(
+            chunk_months=options["chunk_months"], log=lambda line: self.stdout.write(line), **dates,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} daily rollup rows."))
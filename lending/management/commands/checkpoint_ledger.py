@@ -0,0 +1,28 @@
+# lending/management/commands/checkpoint_ledger.py
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.services.ledger import DEFAULT_CHUNK_SIZE, checkpoint_ledger, end_of_day
+
+
+class Command(BaseCommand):
+    help = "Nightly: checkpoint the ledger balance of every loan with journal entries since its last checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--as-of", help="Checkpoint at the end of this day (YYYY-MM-DD), defaults to now")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options["as_of"]:
+            try:
+                as_of = end_of_day(datetime.date.fromisoformat(options["as_of"]))
+            except ValueError:
+                raise CommandError("--as-of must be a date in YYYY-MM-DD format.")
+
+        written = checkpoint_ledger(
+            as_of=as_of, chunk_size=options["chunk_size"], log=lambda line: self.stdout.write(line),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} ledger checkpoints."))
@@ -0,0 +1,36 @@
+# lending/management/commands/drain_payment_inbox.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from lending.services.payment_inbox import DEFAULT_BATCH_SIZE, drain_inbox
+from lending.services.reconciliation import RULES
+
+
+class Command(BaseCommand):
+    help = (
+        "Post the payment callbacks waiting in the inbox to loans, in batches. "
+        "With --loop, keep polling for new callbacks every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--rule", choices=sorted(RULES), default=None,
+                            help="allocation rule (default: LENDING_RECONCILIATION_RULE)")
+        parser.add_argument("--loop", action="store_true", help="run until interrupted")
+        parser.add_argument("--interval", type=float, default=2.0, help="seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            summary = drain_inbox(batch_size=options["batch_size"], rule=options["rule"])
+            if summary["callbacks"] or not options["loop"]:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Processed {summary['callbacks']} callbacks: {summary['repayments']} repayments "
+                    f"({summary['posted']}), {summary['suspense']} to suspense, "
+                    f"{summary['duplicates']} duplicates, {summary['failed']} failed."
+                ))
+            if not options["loop"]:
+                return
+            if not summary["callbacks"]:
+                time.sleep(options["interval"])
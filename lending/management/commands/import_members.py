@@ -0,0 +1,57 @@
+# lending/management/commands/import_members.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.models import Office
+from lending.services.member_import import DEFAULT_BATCH_SIZE, import_members, read_rows
+
+ERRORS_SHOWN = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-create members from a CSV or XLSX file with columns first_name, last_name, "
+        "email, national_id, phone_number and optionally middle_name, alternative_phone, "
+        "address, date_of_birth, password. Rows with an email or national ID that is "
+        "already registered are skipped and reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or XLSX file with one member per row")
+        parser.add_argument("--office", type=int, default=None, help="id of the office the members join")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--workers", type=int, default=None, help="password hashing processes (default: CPUs)")
+
+    def handle(self, *args, **options):
+        office = None
+        if options["office"] is not None:
+            office = Office.objects.filter(pk=options["office"]).first()
+            if office is None:
+                raise CommandError(f"Office {options['office']} does not exist.")
+
+        started = time.monotonic()
+        try:
+            with open(options["path"], "rb") as fh:
+                summary = import_members(
+                    read_rows(fh, options["path"]),
+                    office=office,
+                    batch_size=options["batch_size"],
+                    workers=options["workers"],
+                    log=lambda message: self.stdout.write(message) if options["verbosity"] > 1 else None,
+                )
+        except FileNotFoundError:
+            raise CommandError(f"File not found: {options['path']}")
+        except (ValueError, UnicodeDecodeError) as exc:
+            raise CommandError(f"Could not read {options['path']}: {exc}")
+
+        for line, reason in summary["errors"][:ERRORS_SHOWN]:
+            self.stderr.write(f"line {line}: {reason}")
+        if len(summary["errors"]) > ERRORS_SHOWN:
+            self.stderr.write(f"... and {len(summary['errors']) - ERRORS_SHOWN} more skipped rows")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {summary['created']} members, skipped {summary['skipped']} rows "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
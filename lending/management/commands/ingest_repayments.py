@@ -0,0 +1,40 @@
+# lending/management/commands/ingest_repayments.py
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.services.repayments import DEFAULT_BATCH_SIZE, ingest_repayments
+
+ERRORS_SHOWN = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-post repayments from a CSV file with columns "
+        "loan_id, transaction_id, payer_phone, amount, paid_at. "
+        "Transaction ids that are already recorded are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file with one repayment per row")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], newline="", encoding="utf-8") as fh:
+                summary = ingest_repayments(csv.DictReader(fh), batch_size=options["batch_size"])
+        except FileNotFoundError:
+            raise CommandError(f"File not found: {options['path']}")
+        except (KeyError, ValueError) as exc:
+            raise CommandError(f"Invalid repayment row: {exc}")
+
+        for row, reason in summary["errors"][:ERRORS_SHOWN]:
+            self.stderr.write(f"row {row}: {reason}")
+        if len(summary["errors"]) > ERRORS_SHOWN:
+            self.stderr.write(f"... and {len(summary['errors']) - ERRORS_SHOWN} more rejected rows")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {summary['created']} repayments, skipped {summary['skipped']} duplicates "
+            f"across {summary['loans']} loans."
+        ))
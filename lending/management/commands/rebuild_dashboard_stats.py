@@ -0,0 +1,13 @@
+# lending/management/commands/rebuild_dashboard_stats.py
+
+from django.core.management.base import BaseCommand
+
+from lending.services.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the DashboardStats table (global, per office, per officer) from scratch."
+
+    def handle(self, *args, **options):
+        rows = rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} dashboard stats rows."))
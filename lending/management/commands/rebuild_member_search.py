@@ -0,0 +1,16 @@
+# lending/management/commands/rebuild_member_search.py
+
+from django.core.management.base import BaseCommand
+
+from lending.services.search import CHUNK_SIZE, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Repopulate the member search index (FTS5 on SQLite, pg_trgm on PostgreSQL)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        total = rebuild_index(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} members."))
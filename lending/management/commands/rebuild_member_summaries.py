@@ -0,0 +1,13 @@
+# lending/management/commands/rebuild_member_summaries.py
+
+from django.core.management.base import BaseCommand
+
+from lending.services.member_summary import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute every member's dashboard summary (loan counts, balances, recent repayments)."
+
+    def handle(self, *args, **options):
+        members = rebuild_summaries(log=lambda line: self.stdout.write(line))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the summaries of {members} members."))
@@ -0,0 +1,46 @@
+# lending/management/commands/reconcile_receipts.py
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.services.reconciliation import RULES, reconcile_receipts
+from lending.services.repayments import DEFAULT_BATCH_SIZE
+
+ERRORS_SHOWN = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Post mobile-money receipts from a CSV file with columns transaction_id, "
+        "payer_phone, amount, paid_at to the payers' active loans, matched by phone. "
+        "Receipts that can't be matched go to the suspense queue; transaction ids "
+        "already posted or in suspense are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file with one receipt per row")
+        parser.add_argument("--rule", choices=sorted(RULES), default=None,
+                            help="allocation rule (default: LENDING_RECONCILIATION_RULE)")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as fh:
+                summary = reconcile_receipts(
+                    csv.DictReader(fh), rule=options["rule"], batch_size=options["batch_size"],
+                )
+        except FileNotFoundError:
+            raise CommandError(f"File not found: {options['path']}")
+        except (KeyError, ValueError) as exc:
+            raise CommandError(f"Invalid receipt row: {exc}")
+
+        for row, reason in summary["errors"][:ERRORS_SHOWN]:
+            self.stderr.write(f"row {row}: {reason}")
+        if len(summary["errors"]) > ERRORS_SHOWN:
+            self.stderr.write(f"... and {len(summary['errors']) - ERRORS_SHOWN} more rejected rows")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Posted {summary['repayments']} repayments ({summary['posted']}) to {summary['loans']} loans, "
+            f"sent {summary['suspense']} to suspense, skipped {summary['duplicates']} duplicates."
+        ))
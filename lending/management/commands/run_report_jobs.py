@@ -0,0 +1,29 @@
+# lending/management/commands/run_report_jobs.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from lending.services.report_snapshots import run_pending_reports
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the queued background (company-wide) reports. Needed when LENDING_REPORT_RUNNER "
+        "is \"worker\"; also picks up reports left queued or running by a restart. With --loop, keep "
+        "polling every --interval seconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="run until interrupted")
+        parser.add_argument("--interval", type=float, default=2.0, help="seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            ran = run_pending_reports()
+            if ran or not options["loop"]:
+                self.stdout.write(self.style.SUCCESS(f"Ran {ran} reports."))
+            if not options["loop"]:
+                return
+            if not ran:
+                time.sleep(options["interval"])
@@ -0,0 +1,53 @@
+# lending/management/commands/seed_loan_book.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.services.seed import DEFAULT_BATCH_SIZE, seed_loan_book
+
+
+class Command(BaseCommand):
+    help = (
+        "Add a synthetic company with offices, staff, members, loans, schedules and "
+        "repayments for load testing, e.g. --offices 50 --members 2000000 "
+        "--loans 5000000 --repayments 30000000."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--offices", type=int, default=5)
+        parser.add_argument("--officers-per-office", type=int, default=4)
+        parser.add_argument("--members", type=int, default=1000)
+        parser.add_argument("--loans", type=int, default=2500)
+        parser.add_argument("--repayments", type=int, default=10000, help="target number of repayments")
+        parser.add_argument("--days", type=int, default=730, help="spread loans over this many past days")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible data")
+        parser.add_argument("--password", default="password", help="password of every seeded user")
+        parser.add_argument("--no-schedules", action="store_true", help="skip installment schedules and aging")
+
+    def handle(self, *args, **options):
+        if options["offices"] < 1 or options["officers_per_office"] < 1:
+            raise CommandError("At least one office and one officer per office are needed.")
+        if options["loans"] and options["members"] < 1:
+            raise CommandError("Loans need at least one member.")
+
+        started = time.monotonic()
+        summary = seed_loan_book(
+            offices=options["offices"],
+            officers_per_office=options["officers_per_office"],
+            members=options["members"],
+            loans=options["loans"],
+            repayments=options["repayments"],
+            batch_size=options["batch_size"],
+            days=options["days"],
+            schedules=not options["no_schedules"],
+            seed=options["seed"],
+            password=options["password"],
+            log=lambda message: self.stdout.write(message) if options["verbosity"] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {summary['offices']} offices, {summary['officers']} officers, {summary['members']} members, "
+            f"{summary['loans']} loans, {summary['installments']} installments and {summary['repayments']} "
+            f"repayments in {time.monotonic() - started:.1f}s."
+        ))
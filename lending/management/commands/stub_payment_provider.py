@@ -0,0 +1,88 @@
+# lending/management/commands/stub_payment_provider.py
+
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.models import Loan
+from lending.services.payment_inbox import SIGNATURE_HEADER, sign
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Act as a local payment provider: fire a burst of signed payment callbacks at "
+        "a running server (payments to the phones of members with disbursed loans, some "
+        "of them retried) and report the callback latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/payments/callback/")
+        parser.add_argument("--count", type=int, default=1000, help="payments to send")
+        parser.add_argument("--concurrency", type=int, default=20, help="callbacks in flight at once")
+        parser.add_argument("--retries", type=float, default=0.05, help="share of callbacks sent twice")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument(
+            "--secret", default=None, help="secret to sign with (default: settings.LENDING_CALLBACK_SECRET)",
+        )
+
+    def handle(self, *args, **options):
+        secret = options["secret"] or settings.LENDING_CALLBACK_SECRET
+        if not secret:
+            raise CommandError("No secret to sign with; pass --secret or set LENDING_CALLBACK_SECRET.")
+        rng = random.Random(options["seed"])
+        targets = list(
+            Loan.objects.filter(status="DISBURSED").values_list("id", "member__phone_number")[:10000]
+        )
+        if not targets:
+            raise CommandError("No disbursed loans to pay; seed some with seed_loan_book.")
+
+        prefix = f"STUB{int(time.time())}"
+        payloads = []
+        for n in range(options["count"]):
+            loan_id, phone = rng.choice(targets)
+            payload = {"transaction_id": f"{prefix}{n:07d}", "payer_phone": phone, "amount": str(rng.randint(1, 50) * 100)}
+            if rng.random() < 0.5:
+                payload["loan_id"] = loan_id  # a paybill account number
+            payloads.append(payload)
+        payloads += rng.sample(payloads, int(len(payloads) * options["retries"]))
+        rng.shuffle(payloads)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            results = list(pool.map(lambda payload: self.send(options["url"], payload, secret), payloads))
+        elapsed = time.monotonic() - started
+
+        statuses = Counter(status for status, _ in results)
+        timings = [seconds * 1000 for _, seconds in results]
+        self.stdout.write(", ".join(f"{status}: {n}" for status, n in sorted(statuses.items(), key=str)))
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {len(payloads)} callbacks in {elapsed:.1f}s ({len(payloads) / elapsed:.0f}/s); "
+            f"p50 {percentile(timings, 50):.1f} ms, p95 {percentile(timings, 95):.1f} ms, "
+            f"p99 {percentile(timings, 99):.1f} ms."
+        ))
+
+    def send(self, url, payload, secret):
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json", SIGNATURE_HEADER: sign(body, secret)}
+        request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+        started = time.monotonic()
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                status = response.status
+        except urllib.error.HTTPError as exc:
+            status = exc.code
+        except OSError as exc:
+            status = type(exc).__name__
+        return status, time.monotonic() - started
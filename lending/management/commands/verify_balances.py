@@ -0,0 +1,30 @@
+# lending/management/commands/verify_balances.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.services.balance_check import DEFAULT_CHUNK_SIZE, default_workers, verify_balances
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that every loan's balance is its total payable less its repayments (and write-off), "
+        "on a pool of processes, and record the loans that are off. --repair fixes them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=default_workers(), help="Processes (default: one per CPU)")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Loans per query")
+        parser.add_argument("--repair", action="store_true", help="Set the balances found off to the expected ones")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--workers and --chunk-size must be at least 1.")
+
+        run = verify_balances(
+            workers=options["workers"], chunk_size=options["chunk_size"], repair=options["repair"],
+            log=lambda line: self.stdout.write(line),
+        )
+        message = f"Check {run.pk}: {run.loans_checked} loans, {run.discrepancies} discrepancies"
+        if options["repair"]:
+            message += f", {run.repaired} repaired"
+        self.stdout.write(self.style.SUCCESS(message + "."))
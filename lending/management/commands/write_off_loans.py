@@ -0,0 +1,19 @@
+# lending/management/commands/write_off_loans.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from lending.services.ledger import write_off_loans
+
+
+class Command(BaseCommand):
+    help = "Write off the remaining balance of disbursed loans and close them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("loan_ids", nargs="+", type=int)
+
+    def handle(self, *args, **options):
+        amounts = write_off_loans(options["loan_ids"])
+        if not amounts:
+            raise CommandError("None of these loans is disbursed with a balance left.")
+        total = sum(amounts.values())
+        self.stdout.write(self.style.SUCCESS(f"Wrote off {len(amounts)} loans, {total} in total."))
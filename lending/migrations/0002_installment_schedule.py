@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='interest_method',
+            field=models.CharField(choices=[('FLAT', 'Flat rate'), ('REDUCING', 'Reducing balance')], default='FLAT', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='loanpolicy',
+            name='interest_method',
+            field=models.CharField(choices=[('FLAT', 'Flat rate'), ('REDUCING', 'Reducing balance')], default='FLAT', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='Installment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('due_date', models.DateField()),
+                ('principal_due', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('interest_due', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('amount_due', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('amount_paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('status', models.CharField(choices=[('DUE', 'Due'), ('PARTIAL', 'Partially paid'), ('PAID', 'Paid')], default='DUE', max_length=10)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='installments', to='lending.loan')),
+            ],
+            options={
+                'ordering': ['loan', 'number'],
+                'indexes': [models.Index(fields=['loan', 'status', 'due_date'], name='lending_ins_loan_id_1ef034_idx'), models.Index(fields=['status', 'due_date'], name='lending_ins_status_78495f_idx')],
+                'unique_together': {('loan', 'number')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0002_installment_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanAging',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('days_past_due', models.PositiveIntegerField(default=0)),
+                ('bucket', models.CharField(choices=[('CURRENT', 'Current'), ('PAR1_30', '1-30 days'), ('PAR31_60', '31-60 days'), ('PAR61_90', '61-90 days'), ('PAR90', '90+ days')], default='CURRENT', max_length=10)),
+                ('amount_overdue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('as_of', models.DateField()),
+                ('loan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='aging', to='lending.loan')),
+                ('office', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='lending.office')),
+                ('officer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['office', 'bucket'], name='lending_loa_office__50716d_idx'), models.Index(fields=['officer', 'bucket'], name='lending_loa_officer_44729c_idx')],
+            },
+        ),
+    ]
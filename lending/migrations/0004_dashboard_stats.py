@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0003_loan_aging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardStats',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('loans_total', models.IntegerField(default=0)),
+                ('loans_pending', models.IntegerField(default=0)),
+                ('loans_approved', models.IntegerField(default=0)),
+                ('loans_rejected', models.IntegerField(default=0)),
+                ('loans_disbursed', models.IntegerField(default=0)),
+                ('loans_closed', models.IntegerField(default=0)),
+                ('outstanding_balance', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_repaid', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('officers_count', models.IntegerField(default=0)),
+                ('members_count', models.IntegerField(default=0)),
+                ('users_count', models.IntegerField(default=0)),
+                ('companies_count', models.IntegerField(default=0)),
+                ('offices_count', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# The member search index (lending.services.search). The DDL and the
+# backfill are spelled out here rather than imported, so later changes to
+# the service or the models can't change what this migration does.
+
+SQLITE_CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lending_member_fts USING fts5("
+    "member_id UNINDEXED, office_id UNINDEXED, name, email, national_id, phone, "
+    "tokenize='trigram')",
+]
+SQLITE_BACKFILL = """
+    INSERT INTO lending_member_fts (member_id, office_id, name, email, national_id, phone)
+    SELECT p.id, u.office_id,
+           trim(replace(coalesce(u.first_name, '') || ' ' || coalesce(u.middle_name, '') || ' '
+                        || coalesce(u.last_name, ''), '  ', ' ')),
+           lower(coalesce(u.email, '')), p.national_id,
+           trim(coalesce(p.phone_number, '') || ' ' || coalesce(p.alternative_phone, ''))
+    FROM lending_memberprofile p JOIN lending_user u ON u.id = p.user_id
+"""
+
+POSTGRES_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE TABLE IF NOT EXISTS lending_member_search ("
+    "member_id bigint PRIMARY KEY, office_id bigint NULL, document text NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS lending_member_search_trgm ON lending_member_search USING gin (document gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS lending_member_search_office ON lending_member_search (office_id)",
+]
+POSTGRES_BACKFILL = """
+    INSERT INTO lending_member_search (member_id, office_id, document)
+    SELECT p.id, u.office_id, lower(concat_ws(' ',
+           nullif(u.first_name, ''), nullif(u.middle_name, ''), nullif(u.last_name, ''), nullif(u.email, ''),
+           nullif(p.national_id, ''), nullif(p.phone_number, ''), nullif(p.alternative_phone, '')))
+    FROM lending_memberprofile p JOIN lending_user u ON u.id = p.user_id
+"""
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        statements = [*SQLITE_CREATE, SQLITE_BACKFILL]
+    elif vendor == "postgresql":
+        statements = [*POSTGRES_CREATE, POSTGRES_BACKFILL]
+    else:
+        return  # other backends search with icontains lookups
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS lending_member_fts")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP TABLE IF EXISTS lending_member_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0004_dashboard_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:11
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# The identifier normalization (lending.services.identifiers) is copied here
+# as it stood when this migration was written, so later changes to the
+# service can't change what the backfill writes.
+
+PHONE_RE = re.compile(r"^\+?[\d\s().-]{6,20}$")
+
+
+def normalize_phone(raw):
+    if not raw:
+        return None
+    raw = raw.strip()
+    if not PHONE_RE.match(raw):
+        return None
+    digits = re.sub(r"\D", "", raw)
+    country = str(getattr(settings, "LENDING_DEFAULT_COUNTRY_CODE", "254"))
+    if raw.startswith("+"):
+        return f"+{digits}"
+    if digits.startswith("00"):
+        return f"+{digits[2:]}"
+    if digits.startswith(country) and len(digits) > 10:
+        return f"+{digits}"
+    return f"+{country}{digits.lstrip('0')}"
+
+
+def identifiers_for(username, email, phone_number=None):
+    entries = []
+    if email:
+        entries.append((email.strip().lower(), "EMAIL"))
+    if username:
+        entries.append((username, "USERNAME"))
+    phone = normalize_phone(phone_number)
+    if phone:
+        entries.append((phone, "PHONE"))
+    return entries
+
+
+def backfill_identifiers(apps, schema_editor):
+    User = apps.get_model("lending", "User")
+    MemberProfile = apps.get_model("lending", "MemberProfile")
+    LoginIdentifier = apps.get_model("lending", "LoginIdentifier")
+
+    last_id = 0
+    while True:
+        users = list(User.objects.filter(pk__gt=last_id).order_by("pk").values_list("pk", "username", "email")[:2000])
+        if not users:
+            return
+        phones = dict(MemberProfile.objects.filter(user_id__in=[u[0] for u in users]).values_list("user_id", "phone_number"))
+        LoginIdentifier.objects.bulk_create(
+            [
+                LoginIdentifier(identifier=identifier, kind=kind, user_id=pk)
+                for pk, username, email in users
+                for identifier, kind in identifiers_for(username, email, phones.get(pk))
+            ],
+            ignore_conflicts=True,
+        )
+        last_id = users[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0005_member_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginIdentifier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identifier', models.CharField(max_length=254, unique=True)),
+                ('kind', models.CharField(choices=[('EMAIL', 'Email'), ('PHONE', 'Phone'), ('USERNAME', 'Username')], max_length=10)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='login_identifiers', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(backfill_identifiers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('lending', '0006_login_identifiers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loan',
+            name='member',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='loans', to='lending.memberprofile'),
+        ),
+        migrations.AlterField(
+            model_name='loan',
+            name='officer',
+            field=models.ForeignKey(blank=True, db_index=False, limit_choices_to={'role': 'OFFICER'}, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='repayment',
+            name='loan',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='repayments', to='lending.loan'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['officer', 'status', 'created_at'], name='lending_loa_officer_5df195_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['officer', 'created_at'], name='lending_loa_officer_a1fcf4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['member', 'created_at'], name='lending_loa_member__8be014_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memberprofile',
+            index=models.Index(fields=['phone_number'], name='lending_mem_phone_n_b41b40_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='repayment',
+            index=models.Index(fields=['loan', 'paid_at'], name='lending_rep_loan_id_45ec2d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportlog',
+            index=models.Index(fields=['created_at'], name='lending_rep_created_17822e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'office'], name='lending_use_role_3a039c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['date_joined'], name='lending_use_date_jo_99d657_idx'),
+        ),
+    ]
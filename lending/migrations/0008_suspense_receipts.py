@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:19
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0007_loan_book_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuspenseReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(max_length=100, unique=True)),
+                ('payer_phone', models.CharField(max_length=15)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('paid_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reason', models.CharField(choices=[('UNMATCHED', 'No active loan for this phone'), ('AMBIGUOUS', 'Phone shared by several members'), ('OVERPAYMENT', "More than the member's outstanding balance")], max_length=12)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolved_at', 'received_at'], name='lending_sus_resolve_6885eb_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0008_suspense_receipts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentCallback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(max_length=100)),
+                ('payload', models.JSONField()),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('DONE', 'Processed'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='lending_pay_status_ac1993_idx')],
+            },
+        ),
+    ]
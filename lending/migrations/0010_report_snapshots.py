@@ -0,0 +1,68 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:32
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+def close_old_logs(apps, schema_editor):
+    # logs written before snapshots existed have nothing to run
+    ReportLog = apps.get_model("lending", "ReportLog")
+    ReportLog.objects.update(status="DONE", completed_at=models.F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0009_payment_callbacks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportlog',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportlog',
+            name='error',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='reportlog',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='reportlog',
+            name='params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='reportlog',
+            name='payload',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+        migrations.AddField(
+            model_name='reportlog',
+            name='scope',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='reportlog',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Queued'), ('RUNNING', 'Running'), ('DONE', 'Ready'), ('FAILED', 'Failed')], default='PENDING', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='reportlog',
+            index=models.Index(fields=['fingerprint', 'created_at'], name='lending_rep_fingerp_88748c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportlog',
+            index=models.Index(fields=['scope', 'created_at'], name='lending_rep_scope_de17ff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportlog',
+            index=models.Index(fields=['status', 'id'], name='lending_rep_status_3e58fb_idx'),
+        ),
+        migrations.RunPython(close_old_logs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0010_report_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40)),
+                ('day', models.DateField()),
+                ('amount_repaid', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('repayments_count', models.IntegerField(default=0)),
+                ('principal_disbursed', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('loans_disbursed', models.IntegerField(default=0)),
+                ('applications', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='repayment',
+            index=models.Index(fields=['paid_at'], name='lending_rep_paid_at_01d653_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyrollup',
+            index=models.Index(fields=['day'], name='lending_dai_day_daef59_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyrollup',
+            unique_together={('key', 'day')},
+        ),
+    ]
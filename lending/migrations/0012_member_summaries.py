@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:49
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0011_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberSummary',
+            fields=[
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='lending.memberprofile')),
+                ('loans_total', models.IntegerField(default=0)),
+                ('loans_pending', models.IntegerField(default=0)),
+                ('loans_approved', models.IntegerField(default=0)),
+                ('loans_rejected', models.IntegerField(default=0)),
+                ('loans_disbursed', models.IntegerField(default=0)),
+                ('loans_closed', models.IntegerField(default=0)),
+                ('principal_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('outstanding_balance', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_repaid', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('active_loans', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('recent_repayments', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 03:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0012_member_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('DISBURSEMENT', 'Disbursement'), ('INTEREST', 'Interest'), ('REPAYMENT', 'Repayment'), ('REVERSAL', 'Reversal'), ('WRITE_OFF', 'Write-off')], max_length=12)),
+                ('debit', models.CharField(choices=[('LOANS', 'Loans receivable'), ('CASH', 'Cash'), ('INTEREST_INCOME', 'Interest income'), ('MEMBER_CREDIT', 'Member credit (overpayments)'), ('WRITE_OFFS', 'Written-off loans')], max_length=15)),
+                ('credit', models.CharField(choices=[('LOANS', 'Loans receivable'), ('CASH', 'Cash'), ('INTEREST_INCOME', 'Interest income'), ('MEMBER_CREDIT', 'Member credit (overpayments)'), ('WRITE_OFFS', 'Written-off loans')], max_length=15)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('posted_at', models.DateTimeField()),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reference', models.CharField(blank=True, default='', max_length=100)),
+                ('loan', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='journal', to='lending.loan')),
+                ('reverses', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reversals', to='lending.journalentry')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['loan', 'posted_at'], name='lending_jou_loan_id_155f2f_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('loan', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='lending.loan')),
+            ],
+            options={
+                'unique_together': {('loan', 'as_of')},
+            },
+        ),
+    ]
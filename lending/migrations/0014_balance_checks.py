@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0013_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='RUNNING', max_length=10)),
+                ('workers', models.PositiveIntegerField(default=1)),
+                ('loans_checked', models.PositiveIntegerField(default=0)),
+                ('discrepancies', models.PositiveIntegerField(default=0)),
+                ('repaired', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceDiscrepancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('loan_id', models.BigIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('recorded', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('expected', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_payable', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('repaid', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('written_off', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('repaired_at', models.DateTimeField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='found', to='lending.balancecheck')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['loan_id'], name='lending_bal_loan_id_6014f0_idx')],
+            },
+        ),
+    ]
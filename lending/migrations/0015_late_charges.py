@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0014_balance_checks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='accrued_through',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='loanpolicy',
+            name='default_interest_rate',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='loanpolicy',
+            name='penalty_grace_days',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='loanpolicy',
+            name='penalty_rate',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AlterField(
+            model_name='journalentry',
+            name='credit',
+            field=models.CharField(choices=[('LOANS', 'Loans receivable'), ('CASH', 'Cash'), ('INTEREST_INCOME', 'Interest income'), ('PENALTY_INCOME', 'Penalty income'), ('MEMBER_CREDIT', 'Member credit (overpayments)'), ('WRITE_OFFS', 'Written-off loans')], max_length=15),
+        ),
+        migrations.AlterField(
+            model_name='journalentry',
+            name='debit',
+            field=models.CharField(choices=[('LOANS', 'Loans receivable'), ('CASH', 'Cash'), ('INTEREST_INCOME', 'Interest income'), ('PENALTY_INCOME', 'Penalty income'), ('MEMBER_CREDIT', 'Member credit (overpayments)'), ('WRITE_OFFS', 'Written-off loans')], max_length=15),
+        ),
+        migrations.AlterField(
+            model_name='journalentry',
+            name='kind',
+            field=models.CharField(choices=[('DISBURSEMENT', 'Disbursement'), ('INTEREST', 'Interest'), ('PENALTY', 'Late penalty'), ('REPAYMENT', 'Repayment'), ('REVERSAL', 'Reversal'), ('WRITE_OFF', 'Write-off')], max_length=12),
+        ),
+    ]
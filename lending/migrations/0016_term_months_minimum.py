@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:29
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0015_late_charges'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loan',
+            name='term_months',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='loanpolicy',
+            name='max_term_months',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
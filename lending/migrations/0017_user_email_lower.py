@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 04:48
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('lending', '0016_term_months_minimum'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='lending_user_email_lower'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lending', '0017_user_email_lower'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportlog',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.utils import timezone
+from django.utils.http import urlencode
 
 
 # -------------------------------
@@ -40,6 +44,13 @@ class User(AbstractUser):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default="MEMBER")
     office = models.ForeignKey(Office, on_delete=models.SET_NULL, null=True, blank=True, related_name="users")
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["role", "office"]),
+            models.Index(fields=["date_joined"]),
+            models.Index(Lower("email"), name="lending_user_email_lower"),  # case-insensitive email checks
+        ]
+
     def full_name(self):
         parts = [self.first_name, self.middle_name, self.last_name]
         return " ".join([p for p in parts if p])
@@ -63,6 +74,24 @@ class User(AbstractUser):
 
 
     
+# -------------------------------
+# 2b. Login identifiers (normalized email / phone / username -> user)
+# -------------------------------
+class LoginIdentifier(models.Model):
+    KIND_CHOICES = [
+        ("EMAIL", "Email"),
+        ("PHONE", "Phone"),
+        ("USERNAME", "Username"),
+    ]
+
+    identifier = models.CharField(max_length=254, unique=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="login_identifiers")
+
+    def __str__(self):
+        return f"{self.identifier} -> {self.user_id}"
+
+
 # -------------------------------
 # 3. Manager ↔ Officers Relationship
 # -------------------------------
@@ -90,21 +119,69 @@ class MemberProfile(models.Model):
     date_of_birth = models.DateField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to="profile_pics/", blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["phone_number"]),
+        ]
+
     def __str__(self):
         return f"{self.user.username} ({self.national_id})"
 
 
 
+# -------------------------------
+# 4b. Member account summary (see services.member_summary)
+# -------------------------------
+class MemberSummary(models.Model):
+    """What the member dashboard shows, kept current by the loan and repayment write paths."""
+    member = models.OneToOneField(MemberProfile, on_delete=models.CASCADE, primary_key=True, related_name="summary")
+
+    loans_total = models.IntegerField(default=0)
+    loans_pending = models.IntegerField(default=0)
+    loans_approved = models.IntegerField(default=0)
+    loans_rejected = models.IntegerField(default=0)
+    loans_disbursed = models.IntegerField(default=0)
+    loans_closed = models.IntegerField(default=0)
+    principal_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    outstanding_balance = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # Loan.balance of disbursed loans
+    total_repaid = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    # [{id, principal_amount, status, created_at}] of pending/approved/disbursed loans, newest first
+    active_loans = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    # [{id, loan_id, amount, paid_at}] of the newest repayments
+    recent_repayments = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    @property
+    def loans_active(self):
+        return self.loans_pending + self.loans_approved + self.loans_disbursed
+
+    def __str__(self):
+        return f"Summary of member {self.member_id}"
+
+
 # -------------------------------
 # 5. Loan Policies (Admin-defined)
 # -------------------------------
 class LoanPolicy(models.Model):
+    INTEREST_METHOD_CHOICES = [
+        ("FLAT", "Flat rate"),
+        ("REDUCING", "Reducing balance"),
+    ]
+
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="loan_policies")
     name = models.CharField(max_length=100)
     interest_rate = models.DecimalField(max_digits=5, decimal_places=2)  # flat rate (% per year)
     min_amount = models.DecimalField(max_digits=12, decimal_places=2)
     max_amount = models.DecimalField(max_digits=12, decimal_places=2)
-    max_term_months = models.PositiveIntegerField()
+    max_term_months = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    interest_method = models.CharField(max_length=10, choices=INTEREST_METHOD_CHOICES, default="FLAT")
+
+    # late charges, accrued daily by services.accrual once a loan is more
+    # than penalty_grace_days past due (0: none)
+    penalty_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # % per year of the amount overdue
+    penalty_grace_days = models.PositiveIntegerField(default=0)
+    default_interest_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)  # % per year of the balance
 
     def __str__(self):
         return f"{self.name} ({self.company.name})"
@@ -126,15 +203,17 @@ class Loan(models.Model):
         ("CLOSED", "Closed"),
     ]
 
-    member = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, related_name="loans")
-    officer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, limit_choices_to={"role": "OFFICER"})
+    # member / officer are indexed through the composites in Meta
+    member = models.ForeignKey(MemberProfile, on_delete=models.CASCADE, related_name="loans", db_index=False)
+    officer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, limit_choices_to={"role": "OFFICER"}, db_index=False)
     policy = models.ForeignKey(LoanPolicy, on_delete=models.SET_NULL, null=True, blank=True)
     principal_amount = models.DecimalField(max_digits=12, decimal_places=2)
-    term_months = models.PositiveIntegerField()
+    term_months = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     purpose = models.TextField(blank=True, null=True)
 
     # snapshot from policy
     interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    interest_method = models.CharField(max_length=10, choices=LoanPolicy.INTEREST_METHOD_CHOICES, default="FLAT")
     total_payable = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
     balance = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
 
@@ -142,9 +221,22 @@ class Loan(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     approved_at = models.DateTimeField(blank=True, null=True)
     disbursed_at = models.DateTimeField(blank=True, null=True)
+    accrued_through = models.DateField(blank=True, null=True)  # last day late charges were accrued for
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["officer", "status", "created_at"]),
+            models.Index(fields=["officer", "created_at"]),
+            models.Index(fields=["member", "created_at"]),
+        ]
 
     def calculate_total_payable(self):
-        """Flat rate: total = principal + (principal * rate * time/12)."""
+        """Flat rate: total = principal + (principal * rate * time/12).
+        Reducing balance: sum of the amortized installments."""
+        if self.interest_method == "REDUCING":
+            from .services.schedule import schedule_rows
+            return sum((p + i for _, _, p, i in schedule_rows(self)), Decimal("0"))
+
         rate = Decimal(self.interest_rate) / Decimal('100')
         term = Decimal(self.term_months) / Decimal('12')
         interest = self.principal_amount * rate * term
@@ -153,43 +245,368 @@ class Loan(models.Model):
     def save(self, *args, **kwargs):
         if not self.total_payable:
             self.total_payable = self.calculate_total_payable()
-        if not self.balance:
+        if self.balance is None:  # a paid-off loan's balance is 0, not unset
             self.balance = self.total_payable
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Loan {self.id} - {self.member.user.username} ({self.status})"
 
+# -------------------------------
+# 6b. Installment schedule (generated at disbursement)
+# -------------------------------
+class Installment(models.Model):
+    STATUS_CHOICES = [
+        ("DUE", "Due"),
+        ("PARTIAL", "Partially paid"),
+        ("PAID", "Paid"),
+    ]
+
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="installments")
+    number = models.PositiveIntegerField()
+    due_date = models.DateField()
+    principal_due = models.DecimalField(max_digits=12, decimal_places=2)
+    interest_due = models.DecimalField(max_digits=12, decimal_places=2)
+    amount_due = models.DecimalField(max_digits=12, decimal_places=2)
+    amount_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="DUE")
+
+    class Meta:
+        ordering = ["loan", "number"]
+        unique_together = ("loan", "number")
+        indexes = [
+            models.Index(fields=["loan", "status", "due_date"]),
+            models.Index(fields=["status", "due_date"]),
+        ]
+
+    @property
+    def amount_outstanding(self):
+        return self.amount_due - self.amount_paid
+
+    def __str__(self):
+        return f"Loan {self.loan_id} #{self.number} due {self.due_date}"
+
+
+# -------------------------------
+# 6c. Arrears aging (maintained per disbursed loan)
+# -------------------------------
+class LoanAging(models.Model):
+    BUCKET_CHOICES = [
+        ("CURRENT", "Current"),
+        ("PAR1_30", "1-30 days"),
+        ("PAR31_60", "31-60 days"),
+        ("PAR61_90", "61-90 days"),
+        ("PAR90", "90+ days"),
+    ]
+
+    loan = models.OneToOneField(Loan, on_delete=models.CASCADE, related_name="aging")
+    # denormalized from loan.officer so office/officer PAR reports don't join
+    officer = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    office = models.ForeignKey(Office, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    days_past_due = models.PositiveIntegerField(default=0)
+    bucket = models.CharField(max_length=10, choices=BUCKET_CHOICES, default="CURRENT")
+    amount_overdue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    as_of = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["office", "bucket"]),
+            models.Index(fields=["officer", "bucket"]),
+        ]
+
+    def __str__(self):
+        return f"Loan {self.loan_id}: {self.days_past_due} days ({self.bucket})"
+
+
 # -------------------------------
 # 7. Repayments
 # -------------------------------
 class Repayment(models.Model):
-    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="repayments")
+    # indexed through the (loan, paid_at) composite below
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="repayments", db_index=False)
     transaction_id = models.CharField(max_length=100, unique=True)
     payer_phone = models.CharField(max_length=15)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     paid_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["loan", "paid_at"]),
+            models.Index(fields=["paid_at"]),  # date-range scans of services.rollups.rebuild_rollups
+        ]
+
     def __str__(self):
         return f"{self.transaction_id} - {self.amount}"
 
     def save(self, *args, **kwargs):
+        from .services.repayments import apply_loan_payments
+
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # update loan balance in the database (only once, when the repayment is created)
+            if adding:
+                apply_loan_payments({self.loan_id: self.amount}, [self])
+        if adding and Repayment.loan.is_cached(self):
+            self.loan.refresh_from_db(fields=["balance", "status"])
+
+
+# -------------------------------
+# 7b. Suspense (receipts reconciliation couldn't post to a loan)
+# -------------------------------
+class SuspenseReceipt(models.Model):
+    REASON_CHOICES = [
+        ("UNMATCHED", "No active loan for this phone"),
+        ("AMBIGUOUS", "Phone shared by several members"),
+        ("OVERPAYMENT", "More than the member's outstanding balance"),
+    ]
+
+    # the provider's transaction id; an overpayment keeps the id of the receipt it came from
+    transaction_id = models.CharField(max_length=100, unique=True)
+    payer_phone = models.CharField(max_length=15)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    paid_at = models.DateTimeField(default=timezone.now)
+    reason = models.CharField(max_length=12, choices=REASON_CHOICES)
+    received_at = models.DateTimeField(default=timezone.now)
+    resolved_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["resolved_at", "received_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_id} - {self.amount} ({self.reason})"
+
+
+# -------------------------------
+# 7c. Payment callbacks (inbox drained by services.payment_inbox)
+# -------------------------------
+class PaymentCallback(models.Model):
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("DONE", "Processed"),
+        ("FAILED", "Failed"),
+    ]
+
+    # not unique: providers retry callbacks; the drain skips ids already posted
+    transaction_id = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(default=timezone.now)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    processed_at = models.DateTimeField(blank=True, null=True)
+    error = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_id} ({self.status})"
+
+
+# -------------------------------
+# 7d. Ledger (append-only journal + balance checkpoints, see services.ledger)
+# -------------------------------
+class JournalEntry(models.Model):
+    KIND_CHOICES = [
+        ("DISBURSEMENT", "Disbursement"),
+        ("INTEREST", "Interest"),
+        ("PENALTY", "Late penalty"),
+        ("REPAYMENT", "Repayment"),
+        ("REVERSAL", "Reversal"),
+        ("WRITE_OFF", "Write-off"),
+    ]
+    ACCOUNT_CHOICES = [
+        ("LOANS", "Loans receivable"),
+        ("CASH", "Cash"),
+        ("INTEREST_INCOME", "Interest income"),
+        ("PENALTY_INCOME", "Penalty income"),
+        ("MEMBER_CREDIT", "Member credit (overpayments)"),
+        ("WRITE_OFFS", "Written-off loans"),
+    ]
+
+    # indexed through the (loan, posted_at) composite below
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="journal", db_index=False)
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    debit = models.CharField(max_length=15, choices=ACCOUNT_CHOICES)
+    credit = models.CharField(max_length=15, choices=ACCOUNT_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    posted_at = models.DateTimeField()  # when it takes effect
+    recorded_at = models.DateTimeField(default=timezone.now)
+    # e.g. the repayment's transaction id
+    reference = models.CharField(max_length=100, blank=True, default="")
+    reverses = models.ForeignKey("self", on_delete=models.CASCADE, null=True, blank=True, related_name="reversals")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["loan", "posted_at"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Journal entries can't be changed; post a reversal instead.")
         super().save(*args, **kwargs)
-        # update loan balance after saving repayment
-        self.loan.balance -= self.amount
-        if self.loan.balance <= 0:
-            self.loan.balance = 0
-            self.loan.status = "CLOSED"
-        self.loan.save()
+
+    def __str__(self):
+        return f"Loan {self.loan_id} {self.kind}: Dr {self.debit} / Cr {self.credit} {self.amount}"
+
+
+class LedgerCheckpoint(models.Model):
+    """A loan's receivable balance as of a moment, so balance reads start there."""
+    loan = models.ForeignKey(Loan, on_delete=models.CASCADE, related_name="checkpoints", db_index=False)
+    as_of = models.DateTimeField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ("loan", "as_of")
+
+    def __str__(self):
+        return f"Loan {self.loan_id} {self.balance} as of {self.as_of}"
 
 
 # -------------------------------
-# 8. Reports (basic log)
+# 8. Dashboard statistics (maintained by lending.signals)
+# -------------------------------
+class DashboardStats(models.Model):
+    """
+    Running totals per scope. `key` is "global", "office:<id>" or
+    "officer:<id>" so every dashboard reads a single row by primary key.
+    """
+    key = models.CharField(max_length=40, primary_key=True)
+
+    loans_total = models.IntegerField(default=0)
+    loans_pending = models.IntegerField(default=0)
+    loans_approved = models.IntegerField(default=0)
+    loans_rejected = models.IntegerField(default=0)
+    loans_disbursed = models.IntegerField(default=0)
+    loans_closed = models.IntegerField(default=0)
+    outstanding_balance = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_repaid = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    # head counts (office rows: officers/members, global row: everything)
+    officers_count = models.IntegerField(default=0)
+    members_count = models.IntegerField(default=0)
+    users_count = models.IntegerField(default=0)
+    companies_count = models.IntegerField(default=0)
+    offices_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return self.key
+
+
+# -------------------------------
+# 8b. Daily rollups (trend series, see services.rollups)
+# -------------------------------
+class DailyRollup(models.Model):
+    """
+    One scope's activity on one day. `key` is a DashboardStats key or
+    "policy:<id>" / "member:<id>"; member rows are kept per month (`day` is
+    the 1st), so a member has a handful of rows rather than one per payment.
+    """
+    key = models.CharField(max_length=40)
+    day = models.DateField()
+
+    amount_repaid = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    repayments_count = models.IntegerField(default=0)
+    principal_disbursed = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    loans_disbursed = models.IntegerField(default=0)
+    applications = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("key", "day")
+        indexes = [
+            models.Index(fields=["day"]),
+        ]
+
+    def __str__(self):
+        return f"{self.key} {self.day}"
+
+
+# -------------------------------
+# 9. Reports (log + stored snapshots, see services.report_snapshots)
 # -------------------------------
 class ReportLog(models.Model):
+    STATUS_CHOICES = [
+        ("PENDING", "Queued"),
+        ("RUNNING", "Running"),
+        ("DONE", "Ready"),
+        ("FAILED", "Failed"),
+    ]
+
     generated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     report_type = models.CharField(max_length=50)
     created_at = models.DateTimeField(default=timezone.now)
 
+    # what was asked for: "office:<id>", "officer:<id>" or "global", plus the filters
+    scope = models.CharField(max_length=40, blank=True, default="")
+    params = models.JSONField(default=dict, blank=True)
+    fingerprint = models.CharField(max_length=64, blank=True, default="")  # same report, same fingerprint
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
+    payload = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    claimed_at = models.DateTimeField(blank=True, null=True)  # when it last went RUNNING
+    completed_at = models.DateTimeField(blank=True, null=True)
+    error = models.CharField(max_length=255, blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["fingerprint", "created_at"]),
+            models.Index(fields=["scope", "created_at"]),
+            models.Index(fields=["status", "id"]),
+        ]
+
     def __str__(self):
         return f"{self.report_type} by {self.generated_by} on {self.created_at}"
+
+    @property
+    def query_string(self):
+        """The report's filters as a query string, to ask for it again."""
+        return urlencode(self.params or {})
+
+
+# -------------------------------
+# 9b. Balance verification (runs + discrepancies, see services.balance_check)
+# -------------------------------
+class BalanceCheck(models.Model):
+    STATUS_CHOICES = [
+        ("RUNNING", "Running"),
+        ("DONE", "Done"),
+        ("FAILED", "Failed"),
+    ]
+
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="RUNNING")
+    workers = models.PositiveIntegerField(default=1)
+    loans_checked = models.PositiveIntegerField(default=0)
+    discrepancies = models.PositiveIntegerField(default=0)
+    repaired = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Balance check {self.pk} ({self.status}): {self.discrepancies} discrepancies"
+
+
+class BalanceDiscrepancy(models.Model):
+    """A loan whose balance isn't total_payable less its repayments (and write-off)."""
+    run = models.ForeignKey(BalanceCheck, on_delete=models.CASCADE, related_name="found")
+    # not a foreign key: the report outlives the loan
+    loan_id = models.BigIntegerField()
+    status = models.CharField(max_length=20)
+    recorded = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    expected = models.DecimalField(max_digits=12, decimal_places=2)
+    total_payable = models.DecimalField(max_digits=12, decimal_places=2)
+    repaid = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    written_off = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    repaired_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["loan_id"]),
+        ]
+
+    def __str__(self):
+        return f"Loan {self.loan_id}: {self.recorded}, expected {self.expected}"
@@ -0,0 +1,187 @@
+# lending/pagination.py
+"""
+Keyset (cursor) pagination for list views.
+
+Rows are ordered by a unique key such as ("-created_at", "-id") and each
+page is fetched with a WHERE on the last key seen instead of an OFFSET, so
+page 500 costs the same as page 1. Cursors are opaque base64 tokens.
+
+Rows in an order no key can resume from (search relevance) are paged by
+number instead, with offset_paginate.
+"""
+
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 50
+CURSOR_PARAM = "cursor"
+PAGE_PARAM = "page"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_query=None, prev_query=None):
+        self.object_list = object_list
+        self.next_query = next_query
+        self.prev_query = prev_query
+
+    @property
+    def has_next(self):
+        return self.next_query is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_query is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+# -------------------------------
+# Cursor encoding
+# -------------------------------
+def _json_default(value):
+    # full precision: DjangoJSONEncoder would cut datetimes to milliseconds
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({"v": values, "d": direction}, default=_json_default)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, fields):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload["v"], payload["d"]
+        if direction not in ("next", "prev") or len(values) != len(fields):
+            raise InvalidCursor(token)
+        return [field.to_python(v) for field, v in zip(fields, values)], direction
+    except (ValueError, KeyError, TypeError, ValidationError) as exc:
+        raise InvalidCursor(token) from exc
+
+
+# -------------------------------
+# Helpers
+# -------------------------------
+def _model_field(model, path):
+    field = None
+    for name in path.split("__"):
+        field = model._meta.get_field(name)
+        model = field.related_model or model
+    return field
+
+
+def _row_value(obj, path):
+    for name in path.split("__"):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _after(ordering, values):
+    """Q matching rows strictly after `values` in `ordering` (row-value comparison, expanded)."""
+    condition = Q()
+    for i, key in enumerate(ordering):
+        name = key.lstrip("-")
+        op = "lt" if key.startswith("-") else "gt"
+        term = Q(**{f"{name}__{op}": values[i]})
+        for prev_key, prev_value in zip(ordering[:i], values[:i]):
+            term &= Q(**{prev_key.lstrip("-"): prev_value})
+        condition |= term
+    return condition
+
+
+def _reverse(ordering):
+    return [key[1:] if key.startswith("-") else f"-{key}" for key in ordering]
+
+
+def _query(request, token, param=CURSOR_PARAM):
+    params = request.GET.copy()
+    params[param] = token
+    return params.urlencode()
+
+
+# -------------------------------
+# Entry point
+# -------------------------------
+def keyset_paginate(request, queryset, ordering, page_size=PAGE_SIZE):
+    """
+    Return one KeysetPage of `queryset` ordered by `ordering`, which must end
+    in a unique column (normally "id" / "-id"). An invalid cursor restarts at
+    the first page.
+    """
+    ordering = list(ordering)
+    names = [key.lstrip("-") for key in ordering]
+    fields = [_model_field(queryset.model, name) for name in names]
+
+    direction, values = "next", None
+    token = request.GET.get(CURSOR_PARAM)
+    if token:
+        try:
+            values, direction = decode_cursor(token, fields)
+        except InvalidCursor:
+            values, direction = None, "next"
+
+    if direction == "prev":
+        qs = queryset.filter(_after(_reverse(ordering), values)).order_by(*_reverse(ordering))
+    else:
+        qs = queryset.order_by(*ordering)
+        if values is not None:
+            qs = qs.filter(_after(ordering, values))
+
+    rows = list(qs[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "prev":
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage([])
+
+    first = [_row_value(rows[0], name) for name in names]
+    last = [_row_value(rows[-1], name) for name in names]
+    if direction == "prev":
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, values is not None
+
+    return KeysetPage(
+        rows,
+        next_query=_query(request, encode_cursor(last, "next")) if has_next else None,
+        prev_query=_query(request, encode_cursor(first, "prev")) if has_prev else None,
+    )
+
+
+def offset_paginate(request, fetch, page_size=PAGE_SIZE):
+    """
+    Return one KeysetPage by page number, for rows that have no resumable
+    order. `fetch(offset, limit)` returns up to `limit` rows from the
+    `offset`-th on. An invalid page number is the first page.
+    """
+    try:
+        number = max(int(request.GET.get(PAGE_PARAM, 1)), 1)
+    except ValueError:
+        number = 1
+
+    rows = list(fetch((number - 1) * page_size, page_size + 1))
+    return KeysetPage(
+        rows[:page_size],
+        next_query=_query(request, number + 1, PAGE_PARAM) if len(rows) > page_size else None,
+        prev_query=_query(request, number - 1, PAGE_PARAM) if number > 1 else None,
+    )
@@ -0,0 +1,106 @@
+# lending/principal.py
+"""
+Cached authorization context for the signed-in user.
+
+A Principal carries everything the role decorators and view scoping need
+(role, office, company, member profile, a manager's assigned officers).
+It is built once, kept in the cache per user and attached to the request
+as `request.principal`, so checks like "which office's loans may this
+manager see" don't re-read User/Office rows on every request. The
+handlers in lending.signals drop the cached entry when any of its inputs
+change, which reaches other processes only through a shared cache
+(settings.LENDING_CACHE_URL). An entry whose role or office no longer
+match the User row the request loaded anyway is rebuilt on the spot, and
+the rest (company, profile, assigned officers) lives CACHE_TIMEOUT at most.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .models import ManagerOfficerAssignment, MemberProfile, User
+
+CACHE_TIMEOUT = 5 * 60
+
+
+class Principal:
+    __slots__ = ("user_id", "role", "office_id", "company_id", "profile_id", "officer_ids")
+
+    def __init__(self, user_id, role, office_id=None, company_id=None, profile_id=None, officer_ids=()):
+        self.user_id = user_id
+        self.role = role
+        self.office_id = office_id
+        self.company_id = company_id
+        self.profile_id = profile_id
+        self.officer_ids = frozenset(officer_ids)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f"<Principal user={self.user_id} role={self.role} office={self.office_id}>"
+
+
+def cache_key(user_id):
+    return f"lending:principal:{user_id}"
+
+
+def load_principal(user):
+    """Build a Principal from the database (used on a cache miss)."""
+    company_id = None
+    if user.office_id:
+        company_id = User.objects.filter(pk=user.pk).values_list("office__company_id", flat=True).first()
+
+    profile_id, officer_ids = None, ()
+    if user.role == "MEMBER":
+        profile_id = MemberProfile.objects.filter(user_id=user.pk).values_list("pk", flat=True).first()
+    elif user.role == "MANAGER":
+        officer_ids = ManagerOfficerAssignment.objects.filter(manager_id=user.pk).values_list("officer_id", flat=True)
+
+    return Principal(user.pk, user.role, user.office_id, company_id, profile_id, officer_ids)
+
+
+def _current(principal, user):
+    return principal is not None and (principal.role, principal.office_id) == (user.role, user.office_id)
+
+
+def get_principal(request):
+    """The request's Principal, or None for anonymous users."""
+    if hasattr(request, "principal"):
+        return request.principal
+
+    user = request.user
+    principal = None
+    if user.is_authenticated:
+        principal = cache.get(cache_key(user.pk))
+        if not _current(principal, user):
+            principal = load_principal(user)
+            cache.set(cache_key(user.pk), principal, CACHE_TIMEOUT)
+
+    request.principal = principal
+    return principal
+
+
+async def aget_principal(request):
+    """get_principal for async views."""
+    if hasattr(request, "principal"):
+        return request.principal
+
+    # also replaces the lazy request.user, so the template doesn't load the user again
+    user = request.user = await request.auser()
+    principal = None
+    if user.is_authenticated:
+        principal = await cache.aget(cache_key(user.pk))
+        if not _current(principal, user):
+            principal = await sync_to_async(load_principal)(user)
+            await cache.aset(cache_key(user.pk), principal, CACHE_TIMEOUT)
+
+    request.principal = principal
+    return principal
+
+
+def invalidate(*user_ids):
+    cache.delete_many([cache_key(pk) for pk in user_ids if pk])
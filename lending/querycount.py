@@ -0,0 +1,140 @@
+# lending/querycount.py
+"""
+Per-request SQL instrumentation.
+
+QueryInspector records every statement run on the database connection
+while it is active, with a fingerprint (the SQL with its parameters and
+literals folded away) and the place it came from: the template line being
+rendered, or else the innermost frame in the lending package. The same
+fingerprint repeated from one place is an N+1 pattern - one query per row
+of something the view already loaded.
+
+QueryCountMiddleware wraps each request in an inspector when
+settings.LENDING_QUERY_INSPECTOR is on (it follows DEBUG by default), sets
+an X-Query-Count header and logs N+1 patterns to the "lending.queries"
+logger. The tests use the inspector directly to hold every page to its
+query budget.
+"""
+
+import logging
+import os
+import re
+import sys
+from collections import Counter, namedtuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.base import Node
+
+logger = logging.getLogger("lending.queries")
+
+N_PLUS_ONE_THRESHOLD = 3
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+Query = namedtuple("Query", ["sql", "fingerprint", "origin"])
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+
+
+def fingerprint(sql):
+    """`sql` with literals and IN-list lengths folded, so per-row variants compare equal."""
+    sql = _LITERALS.sub("?", sql)
+    sql = _PLACEHOLDER_LISTS.sub("(...)", sql)
+    return " ".join(sql.split())
+
+
+def _origin(frame):
+    """The template line being rendered, else the innermost lending frame, as "file:line"."""
+    app_frame = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "render_annotated":
+            node = frame.f_locals.get("self")
+            if isinstance(node, Node) and node.origin is not None:
+                return f"{node.origin.template_name or node.origin.name}:{node.token.lineno}"
+        elif app_frame is None and code.co_filename.startswith(APP_DIR) and code.co_filename != __file__:
+            app_frame = f"{os.path.relpath(code.co_filename, os.path.dirname(APP_DIR))}:{frame.f_lineno}"
+        frame = frame.f_back
+    return app_frame or "?"
+
+
+class QueryInspector:
+    """
+    Context manager recording the statements run on `connection`:
+
+        with QueryInspector() as inspector:
+            response = client.get(url)
+        inspector.count, inspector.repeated()
+    """
+
+    def __init__(self, using=connection):
+        self.connection = using
+        self.queries = []
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(Query(sql, fingerprint(sql), _origin(sys._getframe(1))))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """[(origin, fingerprint, times)] for statements run `threshold` or more times from one place."""
+        counts = Counter((q.origin, q.fingerprint) for q in self.queries)
+        return [(origin, fp, times) for (origin, fp), times in counts.most_common() if times >= threshold]
+
+    def report(self):
+        return "\n".join(f"{times}x from {origin}: {fp}" for origin, fp, times in self.repeated())
+
+
+class QueryCountMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "LENDING_QUERY_INSPECTOR", settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # statements a streamed body runs while it is being sent are not counted
+        with QueryInspector() as inspector:
+            response = self.get_response(request)
+        return self._record(request, response, inspector)
+
+    async def __acall__(self, request):
+        # sync views and the async ORM both run their statements in
+        # sync_to_async's thread, on that thread's connection, so the
+        # inspector is attached there rather than in the event loop
+        inspector = QueryInspector()
+        await sync_to_async(inspector.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(inspector.__exit__)(None, None, None)
+        return self._record(request, response, inspector)
+
+    def _record(self, request, response, inspector):
+        response["X-Query-Count"] = str(inspector.count)
+        for origin, fp, times in inspector.repeated():
+            logger.warning("N+1 on %s: %d queries from %s: %s", request.path, times, origin, fp)
+        logger.debug("%s ran %d queries", request.path, inspector.count)
+        return response
@@ -0,0 +1,2 @@
+# lending/services/__init__.py
+# Domain services shared by views, signals and management commands.
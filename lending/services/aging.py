@@ -0,0 +1,132 @@
+# lending/services/aging.py
+
+from decimal import Decimal
+
+from django.db.models import Count, F, Min, Sum
+from django.utils import timezone
+
+from ..models import Installment, Loan, LoanAging
+
+DEFAULT_CHUNK_SIZE = 2000
+PAR_BUCKETS = ["PAR1_30", "PAR31_60", "PAR61_90", "PAR90"]
+
+
+def bucket_for(days_past_due):
+    if days_past_due <= 0:
+        return "CURRENT"
+    if days_past_due <= 30:
+        return "PAR1_30"
+    if days_past_due <= 60:
+        return "PAR31_60"
+    if days_past_due <= 90:
+        return "PAR61_90"
+    return "PAR90"
+
+
+# -------------------------------
+# Maintenance
+# -------------------------------
+def refresh_aging(loan_ids, as_of=None):
+    """
+    Recompute the aging rows of the given loans.
+
+    Two reads (loans, overdue installments grouped per loan) and one upsert,
+    whatever the number of loans. Loans that are no longer disbursed with a
+    positive balance drop out of the table.
+    """
+    loan_ids = list(loan_ids)
+    if not loan_ids:
+        return
+    as_of = as_of or timezone.localdate()
+
+    loans = Loan.objects.filter(pk__in=loan_ids).values(
+        "id", "status", "balance", "officer_id", "officer__office_id"
+    )
+    overdue = {
+        row["loan_id"]: row
+        for row in Installment.objects.filter(loan_id__in=loan_ids, due_date__lte=as_of)
+        .exclude(status="PAID")
+        .values("loan_id")
+        .annotate(oldest=Min("due_date"), overdue=Sum(F("amount_due") - F("amount_paid")))
+    }
+
+    rows, closed = [], []
+    for loan in loans:
+        if loan["status"] != "DISBURSED" or not loan["balance"] or loan["balance"] <= 0:
+            closed.append(loan["id"])
+            continue
+        arrears = overdue.get(loan["id"])
+        days = (as_of - arrears["oldest"]).days if arrears else 0
+        rows.append(LoanAging(
+            loan_id=loan["id"],
+            officer_id=loan["officer_id"],
+            office_id=loan["officer__office_id"],
+            days_past_due=max(days, 0),
+            bucket=bucket_for(days),
+            amount_overdue=arrears["overdue"] if arrears else Decimal("0"),
+            outstanding=loan["balance"],
+            as_of=as_of,
+        ))
+
+    if closed:
+        LoanAging.objects.filter(loan_id__in=closed).delete()
+    LoanAging.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["loan"],
+        update_fields=["officer", "office", "days_past_due", "bucket", "amount_overdue", "outstanding", "as_of"],
+    )
+
+
+def age_portfolio(as_of=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Nightly sweep: re-age every disbursed loan, walking the table by id range."""
+    as_of = as_of or timezone.localdate()
+    last_id, total = 0, 0
+
+    # stale rows for loans that closed outside the normal write paths
+    LoanAging.objects.exclude(loan__status="DISBURSED").delete()
+
+    while True:
+        ids = list(
+            Loan.objects.filter(status="DISBURSED", pk__gt=last_id)
+            .order_by("pk").values_list("pk", flat=True)[:chunk_size]
+        )
+        if not ids:
+            return total
+        refresh_aging(ids, as_of=as_of)
+        total += len(ids)
+        last_id = ids[-1]
+
+
+def move_officer(officer_id, office_id):
+    """Point the aging rows of an officer's loans at the officer's new office."""
+    LoanAging.objects.filter(officer_id=officer_id).update(office_id=office_id)
+
+
+# -------------------------------
+# Portfolio-at-risk reads
+# -------------------------------
+def par_summary(**scope):
+    """
+    Bucket counts and outstanding amounts for an office or officer, e.g.
+    par_summary(office=office) or par_summary(officer=user).
+    """
+    rows = LoanAging.objects.filter(**scope).values("bucket").annotate(
+        loans=Count("id"), outstanding=Sum("outstanding")
+    )
+    buckets = {key: {"loans": 0, "outstanding": Decimal("0")} for key, _ in LoanAging.BUCKET_CHOICES}
+    for row in rows:
+        buckets[row["bucket"]] = {"loans": row["loans"], "outstanding": row["outstanding"] or Decimal("0")}
+
+    portfolio = sum((b["outstanding"] for b in buckets.values()), Decimal("0"))
+    at_risk = sum((buckets[key]["outstanding"] for key in PAR_BUCKETS), Decimal("0"))
+    return {
+        "buckets": [
+            {"key": key, "label": label, **buckets[key]} for key, label in LoanAging.BUCKET_CHOICES
+        ],
+        "overdue_loans": sum(buckets[key]["loans"] for key in PAR_BUCKETS),
+        "portfolio": portfolio,
+        "at_risk": at_risk,
+        "par_ratio": (at_risk / portfolio * 100) if portfolio else Decimal("0"),
+    }
+
@@ -0,0 +1,237 @@
+# lending/services/assignment.py
+"""
+Automatic officer assignment for new loan applications.
+
+A new loan goes to an officer of the member's office. By default that is
+the officer with the fewest open (pending or approved) loans, and ties go
+to whoever was assigned least recently. With
+settings.LENDING_ASSIGNMENT_STRATEGY = "round_robin" it goes to whoever was
+assigned least recently.
+
+Each office's officers sit in a heap ordered by that key, so choosing one
+is O(log officers) instead of a COUNT per officer. The workload counters
+are seeded from the officers' DashboardStats rows (loans_pending +
+loans_approved) and then adjusted by the same loan changes that adjust
+those rows, once the transaction that made them commits. The heap lives
+in process memory. The counters also go to the cache, one entry per office
+with a version token, so other processes notice the change and rebuild
+their heap from the cached counters; that needs a shared cache
+(LENDING_CACHE_URL, lending.E001), as with the default per-process cache
+each process counts only its own changes. The counters steer the
+balancing only; whatever they drift by is dropped when the entry expires,
+CACHE_TIMEOUT after it was seeded from DashboardStats, however often it
+is written in between.
+"""
+
+import heapq
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ..models import DashboardStats, Loan, User
+from . import stats
+
+CACHE_TIMEOUT = 10 * 60
+OPEN_STATUSES = ("PENDING", "APPROVED")
+STRATEGIES = ("least_loaded", "round_robin")
+
+_offices = {}  # office_id -> OfficeWorkload, this process's heaps
+_lock = threading.Lock()
+
+
+def cache_key(office_id):
+    return f"lending:workload:{office_id}"
+
+
+def _strategy():
+    strategy = getattr(settings, "LENDING_ASSIGNMENT_STRATEGY", "least_loaded")
+    if strategy not in STRATEGIES:
+        raise ValueError(f"LENDING_ASSIGNMENT_STRATEGY must be one of {', '.join(STRATEGIES)}")
+    return strategy
+
+
+class OfficeWorkload:
+    """
+    One office's officers in a heap keyed by (open loans, last turn), or by
+    last turn alone for round robin. Updates push a fresh entry and leave the
+    old one behind; an entry whose key no longer matches its officer is
+    skipped when it reaches the top.
+    """
+
+    def __init__(self, counts, turns=None, version=None, round_robin=False, expires=0):
+        self.counts = dict(counts)  # officer_id -> open loans
+        self.turns = {pk: (turns or {}).get(pk, 0) for pk in self.counts}  # officer_id -> last turn
+        self._turn = max(self.turns.values(), default=0)
+        self.version = version
+        self.expires = expires  # time.time() after which the counters are reseeded
+        self.round_robin = round_robin
+        self._rebuild()
+
+    def _key(self, officer_id):
+        turn = self.turns[officer_id]
+        return (turn, officer_id) if self.round_robin else (self.counts[officer_id], turn, officer_id)
+
+    def _rebuild(self):
+        self._heap = [self._key(pk) for pk in self.counts]
+        heapq.heapify(self._heap)
+
+    def _push(self, officer_id):
+        heapq.heappush(self._heap, self._key(officer_id))
+        if len(self._heap) > 4 * len(self.counts) + 16:
+            self._rebuild()
+
+    def next_officer(self):
+        """The officer to assign next (None if the office has none); takes their turn."""
+        while self._heap:
+            key = self._heap[0]
+            officer_id = key[-1]
+            if officer_id in self.counts and key == self._key(officer_id):
+                self._turn += 1
+                self.turns[officer_id] = self._turn
+                self._push(officer_id)
+                return officer_id
+            heapq.heappop(self._heap)
+        return None
+
+    def adjust(self, officer_id, delta):
+        if officer_id in self.counts:
+            self.counts[officer_id] += delta
+            self._push(officer_id)
+
+    def state(self):
+        return {"version": self.version, "expires": self.expires, "counts": self.counts, "turns": self.turns}
+
+
+def _load_counts(office_id):
+    officer_ids = list(
+        User.objects.filter(role="OFFICER", office_id=office_id, is_active=True).values_list("pk", flat=True)
+    )
+    counts = dict.fromkeys(officer_ids, 0)
+    rows = DashboardStats.objects.filter(key__in=[stats.officer_key(pk) for pk in officer_ids])
+    for key, pending, approved in rows.values_list("key", "loans_pending", "loans_approved"):
+        counts[int(key.split(":")[1])] = pending + approved
+    return counts
+
+
+def _workload(office_id):
+    """This process's heap for the office, rebuilt when the cached counters changed elsewhere."""
+    round_robin = _strategy() == "round_robin"
+    local = _offices.get(office_id)
+    entry = cache.get(cache_key(office_id))
+    if entry is None or entry.get("expires", 0) <= time.time():
+        local = OfficeWorkload(
+            _load_counts(office_id), version=uuid.uuid4().hex, round_robin=round_robin,
+            expires=time.time() + CACHE_TIMEOUT,
+        )
+        cache.set(cache_key(office_id), local.state(), CACHE_TIMEOUT)
+    elif local is None or local.version != entry["version"] or local.round_robin != round_robin:
+        local = OfficeWorkload(
+            entry["counts"], entry["turns"], entry["version"], round_robin=round_robin, expires=entry["expires"],
+        )
+    _offices[office_id] = local
+    return local
+
+
+def _save(office_id, workload):
+    """Write the counters back, keeping the expiry they were seeded with."""
+    workload.version = uuid.uuid4().hex
+    timeout = workload.expires - time.time()
+    if timeout > 0:
+        cache.set(cache_key(office_id), workload.state(), timeout)
+    else:
+        cache.delete(cache_key(office_id))
+
+
+# -------------------------------
+# Assignment
+# -------------------------------
+def pick_officer(office_id):
+    """Id of the officer of `office_id` who should take the next application (None if there is none)."""
+    if not office_id:
+        return None
+    with _lock:
+        workload = _workload(office_id)
+        officer_id = workload.next_officer()
+        if officer_id is not None:
+            _save(office_id, workload)
+    return officer_id
+
+
+def _deltas(changes):
+    """{(office_id, officer_id): change in open loans} for (old, new) stats.LoanState pairs."""
+    deltas = {}
+    for old, new in changes:
+        for state, sign in ((old, -1), (new, 1)):
+            if state is not None and state.officer_id and state.office_id and state.status in OPEN_STATUSES:
+                key = (state.office_id, state.officer_id)
+                deltas[key] = deltas.get(key, 0) + sign
+    return deltas
+
+
+def record_loan_changes(changes):
+    """
+    Adjust the workload counters for (old, new) stats.LoanState pairs, as
+    stats.record_loan_changes adjusts the dashboard counters, once the
+    current transaction commits (a rollback leaves them as they were).
+    """
+    deltas = _deltas(changes)
+    if any(deltas.values()):
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def _apply(deltas):
+    with _lock:
+        for office_id in {office_id for office_id, _ in deltas}:
+            entry = cache.get(cache_key(office_id))
+            if entry is None or entry.get("expires", 0) <= time.time():
+                continue  # not loaded; the next pick reads DashboardStats, which already has the change
+            workload = _workload(office_id)
+            for (office, officer_id), delta in deltas.items():
+                if office == office_id and delta:
+                    workload.adjust(officer_id, delta)
+            _save(office_id, workload)
+
+
+def invalidate(*office_ids):
+    """Drop the offices' counters (officers joined, left or changed role)."""
+    office_ids = [pk for pk in office_ids if pk]
+    with _lock:
+        for office_id in office_ids:
+            _offices.pop(office_id, None)
+    cache.delete_many([cache_key(pk) for pk in office_ids])
+
+
+# -------------------------------
+# Backlog
+# -------------------------------
+def assign_unassigned_loans():
+    """
+    Give every open loan without an officer to one, office by office.
+    Returns the number of loans assigned.
+    """
+    loans = Loan.objects.filter(officer__isnull=True, status__in=OPEN_STATUSES).values_list(
+        "id", "member__user__office_id", "status", "balance",
+    )
+    by_officer, changes = {}, []
+    for loan_id, office_id, status, balance in loans.iterator():
+        officer_id = pick_officer(office_id)
+        if officer_id is None:
+            continue
+        by_officer.setdefault(officer_id, []).append(loan_id)
+        change = (stats.LoanState(None, None, status, balance), stats.LoanState(officer_id, office_id, status, balance))
+        _apply(_deltas([change]))  # counted now, so the next pick sees it
+        changes.append(change)
+
+    try:
+        with transaction.atomic():
+            for officer_id, loan_ids in by_officer.items():
+                Loan.objects.filter(pk__in=loan_ids, officer__isnull=True).update(officer_id=officer_id)
+            stats.record_loan_changes(changes)
+    except Exception:
+        _apply({key: -delta for key, delta in _deltas(changes).items()})
+        raise
+    return len(changes)
@@ -0,0 +1,179 @@
+# lending/services/balance_check.py
+"""
+Balance verification: does every loan's balance agree with its repayments?
+
+A loan's balance should be its total_payable less its repayments and any
+write-off (the ledger's WRITE_OFF entries), never below zero, the way
+apply_loan_payments stops at zero. verify_balances splits the loan table
+into id ranges of `chunk_size` loans and checks them on a pool of
+`workers` processes. A range costs one grouped query (loans joined to
+their repayments) that returns only the loans that are off; the worker
+records them as BalanceDiscrepancy rows of the run's BalanceCheck. The
+reads take no locks and hold no transaction across ranges, so postings
+carry on meanwhile.
+
+repair (verify_balances(repair=True), the --repair flag) then sets each
+reported loan's balance to the expected one, closing a disbursed loan at
+zero and reopening a closed one with a balance left. Each update is
+guarded on the balance and status the loan was found with: a loan a
+posting changed since is left for the next run. Aging and member
+summaries follow the repaired loans. The dashboard counters are rebuilt
+from the source tables, as there is no telling whether a drifted balance
+ever reached them.
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+
+import django
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models import F, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from ..models import BalanceCheck, BalanceDiscrepancy, JournalEntry, Loan
+from . import member_summary, stats
+from .aging import refresh_aging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 10000
+ZERO = Decimal("0")
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+# -------------------------------
+# Checking (runs in the workers)
+# -------------------------------
+def _suspects(lo, hi):
+    """Loans lo <= id < hi whose balance isn't total_payable less their repayments."""
+    zero = Value(ZERO)
+    return (
+        Loan.objects.filter(pk__gte=lo, pk__lt=hi, total_payable__isnull=False)
+        .values("pk", "status", "balance", "total_payable")
+        .annotate(repaid=Coalesce(Sum("repayments__amount"), zero))
+        .annotate(expected=Greatest(F("total_payable") - F("repaid"), zero))
+        .filter(Q(balance__isnull=True) | ~Q(balance=F("expected")))
+        .order_by()
+        .values_list("pk", "status", "balance", "total_payable", "repaid")
+    )
+
+
+def check_range(run_id, lo, hi):
+    """Record the loans lo <= id < hi whose balance is off; returns how many."""
+    suspects = list(_suspects(lo, hi))
+    if not suspects:
+        return 0
+    written_off = dict(
+        JournalEntry.objects.filter(loan_id__in=[row[0] for row in suspects], kind="WRITE_OFF")
+        .values_list("loan_id").annotate(total=Sum("amount")).order_by()
+    )
+    found = []
+    for pk, status, recorded, total_payable, repaid in suspects:
+        off = written_off.get(pk, ZERO)
+        expected = max(total_payable - repaid - off, ZERO)
+        if recorded != expected:
+            found.append(BalanceDiscrepancy(
+                run_id=run_id, loan_id=pk, status=status, recorded=recorded, expected=expected,
+                total_payable=total_payable, repaid=repaid, written_off=off,
+            ))
+    BalanceDiscrepancy.objects.bulk_create(found)
+    return len(found)
+
+
+def _init_worker():
+    if not apps.ready:  # spawned rather than forked
+        django.setup()
+
+
+# -------------------------------
+# Entry point
+# -------------------------------
+def _ranges(chunk_size):
+    bounds = Loan.objects.aggregate(lo=Min("pk"), hi=Max("pk"))
+    if bounds["lo"] is None:
+        return []
+    return [(start, start + chunk_size) for start in range(bounds["lo"], bounds["hi"] + 1, chunk_size)]
+
+
+def verify_balances(workers=1, chunk_size=DEFAULT_CHUNK_SIZE, repair=False, log=None):
+    """
+    Check every loan's balance, `chunk_size` loans per query, on `workers`
+    processes (1: in this process). Returns the BalanceCheck row.
+    """
+    log = log or (lambda message: None)
+    run = BalanceCheck.objects.create(workers=workers)
+    ranges = _ranges(chunk_size)
+    found = 0
+    try:
+        if workers > 1 and len(ranges) > 1:
+            connections.close_all()  # the workers open their own
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(check_range, run.pk, lo, hi) for lo, hi in ranges]
+                for done, future in enumerate(as_completed(futures), start=1):
+                    found += future.result()
+                    log(f"ranges {done}/{len(ranges)}, discrepancies {found}")
+        else:
+            for done, (lo, hi) in enumerate(ranges, start=1):
+                found += check_range(run.pk, lo, hi)
+                log(f"ranges {done}/{len(ranges)}, discrepancies {found}")
+    except Exception:
+        logger.exception("Balance check %s failed", run.pk)
+        run.status, run.finished_at = "FAILED", timezone.now()
+        run.save(update_fields=["status", "finished_at"])
+        raise
+
+    run.loans_checked = Loan.objects.filter(pk__lt=ranges[-1][1]).count() if ranges else 0
+    run.discrepancies = found
+    run.status, run.finished_at = "DONE", timezone.now()
+    run.save(update_fields=["loans_checked", "discrepancies", "status", "finished_at"])
+    if repair and found:
+        repair_balances(run)
+    return run
+
+
+# -------------------------------
+# Repair
+# -------------------------------
+def _repaired_status(status, expected):
+    if status == "DISBURSED" and expected == 0:
+        return "CLOSED"
+    if status == "CLOSED" and expected > 0:
+        return "DISBURSED"
+    return status
+
+
+def repair_balances(run, now=None):
+    """Set the balances `run` found off to the expected ones. Returns how many were repaired."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        pending = list(run.found.filter(repaired_at__isnull=True))
+        members = dict(
+            Loan.objects.filter(pk__in=[d.loan_id for d in pending]).values_list("id", "member_id")
+        )
+        repaired = []
+        for discrepancy in pending:
+            if discrepancy.loan_id not in members:
+                continue
+            status = _repaired_status(discrepancy.status, discrepancy.expected)
+            if not Loan.objects.filter(
+                pk=discrepancy.loan_id, balance=discrepancy.recorded, status=discrepancy.status,
+            ).update(balance=discrepancy.expected, status=status):
+                continue  # changed since it was checked
+            discrepancy.repaired_at = now
+            repaired.append(discrepancy)
+
+        BalanceDiscrepancy.objects.bulk_update(repaired, ["repaired_at"])
+        refresh_aging([d.loan_id for d in repaired])
+        member_summary.refresh_summaries(members[d.loan_id] for d in repaired)
+        if repaired:
+            stats.rebuild_stats()
+        run.repaired = run.found.filter(repaired_at__isnull=False).count()
+        run.save(update_fields=["repaired"])
+    return len(repaired)
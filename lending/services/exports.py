@@ -0,0 +1,74 @@
+# lending/services/exports.py
+
+import csv
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() returns the line so csv.writer output can be yielded."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(filename, header, rows):
+    """Stream `rows` as a CSV download without building the file in memory."""
+    writer = csv.writer(Echo())
+
+    def generate():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(generate(), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+# -------------------------------
+# Row pipelines (flat tuples, fetched in chunks)
+# -------------------------------
+MEMBER_HEADER = ["ID", "Name", "Email", "Phone", "National ID"]
+ADMIN_MEMBER_HEADER = [*MEMBER_HEADER, "Active"]  # the admin export also says who can sign in
+LOAN_HEADER = [
+    "ID", "Member", "National ID", "Officer", "Policy", "Principal", "Interest Rate",
+    "Term (Months)", "Total Payable", "Balance", "Status", "Applied On", "Disbursed On",
+]
+REPAYMENT_HEADER = ["ID", "Transaction ID", "Loan ID", "Member", "Payer Phone", "Amount", "Paid At"]
+
+
+def member_rows(members, active=False):
+    """MEMBER_HEADER rows, or ADMIN_MEMBER_HEADER rows with `active`."""
+    for pk, first, last, email, phone, national_id, is_active in members.values_list(
+        "id", "user__first_name", "user__last_name", "user__email",
+        "phone_number", "national_id", "user__is_active",
+    ).order_by("id").iterator(chunk_size=CHUNK_SIZE):
+        row = [pk, f"{first} {last}", email, phone, national_id]
+        yield [*row, "Yes" if is_active else "No"] if active else row
+
+
+def loan_rows(loans):
+    for row in loans.values_list(
+        "id", "member__user__first_name", "member__user__last_name", "member__national_id",
+        "officer__username", "policy__name", "principal_amount", "interest_rate",
+        "term_months", "total_payable", "balance", "status", "created_at", "disbursed_at",
+    ).order_by("id").iterator(chunk_size=CHUNK_SIZE):
+        pk, first, last, national_id, *rest = row
+        created_at, disbursed_at = rest[-2:]
+        yield [
+            pk, f"{first} {last}", national_id, *rest[:-2],
+            timezone.localdate(created_at).isoformat(),
+            timezone.localdate(disbursed_at).isoformat() if disbursed_at else "",
+        ]
+
+
+def repayment_rows(repayments):
+    for pk, transaction_id, loan_id, first, last, phone, amount, paid_at in repayments.values_list(
+        "id", "transaction_id", "loan_id", "loan__member__user__first_name",
+        "loan__member__user__last_name", "payer_phone", "amount", "paid_at",
+    ).order_by("id").iterator(chunk_size=CHUNK_SIZE):
+        yield [pk, transaction_id, loan_id, f"{first} {last}", phone, amount, timezone.localtime(paid_at).isoformat()]
@@ -0,0 +1,94 @@
+# lending/services/identifiers.py
+"""
+Normalized login identifiers. Emails are lower-cased, phone numbers are
+rewritten to E.164 (local numbers get settings.LENDING_DEFAULT_COUNTRY_CODE)
+and usernames are kept as typed, so "0712 345 678", "712345678" and
+"+254712345678" all resolve to the same LoginIdentifier row. A login
+string that reads as a phone number is also tried as a username.
+"""
+
+import re
+
+from django.conf import settings
+
+from ..models import LoginIdentifier, MemberProfile, User
+
+PHONE_RE = re.compile(r"^\+?[\d\s().-]{6,20}$")
+
+
+def normalize_phone(raw):
+    if not raw:
+        return None
+    raw = raw.strip()
+    if not PHONE_RE.match(raw):
+        return None
+    digits = re.sub(r"\D", "", raw)
+    country = str(getattr(settings, "LENDING_DEFAULT_COUNTRY_CODE", "254"))
+    if raw.startswith("+"):
+        return f"+{digits}"
+    if digits.startswith("00"):
+        return f"+{digits[2:]}"
+    if digits.startswith(country) and len(digits) > 10:
+        return f"+{digits}"
+    return f"+{country}{digits.lstrip('0')}"
+
+
+def lookup_keys(raw):
+    """
+    The keys a login string is looked up by: a lower-cased email, or the
+    phone number it may be (E.164) and the string as typed, since a
+    username can be all digits too.
+    """
+    raw = (raw or "").strip()
+    if "@" in raw:
+        return [raw.lower()]
+    phone = normalize_phone(raw)
+    return [phone, raw] if phone and phone != raw else [raw]
+
+
+def identifiers_for(username, email, phone_number=None):
+    entries = []
+    if email:
+        entries.append((email.strip().lower(), "EMAIL"))
+    if username:
+        entries.append((username, "USERNAME"))
+    phone = normalize_phone(phone_number)
+    if phone:
+        entries.append((phone, "PHONE"))
+    return entries
+
+
+def sync_user(user_id, model=LoginIdentifier, user_model=User, profile_model=MemberProfile):
+    """
+    Make the user's identifier rows match their current email, username and
+    phone. An identifier already owned by another user is left with them
+    (shared phone numbers stay ambiguous rather than switching owner).
+    """
+    user = user_model.objects.filter(pk=user_id).values_list("username", "email").first()
+    if user is None:
+        return
+    phone = profile_model.objects.filter(user_id=user_id).values_list("phone_number", flat=True).first()
+    wanted = identifiers_for(*user, phone)
+
+    model.objects.filter(user_id=user_id).exclude(identifier__in=[i for i, _ in wanted]).delete()
+    model.objects.bulk_create(
+        [model(identifier=i, kind=kind, user_id=user_id) for i, kind in wanted],
+        ignore_conflicts=True,
+    )
+
+
+def resolve_users(raw):
+    """
+    The users a login string may belong to, in one indexed query: none, one,
+    or the owner of a phone number and of an identical username, in that
+    order.
+    """
+    users = []
+    for entry in (
+        LoginIdentifier.objects.select_related("user")
+        .filter(identifier__in=lookup_keys(raw))
+        .order_by("kind")
+    ):
+        if entry.user not in users:
+            users.append(entry.user)
+    return users
@@ -0,0 +1,357 @@
+# lending/services/ledger.py
+"""
+The loan ledger: an append-only journal with periodic balance checkpoints.
+
+Every money movement on a loan is a JournalEntry, debiting one account
+and crediting another:
+
+    DISBURSEMENT  Dr LOANS          Cr CASH             principal paid out
+    INTEREST      Dr LOANS          Cr INTEREST_INCOME  interest charged (and default interest)
+    PENALTY       Dr LOANS          Cr PENALTY_INCOME   late penalty (services.accrual)
+    REPAYMENT     Dr CASH           Cr LOANS            payment (up to the balance)
+    REPAYMENT     Dr CASH           Cr MEMBER_CREDIT    the part paid beyond it
+    WRITE_OFF     Dr WRITE_OFFS     Cr LOANS            balance given up
+    REVERSAL      the accounts of the entry it undoes, swapped
+
+Entries are never changed or deleted (except with their loan): a deleted
+repayment is undone with REVERSAL entries. A loan's balance is its LOANS
+account: debits minus credits. LedgerCheckpoint stores that balance as of
+a moment, so balance(loan, as_of) reads the newest checkpoint at or
+before `as_of` plus the few entries posted since, not the loan's whole
+history. checkpoint_ledger (the checkpoint_ledger command, nightly) adds
+checkpoints for the loans with new entries. An entry posted with an
+effective time before a checkpoint (a backdated repayment) drops the
+loan's checkpoints from that time on.
+
+Loan.balance stays the current balance the lists, reports and dashboards
+read: the write paths move it with the entries they post
+(services.repayments, services.loan_actions, lending.signals). The
+payments of a loan not yet disbursed are credited to LOANS as well, the
+way Loan.balance counts them, so both agree once it is disbursed.
+backfill_ledger (the backfill_ledger command) journals the loans that
+predate the ledger from their repayments.
+"""
+
+import datetime
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, Exists, F, OuterRef, Q, Subquery, Sum, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from ..models import JournalEntry, LedgerCheckpoint, Loan, Repayment
+from . import member_summary, stats
+from .aging import refresh_aging
+from .schedule import unallocate_payments
+
+RECEIVABLE = "LOANS"
+BOOKED_STATUSES = ("DISBURSED", "CLOSED")
+DEFAULT_CHUNK_SIZE = 1000
+INVALIDATE_CHUNK = 200  # loans per checkpoint DELETE (one OR arm each)
+
+# an entry's effect on the loan's balance
+EFFECT = Case(
+    When(debit=RECEIVABLE, then=F("amount")),
+    When(credit=RECEIVABLE, then=-F("amount")),
+    default=Value(Decimal("0")),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+# -------------------------------
+# Posting
+# -------------------------------
+def post(entries):
+    """
+    Append `entries` (unsaved JournalEntry rows) to the journal and drop
+    the checkpoints they make stale.
+    """
+    entries = [entry for entry in entries if entry.amount]
+    if not entries:
+        return entries
+    JournalEntry.objects.bulk_create(entries)
+
+    earliest = {}
+    for entry in entries:
+        if entry.loan_id not in earliest or entry.posted_at < earliest[entry.loan_id]:
+            earliest[entry.loan_id] = entry.posted_at
+    loans = list(earliest.items())
+    for start in range(0, len(loans), INVALIDATE_CHUNK):
+        stale = Q()
+        for loan_id, posted_at in loans[start:start + INVALIDATE_CHUNK]:
+            stale |= Q(loan_id=loan_id, as_of__gte=posted_at)
+        LedgerCheckpoint.objects.filter(stale).delete()
+    return entries
+
+
+def append(rows, posted_at, batch_size=500):
+    """
+    post() for large uniform batches (services.accrual): `rows` are
+    (loan_id, kind, debit, credit, amount, reference) tuples, all taking
+    effect at `posted_at`, written with a plain executemany INSERT instead
+    of a model instance each. Checkpoints are invalidated `batch_size`
+    loans per DELETE.
+    """
+    rows = [row for row in rows if row[4]]
+    ops, qn = connection.ops, connection.ops.quote_name
+    fields = ("loan", "kind", "debit", "credit", "amount", "reference", "posted_at", "recorded_at")
+    columns = ", ".join(qn(JournalEntry._meta.get_field(name).column) for name in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    sql = f"INSERT INTO {qn(JournalEntry._meta.db_table)} ({columns}) VALUES ({placeholders})"
+    posted = ops.adapt_datetimefield_value(posted_at)
+    recorded = ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (loan_id, kind, debit, credit, ops.adapt_decimalfield_value(amount), reference, posted, recorded)
+            for loan_id, kind, debit, credit, amount, reference in rows
+        ])
+
+    loan_ids = sorted({row[0] for row in rows})
+    for start in range(0, len(loan_ids), batch_size):
+        LedgerCheckpoint.objects.filter(loan_id__in=loan_ids[start:start + batch_size], as_of__gte=posted_at).delete()
+    return len(rows)
+
+
+def disbursement_entries(loan_id, principal, total_payable, posted_at):
+    """The entries booking a disbursed loan: its principal and its interest."""
+    entries = [JournalEntry(
+        loan_id=loan_id, kind="DISBURSEMENT", debit=RECEIVABLE, credit="CASH",
+        amount=principal, posted_at=posted_at,
+    )]
+    interest = (total_payable or principal) - principal
+    if interest > 0:
+        entries.append(JournalEntry(
+            loan_id=loan_id, kind="INTEREST", debit=RECEIVABLE, credit="INTEREST_INCOME",
+            amount=interest, posted_at=posted_at,
+        ))
+    return entries
+
+
+def post_disbursements(loans, posted_at):
+    """Book (loan_id, principal, total_payable) triples disbursed at `posted_at`."""
+    return post(
+        entry for loan_id, principal, total_payable in loans
+        for entry in disbursement_entries(loan_id, principal, total_payable, posted_at)
+    )
+
+
+def repayment_entries(repayment, balance):
+    """The entries of a repayment made when the loan's balance was `balance`."""
+    to_loan = max(min(repayment.amount, balance), Decimal("0"))
+    common = {"loan_id": repayment.loan_id, "kind": "REPAYMENT", "debit": "CASH",
+              "posted_at": repayment.paid_at, "reference": repayment.transaction_id}
+    return [
+        JournalEntry(credit=RECEIVABLE, amount=to_loan, **common),
+        JournalEntry(credit="MEMBER_CREDIT", amount=repayment.amount - to_loan, **common),
+    ]
+
+
+def post_repayments(repayments, balances):
+    """
+    Journal Repayment rows; `balances` maps loan_id -> the loan's balance
+    before them. Each is credited to the loan up to what is left of it.
+    """
+    left = dict(balances)
+    entries = []
+    for repayment in repayments:
+        balance = left.get(repayment.loan_id, Decimal("0"))
+        entries.extend(repayment_entries(repayment, balance))
+        left[repayment.loan_id] = balance - min(repayment.amount, max(balance, Decimal("0")))
+    return post(entries)
+
+
+def reverse_repayment(repayment, now=None):
+    """
+    Undo a deleted repayment's entries and give the loan back the amount
+    they took off its balance (reopening it if it was closed) and off its
+    latest paid installments. Returns that amount.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        originals = list(
+            JournalEntry.objects.filter(
+                loan_id=repayment.loan_id, kind="REPAYMENT", reference=repayment.transaction_id,
+            ).exclude(Exists(JournalEntry.objects.filter(reverses=OuterRef("pk"))))
+        )
+        post(
+            JournalEntry(
+                loan_id=entry.loan_id, kind="REVERSAL", debit=entry.credit, credit=entry.debit,
+                amount=entry.amount, posted_at=now, reference=entry.reference, reverses=entry,
+            )
+            for entry in originals
+        )
+        restored = sum((entry.amount for entry in originals if entry.credit == RECEIVABLE), Decimal("0"))
+        if not restored:
+            return restored
+
+        row = (
+            Loan.objects.select_for_update(of=("self",)).filter(pk=repayment.loan_id)
+            .values_list("officer_id", "officer__office_id", "status", "balance").first()
+        )
+        if row is None:
+            return restored
+        old = stats.LoanState(*row)
+        new = old._replace(
+            status="DISBURSED" if old.status == "CLOSED" else old.status, balance=old.balance + restored,
+        )
+        Loan.objects.filter(pk=repayment.loan_id).update(balance=new.balance, status=new.status)
+        stats.record_loan_change(old, new)
+        unallocate_payments({repayment.loan_id: restored})
+        refresh_aging([repayment.loan_id])
+    return restored
+
+
+def write_off_loans(loan_ids, now=None):
+    """
+    Write off what is left of the given disbursed loans and close them.
+    Returns {loan_id: amount written off}.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        current, members = {}, set()
+        for pk, officer, office, status, left, member in (
+            Loan.objects.select_for_update(of=("self",)).filter(pk__in=loan_ids, status="DISBURSED")
+            .values_list("id", "officer_id", "officer__office_id", "status", "balance", "member_id")
+        ):
+            current[pk] = stats.LoanState(officer, office, status, left)
+            members.add(member)
+        amounts = {pk: amount for pk, amount in balances(current, now).items() if amount > 0}
+        post(
+            JournalEntry(
+                loan_id=pk, kind="WRITE_OFF", debit="WRITE_OFFS", credit=RECEIVABLE, amount=amount, posted_at=now,
+            )
+            for pk, amount in amounts.items()
+        )
+        Loan.objects.filter(pk__in=current).update(balance=Decimal("0"), status="CLOSED")
+        stats.record_loan_changes(
+            [(state, state._replace(status="CLOSED", balance=Decimal("0"))) for state in current.values()]
+        )
+        refresh_aging(current)
+        member_summary.refresh_summaries(members)
+    return amounts
+
+
+# -------------------------------
+# Reading
+# -------------------------------
+def end_of_day(day):
+    """The last moment of `day` here: a balance as of a date counts that whole day."""
+    return datetime.datetime.combine(day, datetime.time.max, tzinfo=timezone.get_current_timezone())
+
+
+def balance(loan_id, as_of=None):
+    """The loan's balance as of `as_of` (default now): a checkpoint read and the entries since."""
+    as_of = as_of or timezone.now()
+    entries = JournalEntry.objects.filter(loan_id=loan_id, posted_at__lte=as_of)
+    opening = Decimal("0")
+    checkpoint = (
+        LedgerCheckpoint.objects.filter(loan_id=loan_id, as_of__lte=as_of)
+        .order_by("-as_of").values_list("as_of", "balance").first()
+    )
+    if checkpoint is not None:
+        entries = entries.filter(posted_at__gt=checkpoint[0])
+        opening = checkpoint[1]
+    return opening + (entries.aggregate(total=Sum(EFFECT))["total"] or Decimal("0"))
+
+
+def _positions(loan_ids, as_of):
+    """{loan_id: [balance, entries since the checkpoint]} as of `as_of`, in two reads."""
+    loan_ids = list(loan_ids)
+    positions = {pk: [Decimal("0"), 0] for pk in loan_ids}
+    newest = Window(RowNumber(), partition_by=F("loan_id"), order_by=F("as_of").desc())
+    for loan_id, amount in (
+        LedgerCheckpoint.objects.filter(loan_id__in=loan_ids, as_of__lte=as_of)
+        .annotate(rank=newest).filter(rank=1).values_list("loan_id", "balance")
+    ):
+        positions[loan_id][0] = amount
+
+    # each loan's entries after its own checkpoint (all of them without one)
+    checkpoint = (
+        LedgerCheckpoint.objects.filter(loan_id=OuterRef("loan_id"), as_of__lte=as_of)
+        .order_by("-as_of").values("as_of")[:1]
+    )
+    entries = (
+        JournalEntry.objects.filter(loan_id__in=loan_ids, posted_at__lte=as_of)
+        .alias(since=Subquery(checkpoint)).filter(Q(since__isnull=True) | Q(posted_at__gt=F("since")))
+    )
+    for loan_id, effect in entries.annotate(effect=EFFECT).values_list("loan_id", "effect"):
+        positions[loan_id][0] += effect
+        positions[loan_id][1] += 1
+    return positions
+
+
+def balances(loan_ids, as_of=None):
+    """balance() for many loans: {loan_id: balance}."""
+    return {pk: amount for pk, (amount, _) in _positions(loan_ids, as_of or timezone.now()).items()}
+
+
+def loan_balance(loan, day=None):
+    """
+    What a loan page shows as the balance: the ledger's, at the end of
+    `day` (default now), once the loan is disbursed; before that, Loan.balance.
+    """
+    if loan.status not in BOOKED_STATUSES:
+        return loan.balance
+    return balance(loan.pk, end_of_day(day) if day else None)
+
+
+# -------------------------------
+# Checkpoints and backfill
+# -------------------------------
+def checkpoint_ledger(as_of=None, chunk_size=DEFAULT_CHUNK_SIZE, log=None):
+    """
+    Checkpoint, as of `as_of` (default now), every loan with entries since
+    its last checkpoint, `chunk_size` loans at a time. Returns the number written.
+    """
+    as_of = as_of or timezone.now()
+    written, done, last = 0, 0, 0
+    while chunk := list(Loan.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:chunk_size]):
+        checkpoints = [
+            LedgerCheckpoint(loan_id=pk, as_of=as_of, balance=amount)
+            for pk, (amount, count) in _positions(chunk, as_of).items() if count
+        ]
+        LedgerCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+        written += len(checkpoints)
+        done += len(chunk)
+        last = chunk[-1]
+        if log:
+            log(f"loans {done}, checkpoints {written}")
+    return written
+
+
+def _backfill_entries(loans):
+    """The journal of loans that predate the ledger, from their stored repayments."""
+    entries = []
+    left = {}
+    for pk, principal, total_payable, status, disbursed_at, created_at in loans:
+        left[pk] = total_payable or principal
+        if status in BOOKED_STATUSES:
+            entries.extend(disbursement_entries(pk, principal, total_payable, disbursed_at or created_at))
+    for repayment in Repayment.objects.filter(loan_id__in=left).order_by("loan_id", "paid_at", "id"):
+        balance = left[repayment.loan_id]
+        entries.extend(repayment_entries(repayment, balance))
+        left[repayment.loan_id] = balance - min(repayment.amount, max(balance, Decimal("0")))
+    return entries
+
+
+def backfill_ledger(chunk_size=DEFAULT_CHUNK_SIZE, log=None):
+    """
+    Journal every loan that has no entries yet (loans from before the
+    ledger, or seeded in bulk), `chunk_size` loans per transaction.
+    Safe to re-run. Returns the number of entries written.
+    """
+    written, done, last = 0, 0, 0
+    unjournaled = Loan.objects.exclude(Exists(JournalEntry.objects.filter(loan_id=OuterRef("pk"))))
+    while chunk := list(
+        unjournaled.filter(pk__gt=last).order_by("pk").values_list(
+            "pk", "principal_amount", "total_payable", "status", "disbursed_at", "created_at",
+        )[:chunk_size]
+    ):
+        with transaction.atomic():
+            written += len(post(_backfill_entries(chunk)))
+        done += len(chunk)
+        last = chunk[-1][0]
+        if log:
+            log(f"loans {done}, entries {written}")
+    return written
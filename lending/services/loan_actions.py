@@ -0,0 +1,79 @@
+# lending/services/loan_actions.py
+"""
+Officer decisions on loan applications: approve, reject and disburse.
+
+transition_loans moves any number of an officer's loans with one guarded
+UPDATE (... WHERE id IN (...) AND status IN (allowed states)). The loans are
+locked first, so the rows the UPDATE changes are exactly the ones read. The
+loans are updated with .update(), so no Loan signals fire; the dashboard
+counters are adjusted here in one pass. Disbursed loans get their
+installment schedules in one bulk insert, are booked in the ledger and
+are then aged. The officers' workload counters (services.assignment),
+the daily rollups and the members' summaries move with them.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Loan
+from . import assignment, ledger, member_summary, rollups, stats
+from .aging import refresh_aging
+from .schedule import generate_schedules
+
+# action -> (states it applies to, new state, timestamp field set)
+TRANSITIONS = {
+    "approve": (("PENDING",), "APPROVED", "approved_at"),
+    "reject": (("PENDING", "APPROVED"), "REJECTED", None),
+    "disburse": (("APPROVED",), "DISBURSED", "disbursed_at"),
+}
+
+
+def transition_loans(loan_ids, action, officer_id, now=None):
+    """
+    Apply `action` to the loans `loan_ids` assigned to `officer_id`, in one
+    transaction. Loans in a state the action doesn't apply to, or not
+    assigned to the officer, are left alone.
+
+    Returns {"changed": [loan ids], "skipped": {loan id: reason}}.
+    """
+    if action not in TRANSITIONS:
+        raise ValueError(f"Unknown loan action {action!r}")
+    sources, target, stamp = TRANSITIONS[action]
+    now = now or timezone.now()
+    loan_ids = {int(pk) for pk in loan_ids}
+
+    with transaction.atomic():
+        current, scopes, amounts = {}, {}, {}
+        for pk, officer, office, status, balance, policy, member, principal, total_payable in (
+            Loan.objects.select_for_update(of=("self",))
+            .filter(pk__in=loan_ids, officer_id=officer_id)
+            .values_list(
+                "id", "officer_id", "officer__office_id", "status", "balance", "policy_id", "member_id",
+                "principal_amount", "total_payable",
+            )
+        ):
+            current[pk] = stats.LoanState(officer, office, status, balance)
+            scopes[pk] = rollups.LoanScope(officer, office, policy, member)
+            amounts[pk] = (principal, total_payable)
+        changed = sorted(pk for pk, state in current.items() if state.status in sources)
+
+        fields = {"status": target}
+        if stamp:
+            fields[stamp] = now
+        Loan.objects.filter(pk__in=changed, status__in=sources).update(**fields)
+
+        changes = [(current[pk], current[pk]._replace(status=target)) for pk in changed]
+        stats.record_loan_changes(changes)
+        assignment.record_loan_changes(changes)
+        if target == "DISBURSED" and changed:
+            generate_schedules(Loan.objects.filter(pk__in=changed))
+            ledger.post_disbursements(((pk, *amounts[pk]) for pk in changed), now)
+            refresh_aging(changed)
+            rollups.record_disbursements((scopes[pk], now, amounts[pk][0]) for pk in changed)
+        member_summary.refresh_summaries(scopes[pk].member_id for pk in changed)
+
+    skipped = {}
+    for pk in sorted(loan_ids - set(changed)):
+        state = current.get(pk)
+        skipped[pk] = "not one of your loans" if state is None else f"is {state.status.lower()}"
+    return {"changed": changed, "skipped": skipped}
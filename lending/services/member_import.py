@@ -0,0 +1,326 @@
+# lending/services/member_import.py
+"""
+Bulk member onboarding from CSV or XLSX files.
+
+Rows are read in batches. For each batch, the emails and national IDs
+already taken and the usernames sharing a prefix with the new ones are read
+in a few batched queries (not one .exists() per row). Usernames are then
+handed out in memory. Passwords are hashed in a process pool, because
+PBKDF2 dominates the cost of creating a user. Users, profiles and login
+identifiers are written with bulk_create. No signals fire for those
+inserts, so the member search index and the dashboard counters are updated
+here, once per batch.
+
+Rows that can't be imported (missing or invalid fields, an email or national
+ID that is already registered or repeated in the file) are skipped and
+reported by line number; the rest of the file still goes in. A batch that
+collides with a registration made meanwhile is checked and written again
+once, then reported as skipped.
+"""
+
+import csv
+import datetime
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.dateparse import parse_date
+
+from ..models import LoginIdentifier, MemberProfile, User
+from . import search, stats
+from .identifiers import identifiers_for
+
+try:
+    import openpyxl
+except ImportError:  # XLSX support is optional
+    openpyxl = None
+
+DEFAULT_BATCH_SIZE = 2000
+POOL_THRESHOLD = 32  # fewer passwords than this are hashed in-process
+USERNAME_QUERY_CHUNK = 400
+
+REQUIRED_COLUMNS = ("first_name", "last_name", "email", "national_id", "phone_number")
+OPTIONAL_COLUMNS = ("middle_name", "alternative_phone", "address", "date_of_birth", "password")
+MAX_LENGTHS = {"national_id": 20, "phone_number": 15, "alternative_phone": 15, "address": 255}
+
+
+# -------------------------------
+# Usernames
+# -------------------------------
+def base_username(first_name, last_name):
+    """"Mary Ann" "Wanjiku" -> "maryannwanjiku"."""
+    return "".join(f"{first_name}{last_name}".split()).lower()[:140]
+
+
+def _suffix_number(suffix):
+    """0 for the bare base, n for "<base>n"; None for names this scheme never generates."""
+    if not suffix:
+        return 0
+    if suffix.isdigit() and suffix[0] != "0":
+        return int(suffix)
+    return None
+
+
+class UsernameAllocator:
+    """
+    Hands out "<base>", "<base>1", "<base>2", ... (the first free name, as
+    member registration always has) without a query per collision: the taken
+    names of a batch of bases are read at once with index range scans.
+    """
+
+    def __init__(self):
+        self._taken = {}  # base -> suffix numbers in use (0: the bare base)
+        self._next = {}
+
+    def load(self, bases):
+        new = sorted({b for b in bases if b not in self._taken})
+        for base in new:
+            self._taken[base] = set()
+        for start in range(0, len(new), USERNAME_QUERY_CHUNK):
+            q = Q()
+            for base in new[start:start + USERNAME_QUERY_CHUNK]:
+                # digits sort before ":", so this covers base, base1, base2, ...
+                q |= Q(username__gte=base, username__lt=f"{base}:")
+            for username in User.objects.filter(q).values_list("username", flat=True):
+                self._record(username)
+
+    def _record(self, username):
+        # "ann12" can belong to the bases "ann", "ann1" and "ann12"
+        cut = len(username)
+        while True:
+            taken = self._taken.get(username[:cut])
+            number = _suffix_number(username[cut:])
+            if taken is not None and number is not None:
+                taken.add(number)
+            if cut == 0 or not username[cut - 1].isdigit():
+                return
+            cut -= 1
+
+    def allocate(self, base):
+        if base not in self._taken:
+            self.load([base])
+        taken = self._taken[base]
+        number = self._next.get(base, 0)
+        while number in taken:
+            number += 1
+        taken.add(number)
+        self._next[base] = number + 1
+        return f"{base}{number}" if number else base
+
+
+# -------------------------------
+# Password hashing
+# -------------------------------
+class PasswordHasher:
+    """
+    make_password over a list, in a process pool once a batch is big enough
+    to be worth it. The pool is started on first use and shut down by close()
+    (or the with block). Empty passwords become unusable ones, so those
+    members set a password through reset.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+
+    def hash(self, passwords):
+        passwords = [p or None for p in passwords]
+        if self.workers <= 1 or sum(1 for p in passwords if p) < POOL_THRESHOLD:
+            return [make_password(p) for p in passwords]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._pool.map(make_password, passwords, chunksize=chunksize))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# -------------------------------
+# Reading files
+# -------------------------------
+def _column(name):
+    return "_".join(str(name or "").strip().lower().split())
+
+
+def read_rows(fh, filename):
+    """
+    Yield one dict per data row of a CSV or XLSX file (`fh` opened in binary
+    mode), keyed by the lower_snake_case header ("National ID" -> national_id).
+    """
+    if filename.lower().endswith(".xlsx"):
+        if openpyxl is None:
+            raise ValueError("Reading .xlsx files needs openpyxl (pip install openpyxl).")
+        sheet = openpyxl.load_workbook(fh, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+        header = [_column(name) for name in next(rows, ())]
+        for values in rows:
+            if any(v not in (None, "") for v in values):
+                yield dict(zip(header, values))
+        return
+
+    reader = csv.reader(io.TextIOWrapper(fh, encoding="utf-8-sig", newline=""))
+    header = [_column(name) for name in next(reader, ())]
+    for values in reader:
+        if any(values):
+            yield dict(zip(header, values))
+
+
+def _clean(row):
+    """The importable fields of `row`, or raise ValueError with the reason."""
+    data = {}
+    for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS:
+        value = row.get(name)
+        data[name] = value if isinstance(value, (datetime.date, datetime.datetime)) else str(value or "").strip()
+
+    missing = [name for name in REQUIRED_COLUMNS if not data[name]]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    try:
+        validate_email(data["email"])
+    except ValidationError:
+        raise ValueError(f"invalid email {data['email']!r}")
+    for name, limit in MAX_LENGTHS.items():
+        if len(data[name]) > limit:
+            raise ValueError(f"{name} is longer than {limit} characters")
+
+    born = data["date_of_birth"]
+    if isinstance(born, datetime.datetime):
+        born = born.date()
+    elif born and not isinstance(born, datetime.date):
+        try:
+            born = parse_date(born)
+        except ValueError:
+            born = None
+        if born is None:
+            raise ValueError(f"invalid date_of_birth {data['date_of_birth']!r} (use YYYY-MM-DD)")
+    data["date_of_birth"] = born or None
+    return data
+
+
+# -------------------------------
+# Import
+# -------------------------------
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _import_batch(rows, office_id, usernames, hasher, seen_emails, seen_ids, errors, retry=True):
+    """Create the members of one batch of (line, row); return how many were created."""
+    cleaned = []
+    for line, row in rows:
+        try:
+            cleaned.append((line, _clean(row)))
+        except ValueError as exc:
+            errors.append((line, str(exc)))
+
+    emails = [data["email"].lower() for _, data in cleaned]
+    national_ids = [data["national_id"] for _, data in cleaned]
+    # User.email itself (not its login identifiers, which bulk-created users may lack), in any case
+    taken_emails = set(
+        User.objects.annotate(email_lower=Lower("email")).filter(email_lower__in=emails)
+        .values_list("email_lower", flat=True)
+    )
+    taken_ids = set(MemberProfile.objects.filter(national_id__in=national_ids).values_list("national_id", flat=True))
+
+    accepted = []
+    for line, data in cleaned:
+        email = data["email"].lower()
+        if email in taken_emails or email in seen_emails:
+            errors.append((line, f"email {data['email']} is already registered"))
+        elif data["national_id"] in taken_ids or data["national_id"] in seen_ids:
+            errors.append((line, f"national ID {data['national_id']} already exists"))
+        else:
+            seen_emails.add(email)
+            seen_ids.add(data["national_id"])
+            accepted.append((line, data))
+    if not accepted:
+        return 0
+    lines = [line for line, _ in accepted]
+    accepted = [data for _, data in accepted]
+
+    bases = [base_username(data["first_name"], data["last_name"]) for data in accepted]
+    usernames.load(bases)
+    hashes = hasher.hash([data["password"] for data in accepted])
+    users = [
+        User(
+            username=usernames.allocate(base), email=data["email"], password=password, role="MEMBER",
+            office_id=office_id, first_name=data["first_name"], middle_name=data["middle_name"] or None,
+            last_name=data["last_name"],
+        )
+        for base, data, password in zip(bases, accepted, hashes)
+    ]
+
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create(users)
+            profiles = MemberProfile.objects.bulk_create([
+                MemberProfile(
+                    user=user, national_id=data["national_id"], phone_number=data["phone_number"],
+                    alternative_phone=data["alternative_phone"] or None, address=data["address"] or None,
+                    date_of_birth=data["date_of_birth"],
+                )
+                for user, data in zip(users, accepted)
+            ])
+            LoginIdentifier.objects.bulk_create([
+                LoginIdentifier(identifier=identifier, kind=kind, user_id=profile.user_id)
+                for user, profile in zip(users, profiles)
+                for identifier, kind in identifiers_for(user.username, user.email, profile.phone_number)
+            ], ignore_conflicts=True)
+            search.index_members([profile.pk for profile in profiles])
+
+            deltas = {stats.GLOBAL: {"users_count": len(users), "members_count": len(users)}}
+            if office_id:
+                deltas[stats.office_key(office_id)] = {"members_count": len(users)}
+            stats.apply_deltas(deltas)
+    except IntegrityError as exc:
+        # a user or member registered meanwhile: check the batch against the database again
+        seen_emails.difference_update(data["email"].lower() for data in accepted)
+        seen_ids.difference_update(data["national_id"] for data in accepted)
+        if retry:
+            by_line = dict(rows)
+            return _import_batch(
+                [(line, by_line[line]) for line in lines], office_id, usernames, hasher,
+                seen_emails, seen_ids, errors, retry=False,
+            )
+        errors.extend((line, f"not saved: {exc}") for line in lines)
+        return 0
+    return len(users)
+
+
+def import_members(rows, office=None, batch_size=DEFAULT_BATCH_SIZE, workers=None, log=None):
+    """
+    Create a member (User + MemberProfile) for each row dict, optionally in
+    `office`. Data rows are numbered from 2 (the header is row 1).
+    Returns {"created": n, "skipped": n, "errors": [(line, reason), ...]}.
+    """
+    log = log or (lambda message: None)
+    office_id = getattr(office, "pk", office)
+    usernames = UsernameAllocator()
+    seen_emails, seen_ids, errors = set(), set(), []
+    created = 0
+
+    with PasswordHasher(workers) as hasher:
+        for batch in _batches(enumerate(rows, start=2), batch_size):
+            created += _import_batch(batch, office_id, usernames, hasher, seen_emails, seen_ids, errors)
+            log(f"rows {batch[-1][0] - 1}: created {created}, skipped {len(errors)}")
+
+    errors.sort()
+    return {"created": created, "skipped": len(errors), "errors": errors}
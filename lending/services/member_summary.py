@@ -0,0 +1,208 @@
+# lending/services/member_summary.py
+"""
+Per-member account summaries for the member dashboard.
+
+MemberSummary holds a member's loan counts by status, amount borrowed,
+outstanding balance (the maintained Loan.balance of disbursed loans),
+lifetime repaid, active loans and newest repayments. The write paths
+refresh the rows of the members they touch: lending.signals for loans
+and deleted repayments, apply_loan_payments for posted repayments, and
+services.loan_actions for batch decisions. A refresh recomputes a
+chunk of members with a few grouped reads and one upsert, so batch
+postings cost the same number of queries whatever their size.
+
+get_summary serves the dashboard from the cache: the summary plus the
+member's monthly repayment trend (services.rollups), dropped on every
+refresh. A refresh made by another process (drain_payment_inbox, a
+worker) reaches the web processes' entries only through a shared cache
+(settings.LENDING_CACHE_URL); otherwise an entry lives CACHE_TIMEOUT at
+most. On a miss it costs two reads, which aget_summary (the async
+dashboard's) runs at once through lending.concurrency. A member without a
+row yet (e.g. one imported or seeded in bulk) gets it computed on first
+view.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..concurrency import gather_queries
+from ..models import Loan, MemberProfile, MemberSummary, Repayment
+from .rollups import member_key, trend
+
+CACHE_TIMEOUT = 5 * 60
+CHUNK_SIZE = 500
+RECENT_REPAYMENTS = 5
+ACTIVE_STATUSES = ("PENDING", "APPROVED", "DISBURSED")
+COUNT_FIELDS = [f"loans_{status.lower()}" for status, _ in Loan.STATUS_CHOICES]
+SUMMARY_FIELDS = [
+    "loans_total", *COUNT_FIELDS, "principal_total", "outstanding_balance", "total_repaid",
+    "active_loans", "recent_repayments", "updated_at",
+]
+
+
+def cache_key(member_id):
+    return f"lending:member-summary:{member_id}"
+
+
+def _invalidate(member_ids):
+    keys = [cache_key(pk) for pk in member_ids]
+    cache.delete_many(keys)
+    # and once committed, in case a reader cached the old row meanwhile
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# -------------------------------
+# Computing
+# -------------------------------
+def _compute(member_ids):
+    """MemberSummary rows (unsaved) for the existing members among `member_ids`."""
+    now = timezone.now()
+    rows = {
+        pk: MemberSummary(member_id=pk, updated_at=now)
+        for pk in MemberProfile.objects.filter(pk__in=member_ids).values_list("pk", flat=True)
+    }
+    if not rows:
+        return rows
+
+    loans = Loan.objects.filter(member_id__in=rows)
+    counts = {
+        f"loans_{status.lower()}": Count("id", filter=Q(status=status)) for status, _ in Loan.STATUS_CHOICES
+    }
+    for group in loans.values("member_id").annotate(
+        loans_total=Count("id"), principal_total=Sum("principal_amount"),
+        outstanding_balance=Sum("balance", filter=Q(status="DISBURSED")), **counts,
+    ).order_by():
+        row = rows[group.pop("member_id")]
+        for field, value in group.items():
+            setattr(row, field, value or 0)
+
+    active = defaultdict(list)
+    for loan in loans.filter(status__in=ACTIVE_STATUSES).order_by("-created_at", "-id").values(
+        "id", "member_id", "principal_amount", "status", "created_at",
+    ):
+        active[loan.pop("member_id")].append(loan)
+
+    repayments = Repayment.objects.filter(loan__member_id__in=rows)
+    for member_id, total in repayments.values_list("loan__member_id").annotate(total=Sum("amount")).order_by():
+        rows[member_id].total_repaid = total
+
+    recent = defaultdict(list)
+    newest = Window(
+        RowNumber(), partition_by=F("loan__member_id"), order_by=[F("paid_at").desc(), F("id").desc()],
+    )
+    for repayment in (
+        repayments.annotate(member_id=F("loan__member_id"), rank=newest).filter(rank__lte=RECENT_REPAYMENTS)
+        .order_by("-paid_at", "-id").values("id", "member_id", "loan_id", "amount", "paid_at")
+    ):
+        recent[repayment.pop("member_id")].append(repayment)
+
+    for member_id, row in rows.items():
+        row.active_loans = active[member_id]
+        row.recent_repayments = recent[member_id]
+    return rows
+
+
+def refresh_summaries(member_ids):
+    """Recompute the summaries of `member_ids`, CHUNK_SIZE members per upsert."""
+    member_ids = sorted({pk for pk in member_ids if pk})
+    for start in range(0, len(member_ids), CHUNK_SIZE):
+        rows = _compute(member_ids[start:start + CHUNK_SIZE])
+        MemberSummary.objects.bulk_create(
+            rows.values(), update_conflicts=True, unique_fields=["member"], update_fields=SUMMARY_FIELDS,
+        )
+    _invalidate(member_ids)
+
+
+def add_to_outstanding(amounts):
+    """
+    Add {member_id: amount} to the members' stored outstanding balances,
+    for bulk charges that change nothing else of the summary
+    (services.accrual). One executemany UPDATE: the members can number in
+    the hundreds of thousands.
+    """
+    member_ids = [pk for pk, amount in amounts.items() if amount]
+    if not member_ids:
+        return
+    qn, ops = connection.ops.quote_name, connection.ops
+    column = qn("outstanding_balance")
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {qn(MemberSummary._meta.db_table)} SET {column} = {column} + %s WHERE {qn('member_id')} = %s",
+            [(ops.adapt_decimalfield_value(amounts[pk]), pk) for pk in member_ids],
+        )
+    _invalidate(member_ids)
+
+
+def rebuild_summaries(log=None):
+    """Recompute every member's summary, CHUNK_SIZE members at a time. Returns the number of members."""
+    done = 0
+    last = 0
+    while chunk := list(
+        MemberProfile.objects.filter(pk__gt=last).order_by("pk").values_list("pk", flat=True)[:CHUNK_SIZE]
+    ):
+        refresh_summaries(chunk)
+        done += len(chunk)
+        last = chunk[-1]
+        if log:
+            log(f"members {done}")
+    return done
+
+
+# -------------------------------
+# Reading
+# -------------------------------
+def _readable(summary):
+    """The summary with its stored JSON lists as Decimals and datetimes again (not to be saved)."""
+    for loan in summary.active_loans:
+        loan["principal_amount"] = Decimal(loan["principal_amount"])
+        loan["created_at"] = parse_datetime(loan["created_at"])
+    for repayment in summary.recent_repayments:
+        repayment["amount"] = Decimal(repayment["amount"])
+        repayment["paid_at"] = parse_datetime(repayment["paid_at"])
+    return summary
+
+
+def _stored(member_id):
+    summary = MemberSummary.objects.filter(pk=member_id).first()
+    if summary is None:
+        refresh_summaries([member_id])
+        summary = MemberSummary.objects.get(pk=member_id)
+    return summary
+
+
+def _monthly(member_id):
+    return [row for row in trend(member_key(member_id), interval="month") if row["amount_repaid"]]
+
+
+def get_summary(member_id):
+    """
+    (MemberSummary, monthly repayment trend) for the member's dashboard,
+    from the cache when present.
+    """
+    entry = cache.get(cache_key(member_id))
+    if entry is None:
+        entry = (_readable(_stored(member_id)), _monthly(member_id))
+        cache.set(cache_key(member_id), entry, CACHE_TIMEOUT)
+    return entry
+
+
+async def aget_summary(member_id):
+    """get_summary for async views, with the two reads of a miss run concurrently."""
+    entry = await cache.aget(cache_key(member_id))
+    if entry is None:
+        summary, monthly = await gather_queries(
+            lambda: MemberSummary.objects.filter(pk=member_id).first(), lambda: _monthly(member_id),
+        )
+        if summary is None:
+            summary = await sync_to_async(_stored)(member_id)
+        entry = (_readable(summary), monthly)
+        await cache.aset(cache_key(member_id), entry, CACHE_TIMEOUT)
+    return entry
@@ -0,0 +1,158 @@
+# lending/services/payment_inbox.py
+"""
+Payment-provider callbacks, received now and posted later.
+
+The callback view checks the payload and signature without touching the
+database, then appends the payload to the PaymentCallback inbox: a single
+INSERT, so a payday burst of callbacks doesn't queue on the loan updates.
+drain_inbox (the drain_payment_inbox command) posts pending callbacks in
+batches through services.reconciliation: one transaction per batch instead
+of one per payment. It is idempotent on transaction_id, so provider
+retries and re-drains post each payment once.
+
+Payload: {"transaction_id", "amount", "payer_phone", optional "paid_at"
+(ISO 8601) and "loan_id" (the loan the payer named)}. The request must
+carry X-Callback-Signature: the hex HMAC-SHA256 of the body under
+settings.LENDING_CALLBACK_SECRET. Without a secret every callback is
+refused.
+"""
+
+import hashlib
+import hmac
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import PaymentCallback
+from .reconciliation import LoanIndex, Receipt, reconcile_batch
+from .repayments import parse_amount, parse_paid_at
+
+DEFAULT_BATCH_SIZE = 1000
+SIGNATURE_HEADER = "X-Callback-Signature"
+
+
+class InvalidCallback(ValueError):
+    pass
+
+
+def sign(body, secret):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(body, signature):
+    secret = getattr(settings, "LENDING_CALLBACK_SECRET", "")
+    return bool(secret) and hmac.compare_digest(sign(body, secret), signature or "")
+
+
+def parse_payload(payload, received_at=None):
+    """
+    The Receipt a callback payload describes (paid at `received_at` when the
+    payload has no paid_at); InvalidCallback says what is wrong with it.
+    """
+    if not isinstance(payload, dict):
+        raise InvalidCallback("payload must be a JSON object")
+    transaction_id = str(payload.get("transaction_id") or "").strip()
+    if not transaction_id or len(transaction_id) > 90:  # room for the "#n" of split payments
+        raise InvalidCallback("transaction_id is missing or longer than 90 characters")
+    try:
+        amount = parse_amount(payload.get("amount"))
+    except ValueError as exc:
+        raise InvalidCallback(str(exc))
+    phone = str(payload.get("payer_phone") or "").strip()
+    if not phone:
+        raise InvalidCallback("payer_phone is missing")
+    paid_at = payload.get("paid_at")
+    try:
+        valid = not paid_at or parse_datetime(str(paid_at))
+    except ValueError:  # well formed but impossible, e.g. February 30th
+        valid = False
+    if not valid:
+        raise InvalidCallback("paid_at must be an ISO 8601 date and time")
+    loan_id = payload.get("loan_id")
+    if loan_id not in (None, "") and not str(loan_id).isdigit():
+        raise InvalidCallback("loan_id must be a loan number")
+
+    return Receipt(
+        transaction_id=transaction_id, payer_phone=phone, amount=amount,
+        paid_at=parse_paid_at(str(paid_at)) if paid_at else received_at or timezone.now(),
+        loan_id=int(loan_id) if loan_id not in (None, "") else None,
+    )
+
+
+# -------------------------------
+# Receiving
+# -------------------------------
+def receive(body, signature=None):
+    """
+    Check a callback's raw body and append it to the inbox. Raises
+    PermissionError for a bad signature (or no secret to check it against)
+    and InvalidCallback for a bad payload.
+    """
+    if not verify_signature(body, signature):
+        raise PermissionError("bad signature")
+    try:
+        payload = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCallback("body is not JSON")
+    receipt = parse_payload(payload)
+    return PaymentCallback.objects.create(transaction_id=receipt.transaction_id, payload=payload)
+
+
+# -------------------------------
+# Draining
+# -------------------------------
+def _drain_batch(batch_size, rule):
+    with transaction.atomic():
+        # skip_locked lets several workers drain side by side (a no-op on SQLite,
+        # where the batch's write transaction serializes them anyway)
+        callbacks = list(
+            PaymentCallback.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDING").order_by("id")[:batch_size]
+        )
+        if not callbacks:
+            return None
+
+        receipts, failed = [], []
+        for callback in callbacks:
+            try:
+                receipts.append(parse_payload(callback.payload, callback.received_at))
+            except InvalidCallback as exc:
+                callback.status, callback.error = "FAILED", str(exc)[:255]
+                failed.append(callback)
+
+        # only the loans these receipts can match, not the whole book
+        result = reconcile_batch(receipts, LoanIndex.load(rule, receipts)) if receipts else {}
+
+        now = timezone.now()
+        for callback in failed:
+            callback.processed_at = now
+        PaymentCallback.objects.bulk_update(failed, ["status", "error", "processed_at"])
+        PaymentCallback.objects.filter(
+            pk__in=[c.pk for c in callbacks if c.status == "PENDING"]
+        ).update(status="DONE", processed_at=now)
+
+    result["callbacks"] = len(callbacks)
+    result["failed"] = len(failed)
+    return result
+
+
+def drain_inbox(batch_size=DEFAULT_BATCH_SIZE, rule=None, max_batches=None):
+    """
+    Post pending callbacks, oldest first, `batch_size` per transaction,
+    until the inbox is empty (or after `max_batches`). Returns a summary dict.
+    """
+    summary = {"callbacks": 0, "failed": 0, "repayments": 0, "posted": Decimal("0"), "suspense": 0, "duplicates": 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        result = _drain_batch(batch_size, rule)
+        if result is None:
+            break
+        result.pop("loans", None)
+        for field, value in result.items():
+            summary[field] += value
+        batches += 1
+    return summary
@@ -0,0 +1,291 @@
+# lending/services/reconciliation.py
+"""
+Matching mobile-money receipts to loans by the payer's phone number.
+
+A receipt carries a transaction id, the payer's phone and an amount, but no
+loan. reconcile_receipts loads every active (disbursed, unpaid) loan once,
+with its member's phone numbers and the due date of its oldest open
+installment. From that it builds an in-memory index: normalized phone ->
+member -> loans in allocation order. Receipts are then matched without a
+query each. A receipt that names one of the active loans pays that loan
+first. Otherwise, a member's own number wins over another member's
+alternative number.
+
+A receipt's amount is spread over the member's loans by the allocation rule
+(settings.LENDING_RECONCILIATION_RULE). Each portion becomes a Repayment:
+the first keeps the receipt's transaction id and later ones get "#2",
+"#3", ... What can't be posted goes to the suspense queue (SuspenseReceipt):
+unknown or shared phones, and whatever exceeds the member's balance.
+
+Receipts are posted in batches, each in one transaction. A batch makes two
+reads to drop transaction ids already seen, locks the payers' loans and
+re-reads their balances (so portions never exceed what is owed, whatever
+was posted since the index was loaded), makes two bulk inserts, then
+apply_loan_payments. So the number of queries grows with the batches, not
+the receipts.
+"""
+
+import datetime
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Min, Q, Value
+from django.db.models.functions import Coalesce, Replace, Right
+
+from ..models import Loan, Repayment, SuspenseReceipt
+from .identifiers import normalize_phone
+from .repayments import DEFAULT_BATCH_SIZE, apply_loan_payments, parse_amount, parse_paid_at
+
+# loan_id: the loan the payer named (e.g. a paybill account number), if any
+Receipt = namedtuple("Receipt", ["transaction_id", "payer_phone", "amount", "paid_at", "loan_id"], defaults=(None,))
+ActiveLoan = namedtuple("ActiveLoan", ["id", "balance", "next_due"])
+
+# allocation rule -> sort key of a member's loans (paid in that order)
+RULES = {
+    # the loan whose oldest open installment fell due first
+    "oldest_due_first": lambda loan: (loan.next_due or datetime.date.max, loan.id),
+    # the loan closest to being paid off
+    "smallest_balance_first": lambda loan: (loan.balance, loan.id),
+}
+DEFAULT_RULE = "oldest_due_first"
+
+# Phones are stored as typed, so loading only the loans a batch of receipts
+# can match compares the last PHONE_TAIL digits in SQL; LoanIndex then
+# matches the normalized numbers (numbers of fewer digits are not found).
+PHONE_TAIL = 7
+
+
+def _rule(name=None):
+    name = name or getattr(settings, "LENDING_RECONCILIATION_RULE", DEFAULT_RULE)
+    if name not in RULES:
+        raise ValueError(f"Unknown allocation rule {name!r} (use one of {', '.join(RULES)})")
+    return RULES[name]
+
+
+def _phone_tail(field):
+    """SQL for the last PHONE_TAIL digits of a stored phone number."""
+    digits = Coalesce(F(field), Value(""))
+    for char in " ()+-.":
+        digits = Replace(digits, Value(char), Value(""))
+    return Right(digits, PHONE_TAIL)
+
+
+# -------------------------------
+# Loan index
+# -------------------------------
+class LoanIndex:
+    """Active loans by member and members by normalized phone, read in one query."""
+
+    def __init__(self, loans, key=RULES[DEFAULT_RULE]):
+        self.loans = defaultdict(list)  # member_id -> [ActiveLoan] in allocation order
+        self.balances = {}  # loan_id -> balance not yet allocated in this pass
+        self.members = {}  # loan_id -> member_id
+        self.primary = defaultdict(set)  # phone -> member ids with it as their number
+        self.alternative = defaultdict(set)  # phone -> member ids with it as alternative
+
+        for loan_id, member_id, phone, alternative, balance, next_due in loans:
+            self.loans[member_id].append(ActiveLoan(loan_id, balance, next_due))
+            self.balances[loan_id] = balance
+            self.members[loan_id] = member_id
+            for number, members in ((phone, self.primary), (alternative, self.alternative)):
+                number = normalize_phone(number)
+                if number:
+                    members[number].add(member_id)
+
+        for member_loans in self.loans.values():
+            member_loans.sort(key=key)
+
+    @classmethod
+    def load(cls, rule=None, receipts=None):
+        """
+        Every active loan, or, given `receipts`, only those the receipts can
+        match: the loans of the members they name a loan of or whose phone
+        ends like theirs.
+        """
+        key = _rule(rule)
+        loans = Loan.objects.filter(status="DISBURSED", balance__gt=0)
+        if receipts is not None:
+            named = [receipt.loan_id for receipt in receipts if receipt.loan_id]
+            tails = {phone[-PHONE_TAIL:] for phone in map(normalize_phone, (r.payer_phone for r in receipts)) if phone}
+            loans = loans.alias(
+                phone_tail=_phone_tail("member__phone_number"),
+                alternative_tail=_phone_tail("member__alternative_phone"),
+            ).filter(
+                Q(member__in=Loan.objects.filter(pk__in=named).values("member_id"))
+                | Q(phone_tail__in=tails) | Q(alternative_tail__in=tails)
+            )
+        loans = (
+            loans
+            .values_list("id", "member_id", "member__phone_number", "member__alternative_phone", "balance")
+            .annotate(next_due=Min("installments__due_date", filter=~Q(installments__status="PAID")))
+        )
+        return cls(loans.iterator(chunk_size=5000), key)
+
+    def lock(self, loan_ids):
+        """Lock the loans and reset their balances to the stored ones (0 for loans no longer active)."""
+        loan_ids = list(loan_ids)
+        current = dict(
+            Loan.objects.select_for_update().filter(pk__in=loan_ids, status="DISBURSED").values_list("id", "balance")
+        )
+        for loan_id in loan_ids:
+            self.balances[loan_id] = current.get(loan_id, Decimal("0"))
+
+    def member_for(self, phone):
+        """(member_id, None), or (None, suspense reason) when the phone doesn't name one member."""
+        phone = normalize_phone(phone)
+        for members in (self.primary.get(phone), self.alternative.get(phone)):
+            if members:
+                return (next(iter(members)), None) if len(members) == 1 else (None, "AMBIGUOUS")
+        return None, "UNMATCHED"
+
+    def allocate(self, member_id, amount, first=None):
+        """
+        Spread `amount` over the member's loans, the loan `first` ahead of the
+        rest: ([(loan_id, portion)], amount left over).
+        """
+        portions = []
+        loans = sorted(self.loans.get(member_id, ()), key=lambda loan: loan.id != first)
+        for loan in loans:
+            if amount <= 0:
+                break
+            balance = self.balances[loan.id]
+            if balance <= 0:
+                continue
+            portion = min(amount, balance)
+            self.balances[loan.id] = balance - portion
+            amount -= portion
+            portions.append((loan.id, portion))
+        return portions, amount
+
+
+# -------------------------------
+# Reconciliation
+# -------------------------------
+def _parse_receipt(row):
+    if isinstance(row, Receipt):
+        parse_amount(row.amount)
+        return row
+    return Receipt(
+        transaction_id=str(row["transaction_id"]).strip(),
+        payer_phone=str(row.get("payer_phone") or "").strip(),
+        amount=parse_amount(row["amount"]),
+        paid_at=parse_paid_at(row.get("paid_at")),
+        loan_id=int(row["loan_id"]) if row.get("loan_id") else None,
+    )
+
+
+def _parse_receipts(rows, errors):
+    """The rows' Receipts; rows that don't parse go to `errors` as (row number, reason)."""
+    for number, row in enumerate(rows, start=1):
+        try:
+            yield _parse_receipt(row)
+        except ValueError as exc:
+            errors.append((number, str(exc)))
+
+
+def _seen(transaction_ids):
+    seen = set(Repayment.objects.filter(transaction_id__in=transaction_ids).values_list("transaction_id", flat=True))
+    seen.update(SuspenseReceipt.objects.filter(transaction_id__in=transaction_ids).values_list("transaction_id", flat=True))
+    return seen
+
+
+def _allocate(receipts, index):
+    """The Repayments and SuspenseReceipts posting `receipts`, allocated against the loans' locked balances."""
+    members = []
+    for receipt in receipts:
+        if receipt.loan_id in index.members:
+            members.append((index.members[receipt.loan_id], None))
+        else:
+            members.append(index.member_for(receipt.payer_phone))
+    index.lock(loan.id for member_id, _ in members if member_id for loan in index.loans.get(member_id, ()))
+
+    repayments, suspense = [], []
+    for receipt, (member_id, reason) in zip(receipts, members):
+        phone = (normalize_phone(receipt.payer_phone) or receipt.payer_phone)[:15]
+        portions, left = [], receipt.amount
+        if member_id:
+            portions, left = index.allocate(member_id, receipt.amount, first=receipt.loan_id)
+        for n, (loan_id, amount) in enumerate(portions, start=1):
+            repayments.append(Repayment(
+                loan_id=loan_id,
+                transaction_id=receipt.transaction_id if n == 1 else f"{receipt.transaction_id}#{n}",
+                payer_phone=phone, amount=amount, paid_at=receipt.paid_at,
+            ))
+        if left > 0:
+            suspense.append(SuspenseReceipt(
+                transaction_id=receipt.transaction_id, payer_phone=phone, amount=left,
+                paid_at=receipt.paid_at, reason=reason or "OVERPAYMENT",
+            ))
+    return repayments, suspense
+
+
+def reconcile_batch(batch, index):
+    """
+    Post one batch of Receipts against `index` in one transaction. Returns
+    {"repayments", "posted", "suspense", "duplicates", "loans": {loan ids}}.
+
+    A writer storing some of the same transaction ids after they were read
+    makes the insert fail; the ids are then read again and the rest
+    allocated and inserted.
+    """
+    unique = {}
+    for receipt in batch:
+        unique.setdefault(receipt.transaction_id, receipt)
+
+    with transaction.atomic():
+        while True:
+            seen = _seen(unique.keys())
+            receipts = [receipt for receipt in unique.values() if receipt.transaction_id not in seen]
+            repayments, suspense = _allocate(receipts, index)
+            try:
+                with transaction.atomic():
+                    Repayment.objects.bulk_create(repayments)
+                    SuspenseReceipt.objects.bulk_create(suspense)
+                break
+            except IntegrityError:
+                if not _seen([receipt.transaction_id for receipt in receipts]):
+                    raise  # not a duplicate transaction id
+
+        totals = defaultdict(Decimal)
+        for repayment in repayments:
+            totals[repayment.loan_id] += repayment.amount
+        apply_loan_payments(totals, repayments)
+
+    return {
+        "repayments": len(repayments),
+        "posted": sum(totals.values(), Decimal("0")),
+        "suspense": len(suspense),
+        "duplicates": len(batch) - len(unique) + len(seen),
+        "loans": set(totals),
+    }
+
+
+def reconcile_receipts(receipts, rule=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Post an iterable of receipts (dicts with transaction_id, payer_phone,
+    amount and optional paid_at and loan_id) to the payers' active loans,
+    paying a named active loan first and otherwise allocating by
+    `rule` (a RULES name; default settings.LENDING_RECONCILIATION_RULE).
+
+    Transaction ids already posted or in suspense are skipped, so re-running
+    the same file is safe. Receipts with an amount that isn't positive are
+    not posted; they are listed in the summary's "errors" as (row number,
+    reason). Returns a summary dict.
+    """
+    index = LoanIndex.load(rule)
+    summary = {"repayments": 0, "posted": Decimal("0"), "suspense": 0, "duplicates": 0, "loans": 0}
+    loans, errors = set(), []
+
+    receipts = _parse_receipts(receipts, errors)
+    while batch := list(islice(receipts, batch_size)):
+        result = reconcile_batch(batch, index)
+        loans.update(result.pop("loans"))
+        for field, value in result.items():
+            summary[field] += value
+
+    summary["loans"] = len(loans)
+    summary["errors"] = errors
+    return summary
@@ -0,0 +1,176 @@
+# lending/services/repayments.py
+
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Loan, Repayment
+from . import ledger, member_summary, rollups, stats
+from .aging import refresh_aging
+from .schedule import allocate_payments
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_AMOUNT = Decimal("1e10")  # Repayment.amount holds 12 digits, 2 of them decimals
+UPDATE_CHUNK = 200  # loans per balance UPDATE (one CASE arm each)
+
+
+# -------------------------------
+# Balance posting
+# -------------------------------
+def apply_loan_payments(totals, repayments=()):
+    """
+    Deduct payments from loan balances, UPDATE_CHUNK loans per UPDATE.
+
+    `totals` maps loan_id -> Decimal amount paid and `repayments` are the
+    Repayment rows behind it. The loans are locked while they are read, and
+    the balance and status are computed by the database from the current
+    row, so concurrent postings can't overwrite each other. A loan whose
+    balance reaches zero is closed. The repayments are journaled in the
+    ledger against the balances read, the payments are allocated to the
+    loans' installment schedules, the loans are re-aged, and the dashboard
+    counters, daily rollups and the members' summaries are brought up to date.
+    """
+    before, scopes = {}, {}
+    for loan_id, officer_id, office_id, status, balance, policy_id, member_id in (
+        Loan.objects.select_for_update(of=("self",)).filter(pk__in=totals.keys()).values_list(
+            "id", "officer_id", "officer__office_id", "status", "balance", "policy_id", "member_id"
+        )
+    ):
+        before[loan_id] = stats.LoanState(officer_id, office_id, status, balance)
+        scopes[loan_id] = rollups.LoanScope(officer_id, office_id, policy_id, member_id)
+    loan_ids = list(totals)
+    for start in range(0, len(loan_ids), UPDATE_CHUNK):
+        chunk = loan_ids[start:start + UPDATE_CHUNK]
+        amount = Case(
+            *(When(pk=loan_id, then=Value(totals[loan_id])) for loan_id in chunk),
+            output_field=DecimalField(),
+        )
+        Loan.objects.filter(pk__in=chunk).update(
+            balance=Greatest(F("balance") - amount, Value(Decimal("0"))),
+            status=Case(
+                When(balance__lte=amount, then=Value("CLOSED")),
+                default=F("status"),
+            ),
+        )
+    ledger.post_repayments(repayments, {loan_id: state.balance for loan_id, state in before.items()})
+    allocate_payments(totals)
+    refresh_aging(totals.keys())
+    stats.record_payments(before, totals)
+    rollups.record_repayments(repayments, scopes)
+    member_summary.refresh_summaries(scope.member_id for scope in scopes.values())
+
+
+# -------------------------------
+# Bulk ingestion
+# -------------------------------
+def parse_paid_at(value):
+    """An aware datetime from a datetime or ISO string; now when missing."""
+    if isinstance(value, str):
+        value = parse_datetime(value) if value else None
+    if value is None:
+        return timezone.now()
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def parse_amount(value):
+    """A payment amount as a Decimal; ValueError unless it is positive with at most two decimals."""
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite() or not 0 < amount < MAX_AMOUNT or amount.as_tuple().exponent < -2:
+        raise ValueError("amount must be a positive number with at most two decimals")
+    return amount
+
+
+def _parse_row(row):
+    return Repayment(
+        loan_id=int(row["loan_id"]),
+        transaction_id=str(row["transaction_id"]).strip(),
+        payer_phone=str(row.get("payer_phone") or "").strip(),
+        amount=parse_amount(row["amount"]),
+        paid_at=parse_paid_at(row.get("paid_at")),
+    )
+
+
+def _insert_new(repayments):
+    """
+    Insert the repayments whose transaction_id isn't stored yet and return
+    them. A writer storing some of the same ids after they were read makes
+    the insert fail; the ids are then read again and the rest inserted.
+    """
+    while True:
+        existing = set(
+            Repayment.objects.filter(transaction_id__in=[r.transaction_id for r in repayments])
+            .values_list("transaction_id", flat=True)
+        )
+        new = [r for r in repayments if r.transaction_id not in existing]
+        try:
+            with transaction.atomic():
+                Repayment.objects.bulk_create(new)
+            return new
+        except IntegrityError:
+            if not Repayment.objects.filter(transaction_id__in=[r.transaction_id for r in new]).exists():
+                raise  # not a duplicate transaction id
+
+
+def _ingest_batch(batch):
+    # Drop transaction ids repeated inside the batch, then the ones already stored.
+    unique = {}
+    for repayment in batch:
+        unique.setdefault(repayment.transaction_id, repayment)
+
+    with transaction.atomic():
+        new = _insert_new(list(unique.values()))
+
+        totals = defaultdict(Decimal)
+        for repayment in new:
+            totals[repayment.loan_id] += repayment.amount
+        apply_loan_payments(totals, new)
+
+    return len(new), len(batch) - len(new), set(totals)
+
+
+def ingest_repayments(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Post an iterable of repayment rows (dicts with loan_id, transaction_id,
+    payer_phone, amount and optional paid_at) in batches.
+
+    Rows whose transaction_id is already stored are skipped, so re-running
+    the same file is safe. Rows with an amount that isn't positive are not
+    posted; they are listed in the summary's "errors" as (row number, reason).
+    Returns a summary dict.
+    """
+    summary = {"created": 0, "skipped": 0, "loans": 0, "errors": []}
+    loans = set()
+    batch = []
+
+    def flush():
+        created, skipped, touched = _ingest_batch(batch)
+        summary["created"] += created
+        summary["skipped"] += skipped
+        loans.update(touched)
+        batch.clear()
+
+    for number, row in enumerate(rows, start=1):
+        try:
+            if isinstance(row, Repayment):
+                parse_amount(row.amount)
+            else:
+                row = _parse_row(row)
+        except ValueError as exc:
+            summary["errors"].append((number, str(exc)))
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    summary["loans"] = len(loans)
+    return summary
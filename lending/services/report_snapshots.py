@@ -0,0 +1,238 @@
+# lending/services/report_snapshots.py
+"""
+Reports computed once and kept in ReportLog.
+
+A report is a kind (office, officer or company-wide), a scope and the
+ManagerReportForm filters. get_report returns the newest snapshot of the
+same report (same fingerprint) younger than settings.LENDING_REPORT_MAX_AGE,
+so a repeat visit costs one indexed row read instead of the aggregates.
+Otherwise it writes a ReportLog row and computes the payload (totals,
+breakdown rows, PAR) into it. Office and officer reports are computed
+during the request. The company-wide report is a background job whose
+page polls the row's status. Any stored snapshot can be reopened later by
+its id.
+
+Background jobs run on a small thread pool once the request's transaction
+commits (settings.LENDING_REPORT_RUNNER = "thread"), or wait for
+`manage.py run_report_jobs` ("worker"). A job is claimed with a
+conditional UPDATE, so it runs once at a time. A job still RUNNING
+settings.LENDING_REPORT_TIMEOUT after it was claimed lost its runner (a
+restart, a killed worker) and is claimed again.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Loan, ReportLog
+from . import stats
+from .aging import par_summary
+from .reports import MONEY_METRICS, loan_report
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE = 15 * 60  # seconds
+DEFAULT_TIMEOUT = 30 * 60  # seconds
+POOL_THREADS = 2
+
+# kind -> (report_type logged, computed in the background)
+KINDS = {
+    "office": ("Manager Office Report", False),
+    "officer": ("Officer Performance Report", False),
+    "company": ("Company Loan Report", True),
+}
+PAR_MONEY = ("portfolio", "at_risk", "par_ratio")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def scope_key(kind, scope_id=None):
+    if kind == "office":
+        return stats.office_key(scope_id)
+    if kind == "officer":
+        return stats.officer_key(scope_id)
+    return stats.GLOBAL
+
+
+def _scope_of(scope):
+    """(kind, id) back from a scope key."""
+    if scope == stats.GLOBAL:
+        return "company", None
+    kind, _, pk = scope.partition(":")
+    return kind, int(pk)
+
+
+def clean_params(filters):
+    """ManagerReportForm.cleaned_data as JSON-ready values, empty filters dropped."""
+    params = {}
+    for name, value in (filters or {}).items():
+        if value in (None, ""):
+            continue
+        if isinstance(value, datetime.date):
+            value = value.isoformat()
+        elif hasattr(value, "pk"):
+            value = value.pk
+        params[name] = value
+    return params
+
+
+def fingerprint(scope, params):
+    return hashlib.sha256(json.dumps([scope, params], sort_keys=True).encode()).hexdigest()
+
+
+# -------------------------------
+# Computing
+# -------------------------------
+def compute(scope, params):
+    """The payload stored for a report: loan report totals and rows, plus PAR."""
+    kind, scope_id = _scope_of(scope)
+    if kind == "office":
+        loans, par = Loan.objects.filter(officer__office_id=scope_id), par_summary(office_id=scope_id)
+    elif kind == "officer":
+        loans, par = Loan.objects.filter(officer_id=scope_id), par_summary(officer_id=scope_id)
+    else:
+        loans, par = Loan.objects.all(), par_summary()
+    group_by = params.get("group_by")
+    report = loan_report(loans, params, group_by)
+    return {"totals": report["totals"], "rows": report["rows"], "group_by": group_by, "par": par}
+
+
+def snapshot(log):
+    """A stored payload with its numbers and months as Decimals and datetimes again."""
+    payload = json.loads(json.dumps(log.payload or {}))  # a copy to convert in place
+    for row in [payload.get("totals") or {}, *payload.get("rows", [])]:
+        for name in MONEY_METRICS:
+            if row.get(name) is not None:
+                row[name] = Decimal(row[name])
+        if isinstance(row.get("month"), str):
+            row["month"] = parse_datetime(row["month"])
+    par = payload.get("par") or {}
+    for name in PAR_MONEY:
+        if name in par:
+            par[name] = Decimal(par[name])
+    for bucket in par.get("buckets", []):
+        bucket["outstanding"] = Decimal(bucket["outstanding"])
+    return payload
+
+
+def report_context(log):
+    """Template context for a report page: the snapshot as the report templates name it."""
+    payload = snapshot(log)
+    return {
+        "report_log": log,
+        "reports": payload.get("totals") or {},
+        "rows": payload.get("rows", []),
+        "group_by": payload.get("group_by"),
+        "par": payload.get("par"),
+    }
+
+
+def _complete(log):
+    try:
+        log.payload = json.loads(json.dumps(compute(log.scope, log.params), cls=DjangoJSONEncoder))
+        log.status, log.error = "DONE", ""
+    except Exception as exc:
+        logger.exception("Report %s failed", log.pk)
+        log.status, log.error = "FAILED", str(exc)[:255]
+    log.completed_at = timezone.now()
+    log.save(update_fields=["payload", "status", "error", "completed_at"])
+    return log
+
+
+def _claimable():
+    """Queued reports, and running ones whose runner has had longer than the timeout."""
+    timeout = datetime.timedelta(seconds=getattr(settings, "LENDING_REPORT_TIMEOUT", DEFAULT_TIMEOUT))
+    return Q(status="PENDING") | Q(status="RUNNING", claimed_at__lt=timezone.now() - timeout)
+
+
+def run_report(log_id):
+    """Run a queued (or abandoned) report; False if someone else has it."""
+    if not ReportLog.objects.filter(_claimable(), pk=log_id).update(status="RUNNING", claimed_at=timezone.now()):
+        return False
+    _complete(ReportLog.objects.get(pk=log_id))
+    return True
+
+
+def run_pending_reports(limit=None):
+    """Run queued and abandoned reports, oldest first (the worker's loop). Returns how many ran."""
+    ran = 0
+    for log_id in ReportLog.objects.filter(_claimable()).order_by("id").values_list("id", flat=True)[:limit]:
+        ran += run_report(log_id)
+    return ran
+
+
+# -------------------------------
+# Background runner
+# -------------------------------
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=POOL_THREADS, thread_name_prefix="lending-report")
+        return _executor
+
+
+def _run_in_thread(log_id):
+    close_old_connections()
+    try:
+        run_report(log_id)
+    finally:
+        close_old_connections()
+
+
+def _dispatch(log_id):
+    if getattr(settings, "LENDING_REPORT_RUNNER", "thread") == "thread":
+        transaction.on_commit(lambda: _pool().submit(_run_in_thread, log_id))
+
+
+# -------------------------------
+# Entry point
+# -------------------------------
+def get_report(kind, scope_id=None, filters=None, user=None, refresh=False):
+    """
+    The ReportLog holding this report: a fresh stored snapshot when there is
+    one (unless `refresh`), else a new one, computed now or queued (check
+    .status). `filters` is ManagerReportForm.cleaned_data.
+    """
+    report_type, background = KINDS[kind]
+    scope = scope_key(kind, scope_id)
+    params = clean_params(filters)
+    key = fingerprint(scope, params)
+
+    if not refresh:
+        max_age = datetime.timedelta(seconds=getattr(settings, "LENDING_REPORT_MAX_AGE", DEFAULT_MAX_AGE))
+        fresh = (
+            ReportLog.objects.filter(fingerprint=key, created_at__gte=timezone.now() - max_age)
+            .exclude(status="FAILED").order_by("-created_at").first()
+        )
+        if fresh is not None:
+            return fresh
+
+    log = ReportLog.objects.create(
+        generated_by=user, report_type=report_type, scope=scope, params=params, fingerprint=key,
+        status="PENDING" if background else "RUNNING", claimed_at=None if background else timezone.now(),
+    )
+    if background:
+        _dispatch(log.pk)
+        return log
+    return _complete(log)
+
+
+def recent_reports(scope, limit=10):
+    """The scope's latest report logs, without their payloads."""
+    return (
+        ReportLog.objects.filter(scope=scope).defer("payload")
+        .select_related("generated_by").order_by("-created_at")[:limit]
+    )
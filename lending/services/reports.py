@@ -0,0 +1,98 @@
+# lending/services/reports.py
+
+from decimal import Decimal
+
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncMonth
+
+from ..models import Repayment
+from .aging import PAR_BUCKETS
+
+MONEY_METRICS = ("principal", "outstanding", "total_repayments")
+
+GROUPINGS = {
+    "officer": {
+        "fields": ["officer_id", "officer__first_name", "officer__last_name", "officer__username"],
+        "order_by": ["officer__first_name", "officer__last_name"],
+    },
+    "office": {
+        "fields": ["officer__office_id", "officer__office__name"],
+        "order_by": ["officer__office__name"],
+    },
+    "month": {
+        "fields": ["month"],
+        "order_by": ["month"],
+    },
+}
+
+
+def _metrics():
+    """Every report figure as a conditional aggregate over the same loan rows."""
+    return {
+        "total_loans": Count("id"),
+        "active_loans": Count("id", filter=~Q(status__in=["CLOSED", "REJECTED"])),
+        "closed_loans": Count("id", filter=Q(status="CLOSED")),
+        "pending_loans": Count("id", filter=Q(status="PENDING")),
+        "disbursed_loans": Count("id", filter=Q(status="DISBURSED")),
+        "overdue_loans": Count("id", filter=Q(aging__bucket__in=PAR_BUCKETS)),
+        "principal": Sum("principal_amount"),
+        "outstanding": Sum("balance", filter=Q(status="DISBURSED")),
+        "total_repayments": Sum("repaid"),
+    }
+
+
+def apply_filters(loans, filters):
+    """Narrow a loan queryset with ManagerReportForm.cleaned_data."""
+    if filters.get("start_date"):
+        loans = loans.filter(created_at__date__gte=filters["start_date"])
+    if filters.get("end_date"):
+        loans = loans.filter(created_at__date__lte=filters["end_date"])
+    if filters.get("officer"):
+        loans = loans.filter(officer=filters["officer"])
+    if filters.get("status"):
+        loans = loans.filter(status=filters["status"])
+    return loans
+
+
+def loan_report(loans, filters=None, group_by=None):
+    """
+    Compute the report for a scoped loan queryset in a single query.
+
+    Returns {"totals": {...}, "rows": [...]}; `rows` holds one dict per
+    officer, office or month when `group_by` is set, and the totals are
+    summed from them instead of being queried again.
+    """
+    # repayments are summed per loan in a correlated subquery so joining
+    # them doesn't multiply the loan counts
+    repaid = (
+        Repayment.objects.filter(loan=OuterRef("pk"))
+        .order_by().values("loan").annotate(total=Sum("amount")).values("total")
+    )
+    loans = apply_filters(loans, filters or {}).annotate(repaid=Subquery(repaid))
+
+    metrics = _metrics()
+    if group_by not in GROUPINGS:
+        totals = loans.aggregate(**metrics)
+        return {"totals": _clean(totals), "rows": []}
+
+    grouping = GROUPINGS[group_by]
+    if group_by == "month":
+        loans = loans.annotate(month=TruncMonth("created_at"))
+    rows = [
+        _clean(row) for row in
+        loans.values(*grouping["fields"]).annotate(**metrics).order_by(*grouping["order_by"])
+    ]
+
+    totals = {name: 0 for name in metrics}
+    for row in rows:
+        for name in metrics:
+            totals[name] += row[name]
+    return {"totals": totals, "rows": rows}
+
+
+def _clean(row):
+    # SUM over no rows is NULL; render it as zero
+    for key in MONEY_METRICS:
+        if row.get(key) is None:
+            row[key] = Decimal("0")
+    return row
@@ -0,0 +1,245 @@
+# lending/services/rollups.py
+"""
+Daily totals per scope, for trend charts.
+
+DailyRollup keeps one row per scope key and day: amount and number of
+repayments, principal and number of loans disbursed, and new applications.
+The keys are those of DashboardStats ("global", "office:<id>",
+"officer:<id>"), plus "policy:<id>" and "member:<id>". Member rows are
+kept per month. A trend over any date range reads at most one row per
+day of the range, about 1,100 for three years, however large the
+Repayment table grows.
+
+The write paths adjust the rows with F() increments, a few statements per
+UPDATE_CHUNK rows: apply_loan_payments for repayments, lending.signals
+for loans saved through the ORM, and services.loan_actions for batch
+disbursements. An event counts for the officer and office the loan had
+at the time.
+
+rebuild_rollups (the backfill_rollups command) recomputes a date range
+from the source tables, a few months per transaction. Those keep only a
+loan's current officer, so a rebuild counts the events of a reassigned
+loan (or of an officer who moved office) for the officer and office of
+today, not those of the time.
+"""
+
+import datetime
+from collections import defaultdict, namedtuple
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from ..models import DailyRollup, Loan, Repayment
+from . import stats
+
+# what an event on a loan is counted under
+LoanScope = namedtuple("LoanScope", ["officer_id", "office_id", "policy_id", "member_id"])
+
+DISBURSED_STATUSES = ("DISBURSED", "CLOSED")
+FIELDS = ("amount_repaid", "repayments_count", "principal_disbursed", "loans_disbursed", "applications")
+INTERVALS = {"day": None, "week": TruncWeek, "month": TruncMonth}
+DEFAULT_CHUNK_MONTHS = 1
+UPDATE_CHUNK = 100  # rows per UPDATE (one CASE arm each per field)
+
+
+def policy_key(policy_id):
+    return f"policy:{policy_id}"
+
+
+def member_key(member_id):
+    return f"member:{member_id}"
+
+
+def rollup_keys(scope):
+    keys = stats.scope_keys(scope.officer_id, scope.office_id)
+    if scope.policy_id:
+        keys.append(policy_key(scope.policy_id))
+    if scope.member_id:
+        keys.append(member_key(scope.member_id))
+    return keys
+
+
+def _day(key, moment):
+    """The row an event at `moment` (a datetime or date) belongs to for `key`."""
+    day = timezone.localdate(moment) if isinstance(moment, datetime.datetime) else moment
+    return day.replace(day=1) if key.startswith("member:") else day
+
+
+def _add(deltas, scope, moment, fields, sign=1):
+    for key in rollup_keys(scope):
+        row = deltas[(key, _day(key, moment))]
+        for field, value in fields.items():
+            row[field] += sign * value
+
+
+# -------------------------------
+# Incremental maintenance
+# -------------------------------
+def apply_deltas(deltas):
+    """
+    Add `deltas` ({(key, day): {field: amount}}) to the stored rows with F()
+    increments: per UPDATE_CHUNK rows, an INSERT of the missing ones and one
+    UPDATE.
+    """
+    deltas = {slot: {f: v for f, v in fields.items() if v} for slot, fields in deltas.items()}
+    deltas = {slot: fields for slot, fields in deltas.items() if fields}
+    slots = list(deltas)
+    for start in range(0, len(slots), UPDATE_CHUNK):
+        chunk = slots[start:start + UPDATE_CHUNK]
+        DailyRollup.objects.bulk_create([DailyRollup(key=key, day=day) for key, day in chunk], ignore_conflicts=True)
+        increments = {}
+        for field in FIELDS:
+            arms = [
+                When(key=key, day=day, then=Value(deltas[(key, day)][field]))
+                for key, day in chunk if field in deltas[(key, day)]
+            ]
+            if arms:
+                amount = Case(*arms, default=Value(0), output_field=DailyRollup._meta.get_field(field))
+                increments[field] = F(field) + amount
+        DailyRollup.objects.filter(reduce(or_, (Q(key=key, day=day) for key, day in chunk))).update(**increments)
+
+
+def record_repayments(repayments, scopes, sign=1):
+    """
+    Count Repayment rows (sign=-1: uncount them) on their payment day.
+    `scopes` maps loan_id -> LoanScope.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for repayment in repayments:
+        scope = scopes.get(repayment.loan_id)
+        if scope is not None:
+            _add(deltas, scope, repayment.paid_at, {"amount_repaid": repayment.amount, "repayments_count": 1}, sign)
+    apply_deltas(deltas)
+
+
+def record_disbursements(loans, sign=1):
+    """Count (LoanScope, disbursed_at, principal) triples on their disbursement day."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for scope, disbursed_at, principal in loans:
+        _add(deltas, scope, disbursed_at, {"principal_disbursed": principal, "loans_disbursed": 1}, sign)
+    apply_deltas(deltas)
+
+
+def _loan_events(loan, office_id, old_status=None, created=False, sign=1):
+    deltas = defaultdict(lambda: defaultdict(int))
+    scope = LoanScope(loan.officer_id, office_id, loan.policy_id, loan.member_id)
+    if created:
+        _add(deltas, scope, loan.created_at, {"applications": 1}, sign)
+    if loan.disbursed_at and loan.status in DISBURSED_STATUSES and old_status not in DISBURSED_STATUSES:
+        _add(deltas, scope, loan.disbursed_at, {"principal_disbursed": loan.principal_amount, "loans_disbursed": 1}, sign)
+    apply_deltas(deltas)
+
+
+def record_loan_saved(loan, office_id, old_status=None, created=False):
+    """Count a saved loan's application (when `created`) and its disbursement (when it just happened)."""
+    _loan_events(loan, office_id, old_status, created)
+
+
+def record_loan_deleted(loan, office_id):
+    _loan_events(loan, office_id, created=True, sign=-1)
+
+
+# -------------------------------
+# Backfill
+# -------------------------------
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return datetime.date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _bounds(first, last):
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.datetime.combine(first, datetime.time.min, tzinfo=tz),
+        datetime.datetime.combine(last, datetime.time.min, tzinfo=tz),
+    )
+
+
+def _compute(first, last):
+    """The rows of days first <= day < last, from the source tables."""
+    lo, hi = _bounds(first, last)
+    rows = defaultdict(lambda: defaultdict(int))
+    scope_fields = ("officer_id", "officer__office_id", "policy_id", "member_id")
+
+    def collect(queryset, moment, prefix, fields):
+        values = [f"{prefix}{name}" for name in scope_fields]
+        for group in queryset.annotate(on=TruncDate(moment)).values("on", *values).annotate(**fields).order_by():
+            scope = LoanScope(*(group[name] for name in values))
+            _add(rows, scope, group["on"], {field: group[field] or 0 for field in fields})
+
+    collect(
+        Repayment.objects.filter(paid_at__gte=lo, paid_at__lt=hi), "paid_at", "loan__",
+        {"amount_repaid": Sum("amount"), "repayments_count": Count("id")},
+    )
+    collect(
+        Loan.objects.filter(disbursed_at__gte=lo, disbursed_at__lt=hi), "disbursed_at", "",
+        {"principal_disbursed": Sum("principal_amount"), "loans_disbursed": Count("id")},
+    )
+    collect(Loan.objects.filter(created_at__gte=lo, created_at__lt=hi), "created_at", "", {"applications": Count("id")})
+    return rows
+
+
+def rebuild_rollups(start=None, end=None, chunk_months=DEFAULT_CHUNK_MONTHS, log=None):
+    """
+    Recompute the rows of the months from `start` to `end` (dates; by
+    default the whole history up to today), `chunk_months` months per
+    transaction. Returns the number of rows written.
+    """
+    if start is None:
+        firsts = [
+            Repayment.objects.aggregate(first=Min("paid_at"))["first"],
+            Loan.objects.aggregate(first=Min("created_at"))["first"],
+        ]
+        firsts = [timezone.localdate(moment) for moment in firsts if moment]
+        if not firsts:
+            return 0
+        start = min(firsts)
+    end = end or timezone.localdate()
+
+    written = 0
+    first = _month_start(start)
+    while first <= end:
+        last = _add_months(first, chunk_months)
+        with transaction.atomic():
+            # delete first: the transaction then holds the write lock (SQLite) or
+            # the rows' locks while it reads, so increments made meanwhile wait
+            DailyRollup.objects.filter(day__gte=first, day__lt=last).delete()
+            rows = _compute(first, last)
+            DailyRollup.objects.bulk_create(
+                [DailyRollup(key=key, day=day, **fields) for (key, day), fields in rows.items()], batch_size=1000,
+            )
+        written += len(rows)
+        if log:
+            log(f"{first:%Y-%m} to {last:%Y-%m}: {len(rows)} rows")
+        first = last
+    return written
+
+
+# -------------------------------
+# Reading
+# -------------------------------
+def trend(key, start=None, end=None, interval="day"):
+    """
+    The scope's totals per day, week or month between `start` and `end`
+    (inclusive dates, either may be None), oldest first: dicts with
+    "period" and FIELDS. Periods without activity are left out.
+    """
+    rows = DailyRollup.objects.filter(key=key)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    trunc = INTERVALS[interval]
+    period = trunc("day") if trunc else F("day")
+    return list(
+        rows.annotate(period=period).values("period")
+        .annotate(**{field: Sum(field) for field in FIELDS}).order_by("period")
+    )
@@ -0,0 +1,199 @@
+# lending/services/schedule.py
+
+import calendar
+import datetime
+from collections import defaultdict
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from ..models import Installment
+
+CENTS = Decimal("0.01")
+
+
+def _money(value):
+    return value.quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def add_months(day, months):
+    """Same day `months` later, clamped to the end of shorter months."""
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _start_date(loan):
+    start = loan.disbursed_at or timezone.now()
+    if isinstance(start, datetime.datetime):
+        start = timezone.localdate(start) if timezone.is_aware(start) else start.date()
+    return start
+
+
+# -------------------------------
+# Amortization engine
+# -------------------------------
+def _spread(total, months):
+    """`total` in `months` parts of whole cents, the leftover cents one each on the first parts."""
+    part = (total / months).quantize(CENTS, rounding=ROUND_DOWN)
+    extra = int((total - part * months) / CENTS)
+    return [part + CENTS if n < extra else part for n in range(months)]
+
+
+def _flat_rows(principal, annual_rate, months):
+    """Interest on the original principal, spread evenly over the term."""
+    interest = _money(principal * annual_rate * Decimal(months) / Decimal("12"))
+    return list(zip(_spread(principal, months), _spread(interest, months)))
+
+
+def _reducing_rows(principal, annual_rate, months):
+    """Equal monthly payments; interest charged on the outstanding principal."""
+    monthly_rate = annual_rate / Decimal("12")
+    if monthly_rate == 0:
+        return _flat_rows(principal, Decimal("0"), months)
+
+    payment = _money(principal * monthly_rate / (1 - (1 + monthly_rate) ** -months))
+    remaining = principal
+    rows = []
+    for n in range(1, months + 1):
+        interest_part = _money(remaining * monthly_rate)
+        # never more than is left: a tiny principal is paid off before the last month
+        principal_part = remaining if n == months else min(payment - interest_part, remaining)
+        remaining -= principal_part
+        rows.append((principal_part, interest_part))
+    return rows
+
+
+def schedule_rows(loan):
+    """The loan's installments as (number, due_date, principal_due, interest_due) tuples."""
+    months = int(loan.term_months)
+    if months < 1:
+        raise ValueError(f"Loan #{loan.pk} has a term of {months} months; it needs at least one installment.")
+    principal = Decimal(loan.principal_amount)
+    annual_rate = Decimal(loan.interest_rate) / Decimal("100")
+
+    if loan.interest_method == "REDUCING":
+        rows = _reducing_rows(principal, annual_rate, months)
+    else:
+        rows = _flat_rows(principal, annual_rate, months)
+
+    start = _start_date(loan)
+    return [
+        (n, add_months(start, n), principal_part, interest_part)
+        for n, (principal_part, interest_part) in enumerate(rows, start=1)
+    ]
+
+
+def build_schedule(loan):
+    """Return the loan's unsaved installments, due monthly after disbursement."""
+    return [
+        Installment(
+            loan=loan,
+            number=n,
+            due_date=due_date,
+            principal_due=principal_part,
+            interest_due=interest_part,
+            amount_due=principal_part + interest_part,
+        )
+        for n, due_date, principal_part, interest_part in schedule_rows(loan)
+    ]
+
+
+def generate_schedule(loan):
+    """(Re)write the full installment schedule for a loan in one bulk insert."""
+    installments = build_schedule(loan)
+    with transaction.atomic():
+        Installment.objects.filter(loan=loan).delete()
+        Installment.objects.bulk_create(installments)
+    return installments
+
+
+def generate_schedules(loans):
+    """generate_schedule for many loans: one DELETE and one bulk insert."""
+    loans = list(loans)
+    installments = [installment for loan in loans for installment in build_schedule(loan)]
+    with transaction.atomic():
+        Installment.objects.filter(loan_id__in=[loan.pk for loan in loans]).delete()
+        Installment.objects.bulk_create(installments)
+    return installments
+
+
+# -------------------------------
+# Payment allocation
+# -------------------------------
+def allocate_payments(totals):
+    """
+    Apply payments to the oldest open installments first.
+
+    `totals` maps loan_id -> Decimal amount paid. Open installments for all
+    loans are read in one query and written back with one bulk_update.
+    """
+    if not totals:
+        return
+
+    remaining = defaultdict(Decimal, totals)
+    changed = []
+    open_installments = (
+        Installment.objects.filter(loan_id__in=totals.keys())
+        .exclude(status="PAID")
+        .order_by("loan_id", "number")
+    )
+    for installment in open_installments:
+        amount = remaining[installment.loan_id]
+        if amount <= 0:
+            continue
+        applied = min(amount, installment.amount_outstanding)
+        installment.amount_paid += applied
+        installment.status = "PAID" if installment.amount_outstanding <= 0 else "PARTIAL"
+        remaining[installment.loan_id] = amount - applied
+        changed.append(installment)
+
+    Installment.objects.bulk_update(changed, ["amount_paid", "status"])
+
+
+def unallocate_payments(totals):
+    """
+    Undo allocate_payments: take `totals` (loan_id -> Decimal amount) back
+    off the most recently paid installments first, in one read and one
+    bulk_update.
+    """
+    if not totals:
+        return
+
+    remaining = defaultdict(Decimal, totals)
+    changed = []
+    paid_installments = (
+        Installment.objects.filter(loan_id__in=totals.keys(), amount_paid__gt=0)
+        .order_by("loan_id", "-number")
+    )
+    for installment in paid_installments:
+        amount = remaining[installment.loan_id]
+        if amount <= 0:
+            continue
+        taken = min(amount, installment.amount_paid)
+        installment.amount_paid -= taken
+        installment.status = "PARTIAL" if installment.amount_paid > 0 else "DUE"
+        remaining[installment.loan_id] = amount - taken
+        changed.append(installment)
+
+    Installment.objects.bulk_update(changed, ["amount_paid", "status"])
+
+
+# -------------------------------
+# Indexed lookups
+# -------------------------------
+def next_installment(loan):
+    return Installment.objects.filter(loan=loan).exclude(status="PAID").order_by("number").first()
+
+
+def amount_in_arrears(loan, as_of=None):
+    """Unpaid amount of installments that fell due on or before `as_of`."""
+    as_of = as_of or timezone.localdate()
+    total = (
+        Installment.objects.filter(loan=loan, status__in=["DUE", "PARTIAL"], due_date__lte=as_of)
+        .aggregate(total=Sum(F("amount_due") - F("amount_paid")))["total"]
+    )
+    return _money(Decimal(total)) if total else Decimal("0")
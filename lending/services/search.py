@@ -0,0 +1,184 @@
+# lending/services/search.py
+"""
+Member search index over name, email, national ID and phone numbers.
+
+SQLite keeps an FTS5 virtual table with the trigram tokenizer; PostgreSQL
+keeps a plain table with a pg_trgm GIN index. Both give indexed substring
+matching (the old icontains semantics) with a relevance order. The tables
+are created by migration 0005 and kept in sync by lending.signals; other
+database backends fall back to icontains lookups.
+"""
+
+from django.db import connection
+from django.db.models import Q
+
+from ..models import MemberProfile
+
+FTS_TABLE = "lending_member_fts"
+PG_TABLE = "lending_member_search"
+DEFAULT_LIMIT = 50
+CHUNK_SIZE = 2000
+SCAN_CHUNK = 500  # index matches read at a time by search_members
+
+ROW_FIELDS = (
+    "id", "user__office_id", "user__first_name", "user__middle_name", "user__last_name",
+    "user__email", "national_id", "phone_number", "alternative_phone",
+)
+
+
+def _supported():
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+# -------------------------------
+# Sync
+# -------------------------------
+def _entry(row):
+    pk, office_id, first, middle, last, email, national_id, phone, alt_phone = row
+    name = " ".join(p for p in (first, middle, last) if p)
+    phones = " ".join(p for p in (phone, alt_phone) if p)
+    return pk, office_id, name, (email or "").lower(), national_id, phones
+
+
+def index_members(member_ids):
+    """(Re)write the index entries of the given members from the source tables."""
+    member_ids = list(member_ids)
+    if not member_ids or not _supported():
+        return
+    entries = [_entry(row) for row in MemberProfile.objects.filter(pk__in=member_ids).values_list(*ROW_FIELDS)]
+    remove_members(member_ids)
+    _insert(entries)
+
+
+def remove_members(member_ids):
+    member_ids = list(member_ids)
+    if not member_ids or not _supported():
+        return
+    table = FTS_TABLE if connection.vendor == "sqlite" else PG_TABLE
+    placeholders = ", ".join(["%s"] * len(member_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE member_id IN ({placeholders})", member_ids)
+
+
+def _insert(entries):
+    if not entries:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (member_id, office_id, name, email, national_id, phone) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                entries,
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {PG_TABLE} (member_id, office_id, document) VALUES (%s, %s, %s)",
+                [(pk, office_id, " ".join(p for p in rest if p).lower()) for pk, office_id, *rest in entries],
+            )
+
+
+def rebuild_index(chunk_size=CHUNK_SIZE):
+    """Repopulate the whole index, reading members by id range."""
+    if not _supported():
+        return 0
+    table = FTS_TABLE if connection.vendor == "sqlite" else PG_TABLE
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}")
+
+    last_id, total = 0, 0
+    while True:
+        rows = list(
+            MemberProfile.objects.filter(pk__gt=last_id).order_by("pk").values_list(*ROW_FIELDS)[:chunk_size]
+        )
+        if not rows:
+            return total
+        _insert([_entry(row) for row in rows])
+        total += len(rows)
+        last_id = rows[-1][0]
+
+
+# -------------------------------
+# Query
+# -------------------------------
+def _terms(query):
+    return [t for t in query.lower().split() if t]
+
+
+def _like(term):
+    """A LIKE pattern (with ESCAPE '\\') matching `term` anywhere, its wildcards taken literally."""
+    for char in ("\\", "%", "_"):
+        term = term.replace(char, "\\" + char)
+    return f"%{term}%"
+
+
+def search_member_ids(query, office_id=None, limit=DEFAULT_LIMIT, offset=0):
+    """Ids of the best-matching members, most relevant first, from the `offset`-th on."""
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    if connection.vendor == "sqlite":
+        # the trigram tokenizer needs 3+ characters; shorter terms use LIKE on the same table
+        long_terms = [t for t in terms if len(t) >= 3]
+        where, params = [], []
+        if long_terms:
+            where.append(f"{FTS_TABLE} MATCH %s")
+            params.append(" AND ".join('"{}"'.format(t.replace('"', '""')) for t in long_terms))
+        for t in terms:
+            if len(t) < 3:
+                where.append("(name || ' ' || email || ' ' || national_id || ' ' || phone) LIKE %s ESCAPE '\\'")
+                params.append(_like(t))
+        if office_id is not None:
+            where.append("office_id = %s")
+            params.append(office_id)
+        order = "rank" if long_terms else "member_id DESC"
+        sql = f"SELECT member_id FROM {FTS_TABLE} WHERE {' AND '.join(where)} ORDER BY {order} LIMIT %s OFFSET %s"
+    else:
+        where = ["document LIKE %s ESCAPE '\\'"] * len(terms)
+        params = [_like(t) for t in terms]
+        if office_id is not None:
+            where.append("office_id = %s")
+            params.append(office_id)
+        sql = (
+            f"SELECT member_id FROM {PG_TABLE} WHERE {' AND '.join(where)} "
+            "ORDER BY similarity(document, %s) DESC, member_id DESC LIMIT %s OFFSET %s"
+        )
+        params.append(" ".join(terms))
+
+    params += [limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [int(row[0]) for row in cursor.fetchall()]
+
+
+def search_members(queryset, query, office_id=None, limit=DEFAULT_LIMIT, offset=0):
+    """
+    Return the members of `queryset` matching `query`, most relevant first:
+    up to `limit` of them after skipping the first `offset`. The index is
+    read SCAN_CHUNK matches at a time and each chunk narrowed to the
+    queryset, so matches it leaves out don't cut a page short. On
+    unsupported backends this is the old icontains filter.
+    """
+    if not _supported():
+        q = Q()
+        for term in _terms(query):
+            q &= (
+                Q(user__first_name__icontains=term) | Q(user__last_name__icontains=term)
+                | Q(user__email__icontains=term) | Q(national_id__icontains=term)
+                | Q(phone_number__icontains=term)
+            )
+        return list(queryset.filter(q).order_by("-id")[offset:offset + limit])
+
+    page, found, position = [], 0, 0
+    while found < offset + limit:
+        ids = search_member_ids(query, office_id=office_id, limit=SCAN_CHUNK, offset=position)
+        by_id = queryset.in_bulk(ids)
+        for pk in ids:
+            if pk in by_id:
+                if offset <= found < offset + limit:
+                    page.append(by_id[pk])
+                found += 1
+        if len(ids) < SCAN_CHUNK:
+            break
+        position += len(ids)
+    return page
@@ -0,0 +1,311 @@
+# lending/services/seed.py
+"""
+Synthetic loan book for load testing and benchmarks.
+
+Rows are generated in batches and written with bulk_create (installments
+and repayments, the largest tables, with a plain executemany), so no save()
+override or signal runs; the derived tables (dashboard stats, member search
+index, arrears aging, daily rollups) are rebuilt and the loans journaled in
+the ledger once at the end. Usernames, national IDs and transaction ids
+carry a per-run tag, so seeding an existing database adds to it instead of
+colliding with earlier rows.
+"""
+
+import datetime
+import random
+from array import array
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from ..models import (
+    Company, Installment, Loan, LoanPolicy, LoginIdentifier, ManagerOfficerAssignment,
+    MemberProfile, Office, Repayment, User,
+)
+from .aging import age_portfolio
+from .identifiers import identifiers_for
+from .ledger import backfill_ledger
+from .rollups import rebuild_rollups
+from .schedule import schedule_rows
+from .search import rebuild_index
+from .stats import rebuild_stats
+
+DEFAULT_BATCH_SIZE = 5000
+CENTS = Decimal("0.01")
+
+FIRST_NAMES = [
+    "Wanjiku", "Otieno", "Akinyi", "Kamau", "Njeri", "Mwangi", "Achieng", "Kiprop",
+    "Chebet", "Omondi", "Wairimu", "Mutua", "Nyambura", "Kibet", "Atieno", "Karanja",
+]
+LAST_NAMES = [
+    "Kariuki", "Odhiambo", "Wafula", "Mwende", "Njoroge", "Ochieng", "Kiptoo", "Muthoni",
+    "Owino", "Gitau", "Jepkosgei", "Maina", "Nekesa", "Ruto", "Wambui", "Onyango",
+]
+LOAN_STATUS_WEIGHTS = [("PENDING", 8), ("APPROVED", 4), ("REJECTED", 6), ("DISBURSED", 52), ("CLOSED", 30)]
+INSTALLMENT_FIELDS = (
+    "loan", "number", "due_date", "principal_due", "interest_due", "amount_due", "amount_paid", "status",
+)
+REPAYMENT_FIELDS = ("loan", "transaction_id", "payer_phone", "amount", "paid_at")
+POLICIES = [
+    # name, annual rate, min, max, max term, interest method
+    ("Biashara", "14.00", 5000, 500000, 24, "REDUCING"),
+    ("Jijenge", "12.00", 1000, 100000, 12, "FLAT"),
+    ("Emergency", "18.00", 500, 20000, 3, "FLAT"),
+]
+
+
+def _money(value):
+    return Decimal(value).quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def _split(total, parts, rng):
+    """`total` as `parts` positive amounts (2dp) that add up exactly."""
+    if parts <= 1:
+        return [total]
+    weights = [rng.uniform(0.5, 1.5) for _ in range(parts)]
+    scale = sum(weights)
+    amounts = [_money(total * Decimal(w / scale)) for w in weights[:-1]]
+    amounts.append(total - sum(amounts))
+    return amounts
+
+
+def _insert_rows(model, fields, rows, batch_size):
+    """
+    Plain executemany INSERT for the highest-volume tables, where building a
+    model instance per row would dominate the run. `rows` hold values already
+    adapted for the database, in `fields` order.
+    """
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(model._meta.get_field(name).column) for name in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    sql = f"INSERT INTO {qn(model._meta.db_table)} ({columns}) VALUES ({placeholders})"
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def _installments(loan, paid):
+    """
+    Schedule rows (loan, number, due date, principal, interest, due, paid, status)
+    with `paid` allocated oldest first, as services.schedule.allocate_payments
+    does in the database.
+    """
+    rows = []
+    for number, due_date, principal_due, interest_due in schedule_rows(loan):
+        amount_due = principal_due + interest_due
+        applied = min(paid, amount_due) if paid > 0 else Decimal("0")
+        paid -= applied
+        status = "PAID" if applied == amount_due else "PARTIAL" if applied else "DUE"
+        rows.append((loan, number, due_date, principal_due, interest_due, amount_due, applied, status))
+    return rows
+
+
+# -------------------------------
+# Steps
+# -------------------------------
+def _seed_organisation(tag, offices, officers_per_office, password_hash, rng):
+    company = Company.objects.create(name=f"Seed Microfinance {tag}", registration_number=f"SEED-{tag}")
+    office_rows = Office.objects.bulk_create([
+        Office(company=company, name=f"Branch {n + 1}", location=rng.choice(["Nairobi", "Kisumu", "Mombasa", "Eldoret", "Nakuru"]))
+        for n in range(offices)
+    ])
+    policies = LoanPolicy.objects.bulk_create([
+        LoanPolicy(
+            company=company, name=name, interest_rate=Decimal(rate), min_amount=Decimal(low),
+            max_amount=Decimal(high), max_term_months=term, interest_method=method,
+        )
+        for name, rate, low, high, term, method in POLICIES
+    ])
+
+    def staff(role, office, n):
+        username = f"{role.lower()}{tag}_{office.pk}_{n}"
+        return User(
+            username=username, email=f"{username}@seed.test", password=password_hash, role=role, office=office,
+            first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+        )
+
+    managers = User.objects.bulk_create([staff("MANAGER", office, 0) for office in office_rows])
+    officers = User.objects.bulk_create([
+        staff("OFFICER", office, n) for office in office_rows for n in range(officers_per_office)
+    ])
+    manager_of = {manager.office_id: manager for manager in managers}
+    ManagerOfficerAssignment.objects.bulk_create([
+        ManagerOfficerAssignment(manager=manager_of[officer.office_id], officer=officer) for officer in officers
+    ])
+    LoginIdentifier.objects.bulk_create([
+        LoginIdentifier(identifier=identifier, kind=kind, user=user)
+        for user in [*managers, *officers]
+        for identifier, kind in identifiers_for(user.username, user.email)
+    ], ignore_conflicts=True)
+
+    officers_by_office = [[o.pk for o in officers if o.office_id == office.pk] for office in office_rows]
+    return company, office_rows, policies, officers_by_office
+
+
+def _seed_members(tag, count, office_rows, password_hash, batch_size, now, days, rng, log):
+    """Create members in batches; return their profile ids and office positions."""
+    profile_ids, member_office = array("q"), array("l")
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        offices = [rng.randrange(len(office_rows)) for _ in range(size)]
+        users = []
+        for n, position in enumerate(offices, start=start):
+            username = f"member{tag}_{n}"
+            users.append(User(
+                username=username, email=f"{username}@seed.test", password=password_hash, role="MEMBER",
+                office=office_rows[position], first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                date_joined=now - datetime.timedelta(days=rng.uniform(0, days)),
+            ))
+        with transaction.atomic():
+            users = User.objects.bulk_create(users)
+            profiles = MemberProfile.objects.bulk_create([
+                MemberProfile(user=user, national_id=f"{tag}{n:08d}", phone_number=f"07{(int(tag) * 7919 + n) % 10 ** 8:08d}")
+                for n, user in enumerate(users, start=start)
+            ])
+            LoginIdentifier.objects.bulk_create([
+                LoginIdentifier(identifier=identifier, kind=kind, user_id=profile.user_id)
+                for user, profile in zip(users, profiles)
+                for identifier, kind in identifiers_for(user.username, user.email, profile.phone_number)
+            ], ignore_conflicts=True)
+        profile_ids.extend(profile.pk for profile in profiles)
+        member_office.extend(offices)
+        log(f"members {start + size}/{count}")
+    return profile_ids, member_office
+
+
+def _seed_loans(tag, count, repayments, profile_ids, member_office, officers_by_office, policies,
+                batch_size, now, days, schedules, rng, log):
+    """Create loans with their schedules and repayments; return the row counts written."""
+    statuses, weights = zip(*LOAN_STATUS_WEIGHTS)
+    paying_share = sum(w for s, w in LOAN_STATUS_WEIGHTS if s in ("DISBURSED", "CLOSED")) / sum(weights)
+    mean_payments = repayments / max(count * paying_share, 1)
+    totals = {"loans": 0, "repayments": 0, "installments": 0}
+
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        loans, payments, installments = [], [], []
+        for _ in range(size):
+            member = rng.randrange(len(profile_ids))
+            policy = rng.choice(policies)
+            status = rng.choices(statuses, weights)[0]
+            created_at = now - datetime.timedelta(days=rng.uniform(1, days))
+            principal = Decimal(rng.randrange(int(policy.min_amount), int(policy.max_amount) + 1, 500))
+            loan = Loan(
+                member_id=profile_ids[member], officer_id=rng.choice(officers_by_office[member_office[member]]),
+                policy=policy, principal_amount=principal, term_months=rng.randint(1, policy.max_term_months),
+                interest_rate=policy.interest_rate, interest_method=policy.interest_method,
+                status=status, created_at=created_at,
+            )
+            if status not in ("PENDING", "REJECTED"):
+                loan.approved_at = created_at + datetime.timedelta(hours=rng.uniform(1, 72))
+            if status in ("DISBURSED", "CLOSED"):
+                loan.disbursed_at = loan.approved_at + datetime.timedelta(hours=rng.uniform(1, 48))
+            loan.total_payable = _money(loan.calculate_total_payable())
+
+            paid = Decimal("0")
+            if status in ("DISBURSED", "CLOSED"):
+                n = max(int(rng.expovariate(1 / mean_payments) + 0.5), 1 if status == "CLOSED" else 0)
+                paid = loan.total_payable if status == "CLOSED" else _money(loan.total_payable * Decimal(rng.uniform(0, 0.9)))
+                if n and paid > 0:
+                    window = max((now - loan.disbursed_at).total_seconds(), 1)
+                    for amount in _split(paid, n, rng):
+                        payments.append((loan, amount, loan.disbursed_at + datetime.timedelta(seconds=rng.uniform(0, window))))
+                else:
+                    paid = Decimal("0")
+                if schedules:
+                    installments.extend(_installments(loan, paid))
+            loan.balance = loan.total_payable - paid
+            loans.append(loan)
+
+        with transaction.atomic():
+            Loan.objects.bulk_create(loans)
+            ops = connection.ops
+            _insert_rows(Installment, INSTALLMENT_FIELDS, [
+                (loan.pk, number, ops.adapt_datefield_value(due_date), *map(ops.adapt_decimalfield_value, amounts), status)
+                for loan, number, due_date, *amounts, status in installments
+            ], batch_size)
+            counters = {}
+            repayment_rows = []
+            for loan, amount, paid_at in sorted(payments, key=lambda p: p[2]):
+                counters[loan.pk] = counters.get(loan.pk, 0) + 1
+                repayment_rows.append((
+                    loan.pk, f"SD{tag}L{loan.pk}N{counters[loan.pk]}", "0700000000",
+                    ops.adapt_decimalfield_value(amount), ops.adapt_datetimefield_value(paid_at),
+                ))
+            _insert_rows(Repayment, REPAYMENT_FIELDS, repayment_rows, batch_size)
+
+        totals["loans"] += len(loans)
+        totals["repayments"] += len(repayment_rows)
+        totals["installments"] += len(installments)
+        log(f"loans {start + size}/{count}, repayments {totals['repayments']}")
+    return totals
+
+
+# -------------------------------
+# Entry point
+# -------------------------------
+@contextmanager
+def _without_fsync():
+    """SQLite: don't fsync every batch of the (re-creatable) load, and restore the setting after."""
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA synchronous")
+        previous = int(cursor.fetchone()[0])
+        cursor.execute("PRAGMA synchronous = OFF")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA synchronous = {previous}")
+
+
+def seed_loan_book(offices=5, officers_per_office=4, members=1000, loans=2500, repayments=10000,
+                   batch_size=DEFAULT_BATCH_SIZE, days=730, schedules=True, seed=None,
+                   password="password", log=None):
+    """
+    Add a synthetic company to the database and return the row counts written.
+
+    Loans are spread over the members at random and the repayments over the
+    disbursed and closed loans, so `repayments` is a target rather than an
+    exact count. `seed` makes the data reproducible for a given database.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+    now = timezone.now()
+    password_hash = make_password(password)  # hashed once, shared by every seeded user
+    tag = str((User.objects.aggregate(top=Max("id"))["top"] or 0) + 1)
+
+    with _without_fsync():
+        with transaction.atomic():
+            company, office_rows, policies, officers_by_office = _seed_organisation(
+                tag, offices, officers_per_office, password_hash, rng,
+            )
+        profile_ids, member_office = _seed_members(
+            tag, members, office_rows, password_hash, batch_size, now, days, rng, log,
+        )
+        totals = _seed_loans(
+            tag, loans, repayments, profile_ids, member_office, officers_by_office, policies,
+            batch_size, now, days, schedules, rng, log,
+        )
+
+        log("rebuilding dashboard stats, search index, rollups and aging; journaling the loans")
+        rebuild_stats()
+        rebuild_index()
+        rebuild_rollups(start=timezone.localdate(now - datetime.timedelta(days=days)))
+        backfill_ledger(chunk_size=batch_size)
+        if schedules:
+            age_portfolio()
+
+    return {
+        "company": company.pk,
+        "offices": len(office_rows),
+        "officers": sum(len(ids) for ids in officers_by_office),
+        "members": len(profile_ids),
+        **totals,
+    }
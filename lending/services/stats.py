@@ -0,0 +1,204 @@
+# lending/services/stats.py
+
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+
+from ..models import Company, DashboardStats, Loan, Office, Repayment, User
+
+GLOBAL = "global"
+UPDATE_CHUNK = 100  # rows per UPDATE (one CASE arm each per field)
+
+# what a loan contributes to the counters of its officer, office and the global row
+LoanState = namedtuple("LoanState", ["officer_id", "office_id", "status", "balance"])
+
+
+def office_key(office_id):
+    return f"office:{office_id}"
+
+
+def officer_key(officer_id):
+    return f"officer:{officer_id}"
+
+
+def scope_keys(officer_id=None, office_id=None):
+    keys = [GLOBAL]
+    if office_id:
+        keys.append(office_key(office_id))
+    if officer_id:
+        keys.append(officer_key(officer_id))
+    return keys
+
+
+def get_stats(key):
+    """Single primary-key read; an unknown scope renders as all zeros."""
+    return DashboardStats.objects.filter(pk=key).first() or DashboardStats(key=key)
+
+
+async def aget_stats(key):
+    return await DashboardStats.objects.filter(pk=key).afirst() or DashboardStats(key=key)
+
+
+# -------------------------------
+# Incremental maintenance
+# -------------------------------
+def apply_deltas(deltas):
+    """
+    Add `deltas` ({key: {field: amount}}) to the stored rows with F()
+    increments: per UPDATE_CHUNK rows, an INSERT of the missing ones and one
+    UPDATE.
+    """
+    deltas = {key: {f: v for f, v in fields.items() if v} for key, fields in deltas.items()}
+    deltas = {key: fields for key, fields in deltas.items() if fields}
+    keys = list(deltas)
+    for start in range(0, len(keys), UPDATE_CHUNK):
+        chunk = keys[start:start + UPDATE_CHUNK]
+        DashboardStats.objects.bulk_create([DashboardStats(key=key) for key in chunk], ignore_conflicts=True)
+        increments = {}
+        for field in sorted({f for key in chunk for f in deltas[key]}):
+            arms = [When(key=key, then=Value(deltas[key][field])) for key in chunk if field in deltas[key]]
+            amount = Case(*arms, default=Value(0), output_field=DashboardStats._meta.get_field(field))
+            increments[field] = F(field) + amount
+        DashboardStats.objects.filter(pk__in=chunk).update(**increments)
+
+
+def _loan_contribution(state):
+    fields = {"loans_total": 1, f"loans_{state.status.lower()}": 1}
+    if state.status == "DISBURSED":
+        fields["outstanding_balance"] = state.balance or Decimal("0")
+    return fields
+
+
+def loan_state(loan_id):
+    row = (
+        Loan.objects.filter(pk=loan_id)
+        .values_list("officer_id", "officer__office_id", "status", "balance")
+        .first()
+    )
+    return LoanState(*row) if row else None
+
+
+def record_loan_change(old, new):
+    """Move a loan's contribution from its `old` LoanState to its `new` one (either may be None)."""
+    record_loan_changes([(old, new)])
+
+
+def record_loan_changes(changes):
+    """record_loan_change for many (old, new) pairs, with one write per counter row."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for old, new in changes:
+        for state, sign in ((old, -1), (new, 1)):
+            if state is None:
+                continue
+            for key in scope_keys(state.officer_id, state.office_id):
+                for field, value in _loan_contribution(state).items():
+                    deltas[key][field] += sign * value
+    apply_deltas(deltas)
+
+
+def record_payments(before, totals):
+    """
+    Account for payments posted by services.repayments.apply_loan_payments.
+
+    `before` maps loan_id -> LoanState read ahead of the balance UPDATE and
+    `totals` maps loan_id -> amount paid; the new state is derived the same
+    way the UPDATE derives it, so no re-read is needed.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for loan_id, amount in totals.items():
+        old = before.get(loan_id)
+        if old is None:
+            continue
+        balance = old.balance or Decimal("0")
+        new = old._replace(
+            balance=max(balance - amount, Decimal("0")),
+            status="CLOSED" if balance <= amount else old.status,
+        )
+        for key in scope_keys(old.officer_id, old.office_id):
+            for field, value in _loan_contribution(old).items():
+                deltas[key][field] -= value
+            for field, value in _loan_contribution(new).items():
+                deltas[key][field] += value
+            deltas[key]["total_repaid"] += amount
+    apply_deltas(deltas)
+
+
+def _status_counts():
+    return {f"loans_{status.lower()}": Count("id", filter=Q(status=status)) for status, _ in Loan.STATUS_CHOICES}
+
+
+def record_officer_move(officer_id, old_office_id, new_office_id):
+    """
+    Move what an officer's loans and repayments count for from their old
+    office's row to the new one's: loans count for their officer's office.
+    """
+    if old_office_id == new_office_id:
+        return
+    fields = Loan.objects.filter(officer_id=officer_id).aggregate(
+        loans_total=Count("id"), outstanding_balance=Sum("balance", filter=Q(status="DISBURSED")), **_status_counts(),
+    )
+    fields["total_repaid"] = Repayment.objects.filter(loan__officer_id=officer_id).aggregate(total=Sum("amount"))["total"]
+    deltas = {}
+    for office_id, sign in ((old_office_id, -1), (new_office_id, 1)):
+        if office_id:
+            deltas[office_key(office_id)] = {field: sign * (value or 0) for field, value in fields.items()}
+    apply_deltas(deltas)
+
+
+def record_user_change(old, new):
+    """`old`/`new` are (role, office_id) pairs, or None for created/deleted users."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in ((old, -1), (new, 1)):
+        if state is None:
+            continue
+        role, office_id = state
+        deltas[GLOBAL]["users_count"] += sign
+        field = {"OFFICER": "officers_count", "MEMBER": "members_count"}.get(role)
+        if field:
+            deltas[GLOBAL][field] += sign
+            if office_id:
+                deltas[office_key(office_id)][field] += sign
+    apply_deltas(deltas)
+
+
+# -------------------------------
+# Full rebuild
+# -------------------------------
+def rebuild_stats():
+    """Recompute every row from the source tables with grouped aggregates."""
+    rows = defaultdict(lambda: defaultdict(int))
+
+    loans = Loan.objects.values("officer_id", "officer__office_id").annotate(
+        loans_total=Count("id"),
+        outstanding_balance=Sum("balance", filter=Q(status="DISBURSED")),
+        **_status_counts(),
+    ).order_by()
+    for group in loans:
+        for key in scope_keys(group.pop("officer_id"), group.pop("officer__office_id")):
+            for field, value in group.items():
+                rows[key][field] += value or 0
+
+    repaid = Repayment.objects.values("loan__officer_id", "loan__officer__office_id").annotate(
+        total=Sum("amount")
+    ).order_by()
+    for group in repaid:
+        for key in scope_keys(group["loan__officer_id"], group["loan__officer__office_id"]):
+            rows[key]["total_repaid"] += group["total"] or 0
+
+    for group in User.objects.values("role", "office_id").annotate(n=Count("id")).order_by():
+        rows[GLOBAL]["users_count"] += group["n"]
+        field = {"OFFICER": "officers_count", "MEMBER": "members_count"}.get(group["role"])
+        if field:
+            rows[GLOBAL][field] += group["n"]
+            if group["office_id"]:
+                rows[office_key(group["office_id"])][field] += group["n"]
+
+    rows[GLOBAL]["companies_count"] = Company.objects.count()
+    rows[GLOBAL]["offices_count"] = Office.objects.count()
+
+    with transaction.atomic():
+        DashboardStats.objects.all().delete()
+        DashboardStats.objects.bulk_create([DashboardStats(key=key, **fields) for key, fields in rows.items()])
+    return len(rows)
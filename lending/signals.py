@@ -0,0 +1,213 @@
+# lending/signals.py
+# Keeps DashboardStats, the aging rows' office, the daily rollups, the
+# member summaries, the ledger (disbursements, reversals of deleted
+# repayments), the officers' workload counters, the member search index,
+# the login identifiers and the cached principals current. Balance changes
+# made by repayments are recorded by services.repayments, which updates
+# loans with F() expressions and therefore never sends Loan signals.
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import principal
+from .models import Company, Loan, ManagerOfficerAssignment, MemberProfile, Office, Repayment, User
+from .services import aging, assignment, identifiers, ledger, member_summary, rollups, search, stats
+
+# User fields that appear in the member search index / the login identifiers
+SEARCH_FIELDS = {"first_name", "middle_name", "last_name", "email", "office", "office_id"}
+LOGIN_FIELDS = {"username", "email"}
+
+
+def _origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+def _member_stays(origin):
+    """
+    Whether a deletion started at a loan or repayment. A cascade from a
+    member's user, office or company deletes the member and their summary too.
+    """
+    return origin is None or _origin_model(origin) in (Loan, Repayment)
+
+
+def _office_of(officer_id):
+    if not officer_id:
+        return None
+    return User.objects.filter(pk=officer_id).values_list("office_id", flat=True).first()
+
+
+# -------------------------------
+# Loans
+# -------------------------------
+@receiver(pre_save, sender=Loan)
+def remember_loan_state(sender, instance, **kwargs):
+    instance._stats_before = None if instance._state.adding else stats.loan_state(instance.pk)
+
+
+@receiver(post_save, sender=Loan)
+def update_loan_stats(sender, instance, created, **kwargs):
+    old = getattr(instance, "_stats_before", None)
+    if old is not None and old.officer_id == instance.officer_id:
+        office_id = old.office_id
+    else:
+        office_id = _office_of(instance.officer_id)
+    new = stats.LoanState(instance.officer_id, office_id, instance.status, instance.balance)
+    stats.record_loan_change(old, new)
+    assignment.record_loan_changes([(old, new)])
+    rollups.record_loan_saved(instance, office_id, old and old.status, created)
+    if (
+        instance.disbursed_at and instance.status in ledger.BOOKED_STATUSES
+        and (old is None or old.status not in ledger.BOOKED_STATUSES)
+    ):
+        ledger.post_disbursements(
+            [(instance.pk, instance.principal_amount, instance.total_payable)], instance.disbursed_at,
+        )
+    member_summary.refresh_summaries([instance.member_id])
+
+
+@receiver(post_delete, sender=Loan)
+def remove_loan_stats(sender, instance, origin=None, **kwargs):
+    old = stats.LoanState(instance.officer_id, _office_of(instance.officer_id), instance.status, instance.balance)
+    stats.record_loan_change(old, None)
+    assignment.record_loan_changes([(old, None)])
+    rollups.record_loan_deleted(instance, old.office_id)
+    if _member_stays(origin):
+        member_summary.refresh_summaries([instance.member_id])
+
+
+@receiver(post_delete, sender=Repayment)
+def remove_repayment_stats(sender, instance, origin=None, **kwargs):
+    scope = rollups.LoanScope(*(
+        Loan.objects.filter(pk=instance.loan_id)
+        .values_list("officer_id", "officer__office_id", "policy_id", "member_id")
+        .first()
+    ) or (None, None, None, None))
+    keys = stats.scope_keys(scope.officer_id, scope.office_id)
+    stats.apply_deltas({key: {"total_repaid": -instance.amount} for key in keys})
+    rollups.record_repayments([instance], {instance.loan_id: scope}, sign=-1)
+    if origin is None or _origin_model(origin) is Repayment:
+        # not when the loan goes too: its journal goes with it
+        ledger.reverse_repayment(instance)
+    if _member_stays(origin):
+        member_summary.refresh_summaries([scope.member_id])
+
+
+# -------------------------------
+# Head counts
+# -------------------------------
+@receiver(pre_save, sender=User)
+def remember_user_state(sender, instance, update_fields=None, **kwargs):
+    instance._stats_before = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not {"role", "office", "office_id"} & set(update_fields):
+        # e.g. the last_login update on every sign-in
+        instance._stats_before = "skip"
+        return
+    instance._stats_before = User.objects.filter(pk=instance.pk).values_list("role", "office_id").first()
+
+
+@receiver(post_save, sender=User)
+def update_user_stats(sender, instance, created, **kwargs):
+    old = getattr(instance, "_stats_before", None)
+    if old == "skip":
+        return
+    stats.record_user_change(old, (instance.role, instance.office_id))
+    if old is not None and old[1] != instance.office_id:
+        # an officer's loans follow them to the new office
+        stats.record_officer_move(instance.pk, old[1], instance.office_id)
+        aging.move_officer(instance.pk, instance.office_id)
+    if "OFFICER" in (instance.role, old and old[0]):
+        # the office's set of officers may have changed
+        assignment.invalidate(instance.office_id, old and old[1])
+
+
+@receiver(post_delete, sender=User)
+def remove_user_stats(sender, instance, **kwargs):
+    stats.record_user_change((instance.role, instance.office_id), None)
+    if instance.role == "OFFICER":
+        assignment.invalidate(instance.office_id)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Office)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        field = "companies_count" if sender is Company else "offices_count"
+        stats.apply_deltas({stats.GLOBAL: {field: 1}})
+
+
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Office)
+def count_deleted(sender, instance, **kwargs):
+    field = "companies_count" if sender is Company else "offices_count"
+    stats.apply_deltas({stats.GLOBAL: {field: -1}})
+
+
+# -------------------------------
+# Member search index
+# -------------------------------
+@receiver(post_save, sender=MemberProfile)
+def index_member(sender, instance, **kwargs):
+    search.index_members([instance.pk])
+
+
+@receiver(post_delete, sender=MemberProfile)
+def unindex_member(sender, instance, **kwargs):
+    search.remove_members([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def reindex_member_user(sender, instance, created, update_fields=None, **kwargs):
+    if created or instance.role != "MEMBER":
+        return
+    if update_fields is not None and not SEARCH_FIELDS & set(update_fields):
+        return
+    search.index_members(MemberProfile.objects.filter(user=instance).values_list("pk", flat=True))
+
+
+# -------------------------------
+# Login identifiers
+# -------------------------------
+@receiver(post_save, sender=User)
+def sync_user_identifiers(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not LOGIN_FIELDS & set(update_fields):
+        return
+    identifiers.sync_user(instance.pk)
+
+
+@receiver(post_save, sender=MemberProfile)
+def sync_member_identifiers(sender, instance, **kwargs):
+    identifiers.sync_user(instance.user_id)
+
+
+# -------------------------------
+# Cached principals
+# -------------------------------
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_principal(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"role", "office", "office_id"} & set(update_fields):
+        return
+    principal.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=MemberProfile)
+@receiver(post_delete, sender=MemberProfile)
+def invalidate_member_principal(sender, instance, **kwargs):
+    principal.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Office)
+@receiver(pre_delete, sender=Office)
+def invalidate_office_principals(sender, instance, created=False, **kwargs):
+    # pre_delete: the users' office is about to be cleared without signals
+    if not created:
+        principal.invalidate(*instance.users.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=ManagerOfficerAssignment)
+@receiver(post_delete, sender=ManagerOfficerAssignment)
+def invalidate_manager_principal(sender, instance, **kwargs):
+    principal.invalidate(instance.manager_id)
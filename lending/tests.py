@@ -1,3 +1,1803 @@
-from django.test import TestCase
+# lending/tests.py
 
-# Create your tests here.
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.template import Context, Template
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import urls
+from .models import (
+    BalanceDiscrepancy, Company, DailyRollup, DashboardStats, Installment, JournalEntry, LedgerCheckpoint, Loan, LoanAging, LoanPolicy, ManagerOfficerAssignment,
+    MemberProfile, MemberSummary, Office, PaymentCallback, Repayment, ReportLog, SuspenseReceipt, User,
+)
+from .checks import check_callback_secret, check_shared_cache
+from .forms import LoanApplicationForm, MemberRegistrationForm
+from .pagination import encode_cursor, keyset_paginate, offset_paginate
+from .principal import get_principal
+from .querycount import QueryInspector
+from .services.aging import age_portfolio, bucket_for, par_summary, refresh_aging
+from .services.schedule import add_months, generate_schedule, schedule_rows
+from .services.search import search_member_ids, search_members
+from .services.assignment import assign_unassigned_loans, pick_officer
+from .services import accrual, assignment, exports, ledger, member_summary, stats
+from .services.balance_check import verify_balances
+from .services.loan_actions import transition_loans
+from .services.member_import import import_members
+from .services.member_summary import aget_summary, get_summary, rebuild_summaries
+from .services.payment_inbox import drain_inbox, sign
+from .services.reports import loan_report
+from .services.repayments import ingest_repayments
+from .services.reconciliation import LoanIndex, Receipt, reconcile_batch, reconcile_receipts
+from .services.report_snapshots import get_report, run_pending_reports
+from .services.rollups import LoanScope, member_key, rebuild_rollups, record_repayments
+from .services.stats import GLOBAL, get_stats, office_key, officer_key, rebuild_stats
+from .services.seed import seed_loan_book
+
+
+# -------------------------------
+# Shared fixture
+# -------------------------------
+# Every page a user can GET, as (url name, role, url kwargs). Kwarg values
+# name an attribute of the test case (LoanBookTestCase, ViewBenchmarkTests).
+ROUTES = [
+    ("home", None, {}),
+    ("login", None, {}),
+    ("member_register", None, {}),
+
+    ("admin_dashboard", "ADMIN", {}),
+    ("company_list", "ADMIN", {}),
+    ("company_create", "ADMIN", {}),
+    ("company_edit", "ADMIN", {"company_id": "company"}),
+    ("office_list", "ADMIN", {}),
+    ("office_create", "ADMIN", {}),
+    ("office_edit", "ADMIN", {"office_id": "office"}),
+    ("policy_list", "ADMIN", {}),
+    ("policy_create", "ADMIN", {}),
+    ("report_list", "ADMIN", {}),
+    ("report_detail", "ADMIN", {"report_id": "office_report"}),
+    ("report_status", "ADMIN", {"report_id": "office_report"}),
+    ("admin_trend", "ADMIN", {}),
+    ("export_members_csv", "ADMIN", {}),
+    ("export_loans_csv", "ADMIN", {}),
+    ("export_repayments_csv", "ADMIN", {}),
+    ("user_list", "ADMIN", {}),
+    ("user_create", "ADMIN", {}),
+    ("user_edit", "ADMIN", {"user_id": "officer"}),
+    ("assign_officers", "ADMIN", {}),
+    ("member_list", "ADMIN", {}),
+    ("member_create", "ADMIN", {}),
+    ("member_import", "ADMIN", {}),
+    ("member_edit", "ADMIN", {"member_id": "profile"}),
+
+    ("manager_dashboard", "MANAGER", {}),
+    ("manager_officer_list", "MANAGER", {}),
+    ("manager_member_list", "MANAGER", {}),
+    ("manager_loan_list", "MANAGER", {}),
+    ("manager_loan_detail", "MANAGER", {"loan_id": "loan"}),
+    ("manager_repayment_list", "MANAGER", {}),
+    ("manager_report_list", "MANAGER", {}),
+    ("manager_report_detail", "MANAGER", {"report_id": "office_report"}),
+    ("manager_trend", "MANAGER", {}),
+    ("manager_export_members_csv", "MANAGER", {}),
+    ("manager_export_loans_csv", "MANAGER", {}),
+    ("manager_export_repayments_csv", "MANAGER", {}),
+
+    ("officer_dashboard", "OFFICER", {}),
+    ("officer_member_list", "OFFICER", {}),
+    ("officer_loan_list", "OFFICER", {}),
+    ("officer_loan_detail", "OFFICER", {"loan_id": "loan"}),
+    ("officer_repayment_list", "OFFICER", {}),
+    ("officer_report_list", "OFFICER", {}),
+    ("officer_report_detail", "OFFICER", {"report_id": "officer_report"}),
+    ("officer_trend", "OFFICER", {}),
+
+    ("member_dashboard", "MEMBER", {}),
+    ("member_profile", "MEMBER", {}),
+    ("loan_apply", "MEMBER", {}),
+    ("loan_list", "MEMBER", {}),
+    ("loan_detail", "MEMBER", {"pk": "loan"}),
+    ("loan_edit", "MEMBER", {"pk": "pending_loan"}),
+    ("loan_delete", "MEMBER", {"pk": "pending_loan"}),
+    ("repayment_history", "MEMBER", {}),
+]
+
+# the same pages with their filters / search applied
+FILTERED_ROUTES = [
+    ("member_list", "ADMIN", {}, {"q": "wanjiku"}),
+    ("user_list", "ADMIN", {}, {"role": "OFFICER"}),
+    ("manager_member_list", "MANAGER", {}, {"q": "07"}),
+    ("manager_loan_list", "MANAGER", {}, {"status": "PENDING"}),
+    ("manager_report_list", "MANAGER", {}, {"group_by": "officer"}),
+    ("admin_trend", "ADMIN", {}, {"interval": "month", "start_date": "2020-01-01"}),
+    ("manager_trend", "MANAGER", {}, {"interval": "week"}),
+    ("officer_member_list", "OFFICER", {}, {"q": "wanjiku"}),
+    ("officer_loan_list", "OFFICER", {}, {"status": "DISBURSED"}),
+    ("officer_report_list", "OFFICER", {}, {"group_by": "month"}),
+]
+
+
+# GET routes that change data, plus POST-only endpoints
+UNSAFE_ROUTES = {
+    "logout", "company_delete", "office_delete", "user_delete", "member_suspend", "officer_loan_batch",
+    "payment_callback",
+}
+
+
+class RouteClientMixin:
+    """Resolve ROUTES against the fixture and fetch them as the right user."""
+
+    def url_for(self, name, kwargs, params=None):
+        url = reverse(name, kwargs={key: getattr(self, attr).pk for key, attr in kwargs.items()})
+        if params:
+            url += "?" + urlencode(params)
+        return url
+
+    def login_as(self, role):
+        """Sign the test client in as `role` (None: signed out)."""
+        self.client.logout()
+        if role:
+            self.client.force_login(self.users[role])
+
+    def fetch(self, url):
+        """GET `url`, reading streamed bodies to the end."""
+        response = self.client.get(url)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        return response
+
+    def all_routes(self):
+        for name, role, kwargs in ROUTES:
+            yield name, role, self.url_for(name, kwargs)
+        for name, role, kwargs, params in FILTERED_ROUTES:
+            yield name, role, self.url_for(name, kwargs, params)
+
+
+class LoanBookTestCase(RouteClientMixin, TestCase):
+    """One company with two offices and a small loan book in every state."""
+
+    def setUp(self):
+        cache.clear()  # cached summaries would outlive the rolled-back test data
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.company = Company.objects.create(name="Umoja Credit")
+        cls.office = Office.objects.create(company=cls.company, name="Nairobi CBD")
+        cls.other_office = Office.objects.create(company=cls.company, name="Kisumu")
+        cls.policy = LoanPolicy.objects.create(
+            company=cls.company, name="Biashara", interest_rate=Decimal("12"),
+            min_amount=Decimal("1000"), max_amount=Decimal("500000"), max_term_months=24,
+        )
+
+        cls.admin = User.objects.create_user("admin", "admin@umoja.test", "pw", role="ADMIN")
+        cls.manager = User.objects.create_user("manager", "manager@umoja.test", "pw", role="MANAGER", office=cls.office)
+        cls.officer = User.objects.create_user("officer", "officer@umoja.test", "pw", role="OFFICER", office=cls.office)
+        cls.other_officer = User.objects.create_user(
+            "officer2", "officer2@umoja.test", "pw", role="OFFICER", office=cls.other_office,
+        )
+        ManagerOfficerAssignment.objects.create(manager=cls.manager, officer=cls.officer)
+
+        profiles = []
+        for i, (first, office) in enumerate([("Wanjiku", cls.office), ("Otieno", cls.office), ("Akinyi", cls.other_office)]):
+            user = User.objects.create_user(
+                f"member{i}", f"member{i}@umoja.test", "pw", role="MEMBER", office=office,
+                first_name=first, last_name="Test",
+            )
+            profiles.append(MemberProfile.objects.create(
+                user=user, national_id=f"2900{i:04d}", phone_number=f"07120000{i:02d}",
+            ))
+        cls.profile = profiles[0]
+        cls.member = cls.profile.user
+
+        def loan(profile, officer, status, amount="20000"):
+            return Loan.objects.create(
+                member=profile, officer=officer, policy=cls.policy, principal_amount=Decimal(amount),
+                term_months=6, interest_rate=cls.policy.interest_rate, status=status,
+            )
+
+        cls.pending_loan = loan(cls.profile, cls.officer, "PENDING")
+        loan(profiles[1], cls.officer, "APPROVED")
+        loan(profiles[1], cls.officer, "REJECTED")
+        loan(profiles[2], cls.other_officer, "PENDING")
+
+        # disbursed three months ago, a few payments made: in arrears
+        cls.loan = loan(cls.profile, cls.officer, "PENDING", amount="60000")
+        cls.loan.status = "DISBURSED"
+        cls.loan.disbursed_at = timezone.now() - datetime.timedelta(days=95)
+        cls.loan.save()
+        generate_schedule(cls.loan)
+        for n in range(3):
+            Repayment.objects.create(
+                loan=cls.loan, transaction_id=f"QK1A2B3C4{n}", payer_phone="0712000000", amount=Decimal("2000"),
+            )
+        refresh_aging([cls.loan.pk])
+        cls.loan.refresh_from_db()
+
+        cls.office_report = get_report("office", cls.office.pk, user=cls.manager)
+        cls.officer_report = get_report("officer", cls.officer.pk, user=cls.officer)
+
+        cls.users = {
+            "ADMIN": cls.admin, "MANAGER": cls.manager,
+            "OFFICER": cls.officer, "MEMBER": cls.member,
+        }
+
+
+class RouteCoverageTests(SimpleTestCase):
+    def test_every_url_is_routed(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        routed = {name for name, _, _ in ROUTES}
+        self.assertEqual(names - routed - UNSAFE_ROUTES, set(), "add new pages to ROUTES in lending/tests.py")
+
+# -------------------------------
+# Repayment ingestion
+# -------------------------------
+class RepaymentIngestTests(LoanBookTestCase):
+    def test_ingest_skips_stored_and_repeated_transaction_ids(self):
+        balance = self.loan.balance
+        rows = [
+            {"loan_id": self.loan.pk, "transaction_id": "QK1A2B3C40", "amount": "2000"},  # stored by the fixture
+            {"loan_id": self.loan.pk, "transaction_id": "QKNEW00001", "amount": "1500", "paid_at": "2024-03-01T09:00:00"},
+            {"loan_id": self.loan.pk, "transaction_id": "QKNEW00001", "amount": "1500"},
+            {"loan_id": self.loan.pk, "transaction_id": "QKNEW00002", "amount": "500"},
+        ]
+        summary = ingest_repayments(rows, batch_size=3)
+
+        self.assertEqual(summary, {"created": 2, "skipped": 2, "loans": 1, "errors": []})
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.balance, balance - Decimal("2000"))
+        self.assertEqual(Repayment.objects.get(transaction_id="QKNEW00001").paid_at.date(), datetime.date(2024, 3, 1))
+        self.assertEqual(get_stats(officer_key(self.officer.pk)).outstanding_balance, self.loan.balance)
+
+        self.assertEqual(ingest_repayments(rows), {"created": 0, "skipped": 4, "loans": 0, "errors": []})
+
+    def test_amounts_that_are_not_positive_are_rejected(self):
+        balance = self.loan.balance
+        rows = [
+            {"loan_id": self.loan.pk, "transaction_id": "QKNEG00001", "amount": "-5000"},
+            {"loan_id": self.loan.pk, "transaction_id": "QKNEG00002", "amount": "0"},
+            {"loan_id": self.loan.pk, "transaction_id": "QKNEG00003", "amount": "NaN"},
+            {"loan_id": self.loan.pk, "transaction_id": "QKNEG00004", "amount": "25"},
+        ]
+        summary = ingest_repayments(rows)
+
+        self.assertEqual(summary["created"], 1)
+        self.assertEqual([row for row, _ in summary["errors"]], [1, 2, 3])
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).balance, balance - Decimal("25"))
+        self.assertFalse(Repayment.objects.filter(transaction_id__startswith="QKNEG0000", amount__lte=0).exists())
+
+    def test_paying_off_the_balance_closes_the_loan(self):
+        rows = [{"loan_id": self.loan.pk, "transaction_id": "QKNEW00003", "amount": str(self.loan.balance + 100)}]
+        ingest_repayments(rows)
+
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.status, self.loan.balance), ("CLOSED", Decimal("0")))
+        self.assertEqual(
+            JournalEntry.objects.filter(reference="QKNEW00003", credit="MEMBER_CREDIT").get().amount, Decimal("100"),
+        )
+
+    def test_transaction_id_stored_meanwhile_is_not_posted(self):
+        balance = self.loan.balance
+        read = Repayment.objects.filter
+
+        def stale_read(*args, **kwargs):
+            # the first read misses the id another worker stores right after it
+            if not Repayment.objects.all().filter(transaction_id="QKNEW00004").exists():
+                Repayment.objects.bulk_create([Repayment(loan=self.loan, transaction_id="QKNEW00004", amount=Decimal("10"))])
+                return Repayment.objects.none()
+            return read(*args, **kwargs)
+
+        rows = [{"loan_id": self.loan.pk, "transaction_id": "QKNEW00004", "amount": "10"}]
+        with mock.patch.object(Repayment.objects, "filter", side_effect=stale_read):
+            summary = ingest_repayments(rows)
+
+        self.assertEqual(summary["created"], 0)
+        self.assertEqual(Repayment.objects.filter(transaction_id="QKNEW00004").count(), 1)
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.balance, balance)
+        self.assertFalse(JournalEntry.objects.filter(reference="QKNEW00004").exists())
+
+
+# -------------------------------
+# Installment schedules
+# -------------------------------
+class ScheduleTests(LoanBookTestCase):
+    def test_flat_schedule_is_generated_and_paid_oldest_first(self):
+        installments = list(self.loan.installments.all())
+
+        self.assertEqual(len(installments), 6)
+        self.assertEqual(sum(i.amount_due for i in installments), self.loan.total_payable)
+        self.assertEqual(installments[0].due_date, add_months(timezone.localdate(self.loan.disbursed_at), 1))
+        # the fixture's three payments of 2000 went to the first installment
+        self.assertEqual((installments[0].status, installments[0].amount_paid), ("PARTIAL", Decimal("6000")))
+        self.assertEqual({i.status for i in installments[1:]}, {"DUE"})
+
+    def test_reducing_schedule_amortizes_the_principal(self):
+        loan = Loan.objects.create(
+            member=self.profile, officer=self.officer, policy=self.policy, principal_amount=Decimal("12000"),
+            term_months=12, interest_rate=Decimal("24"), interest_method="REDUCING",
+        )
+        rows = schedule_rows(loan)
+
+        self.assertEqual(sum(p for _, _, p, _ in rows), Decimal("12000"))
+        self.assertEqual(len({p + i for _, _, p, i in rows[:-1]}), 1)  # equal payments
+        self.assertGreater(rows[0][3], rows[-1][3])  # interest falls with the balance
+        self.assertEqual(loan.total_payable, sum(p + i for _, _, p, i in rows))
+
+    def test_small_principals_have_no_negative_installments(self):
+        for method in ("FLAT", "REDUCING"):
+            loan = Loan(
+                pk=1, principal_amount=Decimal("0.05"), term_months=10, interest_rate=Decimal("24"),
+                interest_method=method,
+            )
+            rows = schedule_rows(loan)
+            self.assertEqual(sum(p for _, _, p, _ in rows), Decimal("0.05"), method)
+            self.assertTrue(all(p >= 0 and i >= 0 for _, _, p, i in rows), method)
+
+        loan = Loan(pk=1, principal_amount=Decimal("1000"), term_months=3, interest_rate=Decimal("0"))
+        self.assertEqual([p for _, _, p, _ in schedule_rows(loan)], [Decimal("333.34"), Decimal("333.33"), Decimal("333.33")])
+
+    def test_a_term_of_zero_months_is_refused(self):
+        form = LoanApplicationForm({"policy": self.policy.pk, "principal_amount": "5000", "term_months": 0}, member=self.profile)
+        self.assertIn("term_months", form.errors)
+
+        loan = Loan(pk=1, principal_amount=Decimal("5000"), term_months=0, interest_rate=Decimal("12"))
+        with self.assertRaisesMessage(ValueError, "at least one installment"):
+            schedule_rows(loan)
+
+
+# -------------------------------
+# Arrears aging
+# -------------------------------
+class AgingTests(LoanBookTestCase):
+    def test_sweep_ages_from_the_oldest_unpaid_installment(self):
+        today = timezone.localdate()
+        due = [i for i in self.loan.installments.all() if i.due_date <= today]
+        first = due[0]
+
+        self.assertEqual(age_portfolio(), 1)
+        aging = LoanAging.objects.get(loan=self.loan)
+        self.assertEqual(aging.days_past_due, (today - first.due_date).days)
+        self.assertEqual(aging.bucket, bucket_for(aging.days_past_due))
+        self.assertEqual(aging.amount_overdue, sum(i.amount_outstanding for i in due))
+        self.assertEqual((aging.officer_id, aging.office_id), (self.officer.pk, self.office.pk))
+
+        later = today + datetime.timedelta(days=40)
+        call_command("age_portfolio", as_of=later.isoformat(), stdout=io.StringIO())
+        self.assertEqual(LoanAging.objects.get(loan=self.loan).days_past_due, (later - first.due_date).days)
+
+    def test_par_summary_and_closed_loans(self):
+        age_portfolio()
+        par = par_summary(office=self.office)
+
+        self.assertEqual(par["portfolio"], self.loan.balance)
+        self.assertEqual(par["at_risk"], self.loan.balance)
+        self.assertEqual(par["overdue_loans"], 1)
+        self.assertEqual(par_summary(office=self.other_office)["portfolio"], Decimal("0"))
+
+        Loan.objects.filter(pk=self.loan.pk).update(status="CLOSED", balance=0)
+        age_portfolio()
+        self.assertFalse(LoanAging.objects.exists())
+
+
+# -------------------------------
+# Dashboard statistics
+# -------------------------------
+class DashboardStatsTests(LoanBookTestCase):
+    def counters(self):
+        return {row.pop("key"): row for row in DashboardStats.objects.values()}
+
+    def assertMatchesRebuild(self):
+        maintained = self.counters()
+        rebuild_stats()
+        rebuilt = self.counters()
+        for key in maintained.keys() | rebuilt.keys():
+            zeros = {field: 0 for field in rebuilt.get(key, maintained.get(key))}
+            self.assertEqual(maintained.get(key, zeros), rebuilt.get(key, zeros), key)
+
+    def test_signals_keep_the_counters_a_rebuild_computes(self):
+        self.assertEqual(get_stats(office_key(self.office.pk)).loans_disbursed, 1)
+        self.assertEqual(get_stats(officer_key(self.officer.pk)).total_repaid, Decimal("6000"))
+        self.assertMatchesRebuild()
+
+        self.pending_loan.delete()
+        Repayment.objects.filter(loan=self.loan).first().delete()
+        self.assertMatchesRebuild()
+
+    def test_an_officer_moving_office_takes_their_loans(self):
+        age_portfolio()
+        self.officer.office = self.other_office
+        self.officer.save()
+
+        moved = get_stats(office_key(self.other_office.pk))
+        self.assertEqual(moved.outstanding_balance, self.loan.balance)
+        self.assertEqual(get_stats(office_key(self.office.pk)).loans_total, 0)
+        self.assertEqual(LoanAging.objects.get(loan=self.loan).office_id, self.other_office.pk)
+        self.assertMatchesRebuild()
+
+    def test_a_loan_change_is_one_insert_and_one_update(self):
+        old = stats.loan_state(self.loan.pk)
+        new = old._replace(officer_id=self.other_officer.pk, office_id=self.other_office.pk, status="CLOSED")
+        with CaptureQueriesContext(connection) as queries:
+            stats.record_loan_change(old, new)
+
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(get_stats(officer_key(self.other_officer.pk)).loans_closed, 1)
+        self.assertEqual(get_stats(office_key(self.office.pk)).loans_disbursed, 0)
+        self.assertEqual(get_stats(GLOBAL).outstanding_balance, 0)
+
+
+# -------------------------------
+# Role reports
+# -------------------------------
+class LoanReportTests(LoanBookTestCase):
+    def test_report_is_one_query_and_rows_add_up(self):
+        age_portfolio()
+        with CaptureQueriesContext(connection) as queries:
+            report = loan_report(Loan.objects.all())
+        totals = report["totals"]
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            (totals["total_loans"], totals["pending_loans"], totals["active_loans"], totals["overdue_loans"]), (5, 2, 4, 1),
+        )
+        self.assertEqual(totals["total_repayments"], Decimal("6000"))
+        self.assertEqual(totals["outstanding"], self.loan.balance)
+
+        by_officer = loan_report(Loan.objects.all(), group_by="officer")
+        self.assertEqual(by_officer["totals"], totals)
+        self.assertEqual(
+            {row["officer_id"]: row["total_loans"] for row in by_officer["rows"]},
+            {self.officer.pk: 4, self.other_officer.pk: 1},
+        )
+
+    def test_filters_narrow_the_loans(self):
+        loans = Loan.objects.filter(officer__office=self.office)
+        report = loan_report(loans, {"status": "PENDING", "officer": self.officer})
+        self.assertEqual(report["totals"]["total_loans"], 1)
+        self.assertEqual(report["totals"]["principal"], self.pending_loan.principal_amount)
+
+        tomorrow = timezone.localdate() + datetime.timedelta(days=1)
+        self.assertEqual(loan_report(loans, {"start_date": tomorrow})["totals"]["total_loans"], 0)
+
+
+# -------------------------------
+# CSV exports
+# -------------------------------
+class ExportTests(LoanBookTestCase):
+    def download(self, name):
+        response = self.client.get(reverse(name))
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+    def test_manager_exports_only_their_office(self):
+        self.login_as("MANAGER")
+        header, *rows = self.download("manager_export_loans_csv")
+
+        self.assertEqual(header, exports.LOAN_HEADER)
+        self.assertEqual(
+            {int(row[0]) for row in rows},
+            set(Loan.objects.filter(officer__office=self.office).values_list("pk", flat=True)),
+        )
+        header, *members = self.download("manager_export_members_csv")
+        self.assertEqual(header, ["ID", "Name", "Email", "Phone", "National ID"])  # the format managers had
+        self.assertEqual((len(members), len(members[0])), (2, 5))
+
+    def test_admin_exports_every_repayment(self):
+        self.login_as("ADMIN")
+        header, *members = self.download("export_members_csv")
+        self.assertEqual(header, ["ID", "Name", "Email", "Phone", "National ID", "Active"])
+        self.assertEqual(len(members), MemberProfile.objects.count())
+        _, *rows = self.download("export_repayments_csv")
+        self.assertEqual(sorted(row[1] for row in rows), [f"QK1A2B3C4{n}" for n in range(3)])
+
+    def test_manager_without_an_office_exports_nothing(self):
+        Loan.objects.create(
+            member=self.profile, policy=self.policy, principal_amount=Decimal("5000"),
+            term_months=3, interest_rate=self.policy.interest_rate,
+        )  # unassigned
+        self.manager.office = None
+        self.manager.save()
+        self.login_as("MANAGER")
+
+        for name in ("manager_export_members_csv", "manager_export_loans_csv", "manager_export_repayments_csv"):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+                self.assertFalse(response.streaming)
+                self.assertRedirects(response, reverse("manager_dashboard"), fetch_redirect_response=False)
+
+
+# -------------------------------
+# Keyset pagination
+# -------------------------------
+class KeysetPaginationTests(LoanBookTestCase):
+    ORDERING = ("-paid_at", "-id")
+
+    def setUp(self):
+        super().setUp()
+        paid_at = timezone.now() - datetime.timedelta(days=1)
+        # ties on paid_at are broken by id
+        Repayment.objects.bulk_create([
+            Repayment(loan=self.loan, transaction_id=f"QKPAGE{n:04d}", amount=Decimal("1"), paid_at=paid_at)
+            for n in range(5)
+        ])
+        self.expected = list(Repayment.objects.order_by(*self.ORDERING).values_list("pk", flat=True))
+
+    def page(self, query=""):
+        request = RequestFactory().get("/repayments/?" + query)
+        return keyset_paginate(request, Repayment.objects.all(), self.ORDERING, page_size=3)
+
+    def test_cursors_walk_every_row_once_both_ways(self):
+        pages = [self.page("status=x")]
+        while pages[-1].has_next:
+            pages.append(self.page(pages[-1].next_query))
+        self.assertEqual([r.pk for page in pages for r in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertFalse(pages[0].has_previous)
+        self.assertIn("status=x", pages[1].next_query)
+
+        back = self.page(pages[-1].prev_query)
+        self.assertEqual([r.pk for r in back], [r.pk for r in pages[1]])
+        self.assertTrue(back.has_previous and back.has_next)
+        self.assertEqual([r.pk for r in self.page(back.prev_query)], [r.pk for r in pages[0]])
+
+    def test_invalid_cursor_restarts_at_the_first_page(self):
+        for token in ("garbage", encode_cursor([1], "next"), encode_cursor(["x", 1], "next"), encode_cursor(["x", 1], "up")):
+            with self.subTest(token=token):
+                self.assertEqual([r.pk for r in self.page(f"cursor={token}")], self.expected[:3])
+
+
+# -------------------------------
+# Member search
+# -------------------------------
+class MemberSearchTests(LoanBookTestCase):
+    def test_index_matches_substrings_within_an_office(self):
+        akinyi = MemberProfile.objects.get(user__first_name="Akinyi")
+
+        self.assertEqual(search_member_ids("wanji"), [self.profile.pk])
+        self.assertEqual(search_member_ids("0712000002"), [akinyi.pk])
+        self.assertEqual(search_member_ids("test akinyi", office_id=self.office.pk), [])
+        self.assertEqual(len(search_member_ids("07", office_id=self.office.pk)), 2)  # short terms too
+
+        self.member.first_name = "Njeri"
+        self.member.save()
+        self.assertEqual(search_member_ids("wanji"), [])
+        self.assertEqual(search_member_ids("njeri"), [self.profile.pk])
+
+    def test_wildcards_are_searched_for_literally(self):
+        for term in ("%", "_", "\\", "a%"):
+            self.assertEqual(search_member_ids(term), [], term)
+        user = User.objects.create_user("w_k", "w_k@umoja.test", "pw", role="MEMBER", office=self.office)
+        member = MemberProfile.objects.create(user=user, national_id="44000001", phone_number="0744000001")
+        self.assertEqual(search_member_ids("_"), [member.pk])
+
+    def test_pages_reach_past_the_first_matches_and_skip_excluded_members(self):
+        for n in range(7):
+            user = User.objects.create_user(f"zawadi{n}", f"zawadi{n}@umoja.test", "pw", role="MEMBER", office=self.office)
+            MemberProfile.objects.create(user=user, national_id=f"3300{n:04d}", phone_number=f"07330000{n:02d}")
+        everyone = search_member_ids("zawadi", limit=100)
+        members = MemberProfile.objects.exclude(pk__in=everyone[::3])  # out of scope, e.g. suspended
+        expected = [pk for pk in everyone if pk not in everyone[::3]]
+
+        def fetch(offset, limit):
+            return search_members(members, "zawadi", limit=limit, offset=offset)
+
+        with mock.patch("lending.services.search.SCAN_CHUNK", 2):
+            request = RequestFactory().get("/members/", {"q": "zawadi"})
+            pages = [offset_paginate(request, fetch, page_size=2)]
+            while pages[-1].has_next:
+                request = RequestFactory().get("/members/?" + pages[-1].next_query)
+                pages.append(offset_paginate(request, fetch, page_size=2))
+
+        self.assertEqual([m.pk for page in pages for m in page], expected)
+        self.assertEqual(len(pages), 2)
+        self.assertTrue(pages[-1].has_previous)
+
+
+# -------------------------------
+# Login identifiers
+# -------------------------------
+class LoginBackendTests(LoanBookTestCase):
+    def test_email_phone_and_username_all_sign_in(self):
+        for identifier in ("member0", "Member0@Umoja.test", "0712000000", "712 000 000", "+254712000000"):
+            with self.subTest(identifier=identifier):
+                self.assertEqual(authenticate(None, username=identifier, password="pw"), self.member)
+        self.assertIsNone(authenticate(None, username="member0", password="wrong"))
+
+    def test_numeric_username_signs_in(self):
+        user = User.objects.create_user("29001234", "numeric@umoja.test", "pw", role="OFFICER")
+        self.assertEqual(authenticate(None, username="29001234", password="pw"), user)
+
+        # a username that is someone else's phone number: the password decides
+        twin = User.objects.create_user("0712000000", "twin@umoja.test", "twin-pw", role="OFFICER")
+        self.assertEqual(authenticate(None, username="0712000000", password="pw"), self.member)
+        self.assertEqual(authenticate(None, username="0712000000", password="twin-pw"), twin)
+
+    def test_unknown_identifier_still_hashes_the_password(self):
+        with mock.patch.object(User, "set_password", autospec=True) as set_password:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertIsNone(authenticate(None, username="nobody@umoja.test", password="pw"))
+        set_password.assert_called_once()
+        self.assertEqual(len(queries), 1)
+
+
+# -------------------------------
+# Cached principals
+# -------------------------------
+class PrincipalTests(LoanBookTestCase):
+    def request_for(self, user):
+        request = RequestFactory().get("/")
+        request.user = User.objects.get(pk=user.pk)
+        return request
+
+    def test_principal_is_cached_until_its_inputs_change(self):
+        principal = get_principal(self.request_for(self.manager))
+        self.assertEqual((principal.role, principal.office_id, principal.company_id), ("MANAGER", self.office.pk, self.company.pk))
+        self.assertEqual(principal.officer_ids, {self.officer.pk})
+
+        request = self.request_for(self.manager)
+        with self.assertNumQueries(0):
+            get_principal(request)
+
+        ManagerOfficerAssignment.objects.create(manager=self.manager, officer=self.other_officer)
+        principal = get_principal(self.request_for(self.manager))
+        self.assertEqual(principal.officer_ids, {self.officer.pk, self.other_officer.pk})
+
+    def test_entry_left_by_another_process_is_rebuilt_on_a_role_change(self):
+        get_principal(self.request_for(self.manager))
+        # demoted where this process's cache wasn't told
+        User.objects.filter(pk=self.manager.pk).update(role="OFFICER", office=self.other_office)
+
+        principal = get_principal(self.request_for(self.manager))
+        self.assertEqual((principal.role, principal.office_id), ("OFFICER", self.other_office.pk))
+
+    def test_deploy_check_requires_a_shared_cache(self):
+        self.assertEqual([e.id for e in check_shared_cache(None)], ["lending.E001"])
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://cache:6379"}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+# -------------------------------
+# Query plans
+# -------------------------------
+# Tables that grow with the loan book. Small reference tables (companies,
+# offices, policies) are expected to be scanned.
+LOAN_BOOK_TABLES = {
+    "lending_user", "lending_memberprofile", "lending_loginidentifier", "lending_loan",
+    "lending_installment", "lending_loanaging", "lending_repayment", "lending_reportlog",
+    "lending_dailyrollup", "lending_journalentry", "lending_ledgercheckpoint",
+}
+
+# Pages that read a whole table by design.
+FULL_SCANS_ALLOWED = {
+    "report_list": {"lending_loan"},                         # firm-wide report
+    "export_members_csv": {"lending_memberprofile"},
+    "export_loans_csv": {"lending_loan"},
+    "export_repayments_csv": {"lending_repayment"},
+}
+
+
+def _table_for(name, sql):
+    """Resolve a plan's table name, which may be a Django alias like U0/T4."""
+    match = re.search(rf'"(\w+)" {re.escape(name)}\b', sql)
+    return match.group(1) if match else name
+
+
+def full_table_scans(sql):
+    """Loan-book tables that `sql` reads without an index, per the database's plan."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+            # a rowid-order walk that stops at LIMIT is not a scan of the table
+            bounded = " LIMIT " in sql and not any("TEMP B-TREE FOR ORDER BY" in line for line in plan)
+            scans = [m.group(1) for m in (re.match(r"SCAN (\w+)$", line) for line in plan) if m]
+            if bounded:
+                return set()
+        else:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + sql)
+            plan = [row[0] for row in cursor.fetchall()]
+            scans = [m.group(1) for m in (re.search(r"Seq Scan on (\w+)", line) for line in plan) if m]
+    return {table for table in (_table_for(name, sql) for name in scans) if table in LOAN_BOOK_TABLES}
+
+
+class QueryPlanTests(LoanBookTestCase):
+    """
+    Run EXPLAIN on every statement each page issues and fail when one reads
+    a loan-book table without an index. At fixture size the planner follows
+    the schema, so a missing index shows up here as it would in production.
+    """
+
+    def setUp(self):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            self.skipTest("query plans are checked on SQLite and PostgreSQL")
+
+    def test_views_use_indexes(self):
+        for name, role, url in self.all_routes():
+            with self.subTest(url=url, role=role):
+                self.login_as(role)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.fetch(url)
+                self.assertLess(response.status_code, 400)
+
+                allowed = FULL_SCANS_ALLOWED.get(name, set())
+                for query in queries.captured_queries:
+                    sql = query["sql"]
+                    if not sql.startswith(("SELECT", "UPDATE", "DELETE")):
+                        continue
+                    scans = full_table_scans(sql) - allowed
+                    self.assertFalse(scans, f"{url} scans {', '.join(sorted(scans))}:\n{sql}")
+
+    def test_hot_filters_use_composite_indexes(self):
+        querysets = [
+            Loan.objects.filter(officer=self.officer, status="DISBURSED").order_by("-created_at", "-id"),
+            Loan.objects.filter(member=self.profile).order_by("-created_at", "-id"),
+            Loan.objects.filter(officer__office=self.office),
+            Repayment.objects.filter(loan=self.loan).order_by("-paid_at"),
+            MemberProfile.objects.filter(phone_number="0712000000"),
+            User.objects.filter(office=self.office, role="OFFICER"),
+        ]
+        for queryset in querysets:
+            with self.subTest(sql=str(queryset.query)):
+                with CaptureQueriesContext(connection) as queries:
+                    list(queryset)
+                self.assertFalse(full_table_scans(queries.captured_queries[-1]["sql"]))
+
+
+# -------------------------------
+# Seeder
+# -------------------------------
+class SeedTests(TransactionTestCase):
+    def synchronous(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            return cursor.fetchone()[0]
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite only")
+    def test_seeding_restores_synchronous_writes(self):
+        before = self.synchronous()
+        counts = seed_loan_book(offices=1, officers_per_office=1, members=5, loans=5, repayments=10, seed=1)
+        self.assertEqual(Loan.objects.count(), counts["loans"])
+        self.assertEqual(self.synchronous(), before)
+
+        with mock.patch("lending.services.seed.rebuild_stats", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                seed_loan_book(offices=1, officers_per_office=1, members=5, loans=5, repayments=10, seed=2)
+        self.assertEqual(self.synchronous(), before)
+
+
+# -------------------------------
+# Query budgets
+# -------------------------------
+# The most statements each page may run on a warm principal cache, session
+# and user lookups included. Lower a budget when a page gets cheaper; raise
+# one only with a reason.
+QUERY_BUDGETS = {
+    "home": 0, "login": 0, "member_register": 0,
+
+    "admin_dashboard": 3, "company_list": 3, "company_create": 2, "company_edit": 3,
+    "office_list": 3, "office_create": 3, "office_edit": 4, "policy_list": 3, "policy_create": 3,
+    "report_list": 4, "report_detail": 3, "report_status": 3, "admin_trend": 3, "export_members_csv": 3, "export_loans_csv": 3, "export_repayments_csv": 3,
+    "user_list": 3, "user_create": 5, "user_edit": 6, "assign_officers": 5,
+    "member_list": 4, "member_create": 2, "member_import": 3, "member_edit": 3,
+
+    "manager_dashboard": 3, "manager_officer_list": 4, "manager_member_list": 5,
+    "manager_loan_list": 4, "manager_loan_detail": 6, "manager_repayment_list": 3,
+    "manager_report_list": 6, "manager_report_detail": 3, "manager_trend": 3, "manager_export_members_csv": 3, "manager_export_loans_csv": 3,
+    "manager_export_repayments_csv": 3,
+
+    "officer_dashboard": 4, "officer_member_list": 5, "officer_loan_list": 4,
+    "officer_loan_detail": 7, "officer_repayment_list": 4, "officer_report_list": 5, "officer_report_detail": 4,
+    "officer_trend": 3,
+
+    "member_dashboard": 2, "member_profile": 4, "loan_apply": 5, "loan_list": 3,
+    "loan_detail": 9, "loan_edit": 6, "loan_delete": 3, "repayment_history": 3,
+}
+
+
+class QueryBudgetTests(LoanBookTestCase):
+    def test_views_stay_within_budget_without_n_plus_one(self):
+        for name, role, url in self.all_routes():
+            with self.subTest(url=url, role=role):
+                self.login_as(role)
+                self.fetch(url)  # warm the cached principal
+                with QueryInspector() as inspector:
+                    self.fetch(url)
+
+                self.assertFalse(inspector.repeated(), f"N+1 on {url}:\n{inspector.report()}")
+                self.assertLessEqual(
+                    inspector.count, QUERY_BUDGETS[name],
+                    f"{url} ran {inspector.count} queries, budget {QUERY_BUDGETS[name]}",
+                )
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual({name for name, _, _ in ROUTES} - QUERY_BUDGETS.keys(), set())
+
+    def test_inspector_points_at_the_template_line(self):
+        template = Template("{% for r in repayments %}\n{{ r.loan.member.user.username }}{% endfor %}")
+        with QueryInspector() as inspector:
+            template.render(Context({"repayments": Repayment.objects.all()}))
+
+        (origin, fp, times), *rest = inspector.repeated()
+        self.assertEqual(origin, "<unknown source>:2")
+        self.assertEqual(times, 3)
+        self.assertIn('FROM "lending_loan"', fp)
+
+    @override_settings(LENDING_QUERY_INSPECTOR=True)
+    async def test_middleware_counts_queries_under_asgi(self):
+        await self.async_client.aforce_login(self.officer)
+        for name in ("officer_dashboard", "officer_loan_list"):  # an async view and a sync one
+            response = await self.async_client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(int(response["X-Query-Count"]), 0, name)
+
+
+# -------------------------------
+# Member import
+# -------------------------------
+MEMBER_CSV = """First Name,Last Name,Email,National ID,Phone Number,Date of Birth,Password
+Wanjiku,Test,new1@umoja.test,31000001,0722000001,1990-04-01,s3cret-pass
+Wanjiku,Test,new2@umoja.test,31000002,0722000002,,
+Otieno,Test,MEMBER1@umoja.test,31000003,0722000003,,
+Akinyi,Test,new4@umoja.test,29000000,0722000004,,
+Chebet,Test,new1@umoja.test,31000005,0722000005,,
+Kamau,,new6@umoja.test,31000006,0722000006,,
+Mwangi,Test,new7@umoja.test,31000007,0722000007,01/02/1990,
+"""
+
+
+class MemberImportTests(LoanBookTestCase):
+    def test_import_skips_taken_rows_and_numbers_usernames(self):
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / "members.csv"
+        path.write_text(MEMBER_CSV)
+        members_before = get_stats(GLOBAL).members_count
+
+        call_command("import_members", str(path), office=self.office.pk, stdout=io.StringIO(), stderr=io.StringIO())
+
+        created = User.objects.filter(email__in=["new1@umoja.test", "new2@umoja.test"]).order_by("email")
+        # "wanjikutest" was free; the second Wanjiku Test gets the next number
+        self.assertEqual([u.username for u in created], ["wanjikutest", "wanjikutest1"])
+        self.assertTrue(created[0].check_password("s3cret-pass"))
+        self.assertFalse(created[1].has_usable_password())
+        self.assertEqual(created[0].profile.date_of_birth, datetime.date(1990, 4, 1))
+        self.assertEqual(created[0].office, self.office)
+        # duplicate email (any case), duplicate national id, missing name, bad date
+        self.assertFalse(User.objects.filter(email__in=["new4@umoja.test", "new6@umoja.test", "new7@umoja.test"]).exists())
+        self.assertFalse(User.objects.filter(first_name="Chebet").exists())
+        self.assertEqual(get_stats(GLOBAL).members_count, members_before + 2)
+        self.assertIn(created[0].profile.pk, search_member_ids("new1@umoja"))
+
+    def test_admin_upload(self):
+        self.login_as("ADMIN")
+        upload = SimpleUploadedFile("members.csv", MEMBER_CSV.encode(), content_type="text/csv")
+        response = self.client.post(reverse("member_import"), {"file": upload, "office": self.office.pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([line for line, _ in response.context["errors"]], [4, 5, 6, 7, 8])
+        self.assertEqual(User.objects.filter(username__startswith="wanjikutest").count(), 2)
+
+    def test_user_without_identifiers_is_a_skipped_row(self):
+        # bulk-created, so no login identifier rows
+        User.objects.bulk_create([User(username="legacy", email="Legacy@Umoja.test")])
+        rows = [
+            {"first_name": "Old", "last_name": "Timer", "email": "legacy@umoja.test", "national_id": "31000100", "phone_number": "0722000100"},
+            {"first_name": "New", "last_name": "Comer", "email": "fresh@umoja.test", "national_id": "31000101", "phone_number": "0722000101"},
+        ]
+        summary = import_members(rows, workers=1)
+
+        self.assertEqual((summary["created"], summary["errors"]), (1, [(2, "email legacy@umoja.test is already registered")]))
+
+    def test_batch_colliding_with_a_registration_is_checked_again(self):
+        read = MemberProfile.objects.filter
+        stale = []
+
+        def stale_read(*args, **kwargs):
+            # the first national ID check misses the fixture member's id
+            if "national_id__in" in kwargs and not stale:
+                stale.append(True)
+                return MemberProfile.objects.none()
+            return read(*args, **kwargs)
+
+        rows = [
+            {"first_name": "Dup", "last_name": "Id", "email": "dup@umoja.test", "national_id": self.profile.national_id, "phone_number": "0722000102"},
+            {"first_name": "Ok", "last_name": "Row", "email": "ok@umoja.test", "national_id": "31000103", "phone_number": "0722000103"},
+        ]
+        with mock.patch.object(MemberProfile.objects, "filter", side_effect=stale_read):
+            summary = import_members(rows, workers=1)
+
+        self.assertEqual(summary["created"], 1)
+        self.assertEqual([line for line, _ in summary["errors"]], [2])
+        self.assertTrue(User.objects.filter(email="ok@umoja.test").exists())
+        self.assertFalse(User.objects.filter(email="dup@umoja.test").exists())
+
+    def test_registration_allocates_username_in_one_query(self):
+        User.objects.bulk_create([
+            User(username=name, email=f"{name}@umoja.test") for name in ("janedoe", "janedoe1", "janedoe2", "janedoe4")
+        ])
+        form = MemberRegistrationForm({
+            "first_name": "Jane", "last_name": "Doe", "email": "jane@umoja.test", "password1": "pw-123456",
+            "password2": "pw-123456", "national_id": "31009999", "phone_number": "0722009999",
+            "date_of_birth": "1991-01-01",
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        with CaptureQueriesContext(connection) as queries:
+            user = form.save(commit=False)
+
+        self.assertEqual(user.username, "janedoe3")
+        self.assertEqual(len(queries), 1)
+
+
+# -------------------------------
+# Batch loan actions
+# -------------------------------
+class LoanBatchActionTests(LoanBookTestCase):
+    def batch(self, action, *loans):
+        self.login_as("OFFICER")
+        return self.client.post(
+            reverse("officer_loan_batch"), {"action": action, "loan_ids": [loan.pk for loan in loans]}, follow=True,
+        )
+
+    def test_approve_moves_only_pending_loans_of_the_officer(self):
+        other_pending = Loan.objects.get(status="PENDING", officer=self.other_officer)
+        rejected = Loan.objects.get(status="REJECTED")
+        pending_before = get_stats(officer_key(self.officer.pk)).loans_pending
+
+        response = self.batch("approve", self.pending_loan, rejected, other_pending)
+
+        self.pending_loan.refresh_from_db()
+        self.assertEqual(self.pending_loan.status, "APPROVED")
+        self.assertIsNotNone(self.pending_loan.approved_at)
+        self.assertEqual(Loan.objects.get(pk=rejected.pk).status, "REJECTED")
+        self.assertEqual(Loan.objects.get(pk=other_pending.pk).status, "PENDING")
+        warning = [str(m) for m in response.context["messages"] if m.level_tag == "warning"][0]
+        self.assertIn(f"#{rejected.pk} is rejected", warning)
+        self.assertIn(f"#{other_pending.pk} not one of your loans", warning)
+        self.assertEqual(get_stats(officer_key(self.officer.pk)).loans_pending, pending_before - 1)
+
+    def test_disburse_builds_schedules_in_constant_queries(self):
+        approved = [Loan.objects.get(status="APPROVED")]
+        approved += [
+            Loan.objects.create(
+                member=self.profile, officer=self.officer, policy=self.policy, principal_amount=Decimal("10000"),
+                term_months=term, interest_rate=self.policy.interest_rate, status="APPROVED",
+            )
+            for term in (3, 12)
+        ]
+        with CaptureQueriesContext(connection) as one:
+            transition_loans([approved[0].pk], "disburse", self.officer.pk)
+        with CaptureQueriesContext(connection) as two:
+            transition_loans([loan.pk for loan in approved[1:]], "disburse", self.officer.pk)
+
+        self.assertEqual(len(one), len(two))
+        self.assertEqual(Installment.objects.filter(loan__in=approved).count(), 6 + 3 + 12)
+        self.assertEqual(
+            get_stats(officer_key(self.officer.pk)).outstanding_balance,
+            sum(Loan.objects.filter(officer=self.officer, status="DISBURSED").values_list("balance", flat=True)),
+        )
+
+
+# -------------------------------
+# Officer assignment
+# -------------------------------
+class AssignmentTests(LoanBookTestCase):
+    def setUp(self):
+        cache.clear()
+        # the officer already has two open loans (one pending, one approved)
+        self.new_officer = User.objects.create_user(
+            "officer3", "officer3@umoja.test", "pw", role="OFFICER", office=self.office,
+        )
+
+    def apply(self):
+        self.login_as("MEMBER")
+        with self.captureOnCommitCallbacks(execute=True):  # the counters move when the request commits
+            self.client.post(reverse("loan_apply"), {
+                "policy": self.policy.pk, "principal_amount": "15000", "term_months": 6, "purpose": "Stock",
+            })
+        return Loan.objects.latest("id").officer
+
+    def test_applications_go_to_the_least_loaded_officer(self):
+        self.assertEqual(self.apply(), self.new_officer)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.apply(), self.new_officer)
+        # tied at two open loans each: the officer who waited longest
+        self.assertEqual(self.apply(), self.officer)
+        self.assertFalse([q for q in queries if '"role" = ' in q["sql"]], "workload re-read from the database")
+
+        # rejecting one of the new officer's loans makes them the lightest again
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_loans([Loan.objects.filter(officer=self.new_officer).first().pk], "reject", self.new_officer.pk)
+        self.assertEqual(self.apply(), self.new_officer)
+
+    def test_rolled_back_changes_leave_the_counters_alone(self):
+        pick_officer(self.office.pk)
+        before = dict(cache.get(assignment.cache_key(self.office.pk))["counts"])
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Loan.objects.filter(pk=self.pending_loan.pk).update(officer=self.new_officer)
+            assignment.record_loan_changes([(
+                stats.LoanState(self.officer.pk, self.office.pk, "PENDING", Decimal("0")),
+                stats.LoanState(self.new_officer.pk, self.office.pk, "PENDING", Decimal("0")),
+            )])
+            raise RuntimeError
+        self.assertEqual(cache.get(assignment.cache_key(self.office.pk))["counts"], before)
+
+    def test_counters_expire_however_often_they_are_written(self):
+        pick_officer(self.office.pk)
+        expires = cache.get(assignment.cache_key(self.office.pk))["expires"]
+        pick_officer(self.office.pk)
+        self.assertEqual(cache.get(assignment.cache_key(self.office.pk))["expires"], expires)
+
+        # drifted counters are reseeded from DashboardStats once the entry is past its expiry
+        entry = cache.get(assignment.cache_key(self.office.pk))
+        cache.set(assignment.cache_key(self.office.pk), {**entry, "counts": {self.officer.pk: 50, self.new_officer.pk: 50}})
+        with mock.patch.object(assignment.time, "time", return_value=expires + 1):
+            pick_officer(self.office.pk)
+            self.assertEqual(
+                cache.get(assignment.cache_key(self.office.pk))["counts"], {self.officer.pk: 2, self.new_officer.pk: 0},
+            )
+
+    @override_settings(LENDING_ASSIGNMENT_STRATEGY="round_robin")
+    def test_round_robin_ignores_workload(self):
+        self.assertEqual([self.apply() for _ in range(3)], [self.officer, self.new_officer, self.officer])
+
+    def test_backlog_is_spread_over_the_office(self):
+        loans = [
+            Loan.objects.create(
+                member=self.profile, policy=self.policy, principal_amount=Decimal("5000"),
+                term_months=3, interest_rate=self.policy.interest_rate,
+            )
+            for _ in range(4)
+        ]
+        self.assertEqual(assign_unassigned_loans(), 4)
+
+        officers = Counter(Loan.objects.filter(pk__in=[loan.pk for loan in loans]).values_list("officer", flat=True))
+        self.assertEqual(officers, {self.new_officer.pk: 3, self.officer.pk: 1})
+        self.assertEqual(get_stats(officer_key(self.new_officer.pk)).loans_pending, 3)
+
+
+# -------------------------------
+# Receipt reconciliation
+# -------------------------------
+class ReconciliationTests(LoanBookTestCase):
+    def setUp(self):
+        # a second, newer loan: its first installment falls due after the old loan's arrears
+        self.new_loan = Loan.objects.create(
+            member=self.profile, officer=self.officer, policy=self.policy, principal_amount=Decimal("10000"),
+            term_months=6, interest_rate=self.policy.interest_rate, status="DISBURSED",
+            disbursed_at=timezone.now(),
+        )
+        generate_schedule(self.new_loan)
+        self.new_loan.refresh_from_db()  # the stored, rounded balance
+
+    def receipt(self, transaction_id, amount, phone="+254 712 000 000"):
+        return {"transaction_id": transaction_id, "payer_phone": phone, "amount": amount}
+
+    def test_receipts_pay_the_oldest_due_loan_first(self):
+        summary = reconcile_receipts([self.receipt("RC001", "1500")])
+        self.assertEqual((summary["repayments"], summary["suspense"]), (1, 0))
+        self.assertEqual(Repayment.objects.get(transaction_id="RC001").loan, self.loan)
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).balance, self.loan.balance - Decimal("1500"))
+
+        summary = reconcile_receipts([self.receipt("RC001", "1500")])
+        self.assertEqual((summary["repayments"], summary["duplicates"]), (0, 1))
+
+        reconcile_receipts([self.receipt("RC002", "1500")], rule="smallest_balance_first")
+        self.assertEqual(Repayment.objects.get(transaction_id="RC002").loan, self.new_loan)
+
+    def test_overpayment_is_spread_then_held_in_suspense(self):
+        repaid = get_stats(GLOBAL).total_repaid
+        total = self.loan.balance + self.new_loan.balance
+        reconcile_receipts([self.receipt("RC003", total + Decimal("250"))])
+
+        self.assertEqual(
+            dict(Repayment.objects.filter(transaction_id__startswith="RC003").values_list("transaction_id", "loan")),
+            {"RC003": self.loan.pk, "RC003#2": self.new_loan.pk},
+        )
+        self.assertEqual(set(Loan.objects.filter(pk__in=[self.loan.pk, self.new_loan.pk]).values_list("status", flat=True)), {"CLOSED"})
+        held = SuspenseReceipt.objects.get(transaction_id="RC003")
+        self.assertEqual((held.reason, held.amount), ("OVERPAYMENT", Decimal("250")))
+        self.assertEqual(get_stats(GLOBAL).total_repaid, repaid + total)
+
+    def test_receipts_that_are_not_positive_are_rejected(self):
+        summary = reconcile_receipts([self.receipt("RC020", "-100"), self.receipt("RC021", "0.001")])
+        self.assertEqual([row for row, _ in summary["errors"]], [1, 2])
+        self.assertFalse(Repayment.objects.filter(transaction_id__in=["RC020", "RC021"]).exists())
+        self.assertFalse(SuspenseReceipt.objects.filter(transaction_id__in=["RC020", "RC021"]).exists())
+
+    def test_unknown_and_shared_phones_go_to_suspense(self):
+        other = MemberProfile.objects.exclude(pk=self.profile.pk).filter(user__office=self.office).first()
+        Loan.objects.filter(member=other).update(status="DISBURSED", balance=Decimal("5000"))
+        MemberProfile.objects.filter(pk=other.pk).update(alternative_phone="0712000000", phone_number="0799000000")
+
+        reconcile_receipts([self.receipt("RC004", "100"), self.receipt("RC005", "100", phone="0700999999")])
+        self.assertEqual(Repayment.objects.get(transaction_id="RC004").loan, self.loan)  # own number wins
+        self.assertEqual(SuspenseReceipt.objects.get(transaction_id="RC005").reason, "UNMATCHED")
+
+        MemberProfile.objects.filter(pk=other.pk).update(phone_number="0712000000")
+        reconcile_receipts([self.receipt("RC006", "100")])
+        self.assertEqual(SuspenseReceipt.objects.get(transaction_id="RC006").reason, "AMBIGUOUS")
+
+    def test_payments_posted_after_the_index_was_loaded_are_not_overpaid(self):
+        index = LoanIndex.load()
+        ingest_repayments([{"loan_id": self.loan.pk, "transaction_id": "RC010", "amount": str(self.loan.balance - 1000)}])
+        amount = Decimal("1000") + self.new_loan.balance + Decimal("250")
+
+        reconcile_batch([Receipt("RC011", "0712000000", amount, timezone.now(), self.loan.pk)], index)
+        self.assertEqual(
+            dict(Repayment.objects.filter(transaction_id__startswith="RC011").values_list("transaction_id", "amount")),
+            {"RC011": Decimal("1000"), "RC011#2": self.new_loan.balance},
+        )
+        held = SuspenseReceipt.objects.get(transaction_id="RC011")
+        self.assertEqual((held.reason, held.amount), ("OVERPAYMENT", Decimal("250")))
+
+    def test_receipt_posted_meanwhile_is_not_posted_again(self):
+        balance = self.loan.balance
+        reconcile_receipts([self.receipt("RC012", "100")])
+        read = Repayment.objects.filter
+        reads = []
+
+        def stale_read(*args, **kwargs):
+            # the first read misses the receipt another worker posted
+            reads.append(kwargs)
+            return Repayment.objects.none() if len(reads) == 1 else read(*args, **kwargs)
+
+        with mock.patch.object(Repayment.objects, "filter", side_effect=stale_read):
+            summary = reconcile_receipts([self.receipt("RC012", "100")])
+
+        self.assertEqual((summary["repayments"], summary["duplicates"]), (0, 1))
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).balance, balance - Decimal("100"))
+
+    def test_queries_do_not_grow_with_receipts(self):
+        def count(prefix, n):
+            with CaptureQueriesContext(connection) as queries:
+                reconcile_receipts([self.receipt(f"{prefix}{i}", "10") for i in range(n)])
+            return len(queries)
+
+        # 100: the journal entries of more would take a second INSERT on SQLite (999 parameters)
+        self.assertEqual(count("RCA", 3), count("RCB", 100))
+
+
+# -------------------------------
+# Payment callbacks
+# -------------------------------
+@override_settings(LENDING_CALLBACK_SECRET="s3cret")
+class PaymentCallbackTests(LoanBookTestCase):
+    def callback(self, transaction_id, amount="1000", **fields):
+        body = json.dumps({"transaction_id": transaction_id, "payer_phone": "0712000000", "amount": amount, **fields})
+        return self.client.post(
+            reverse("payment_callback"), body, content_type="application/json",
+            HTTP_X_CALLBACK_SIGNATURE=sign(body.encode(), "s3cret"),
+        )
+
+    def test_callbacks_are_queued_not_posted(self):
+        with self.assertNumQueries(1):
+            response = self.callback("CB001")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(PaymentCallback.objects.get().status, "PENDING")
+        self.assertFalse(Repayment.objects.filter(transaction_id="CB001").exists())
+
+    def test_invalid_callbacks_are_refused(self):
+        self.assertEqual(self.callback("CB002", amount="-5").status_code, 400)
+        self.assertEqual(self.callback("CB002", loan_id="L-1").status_code, 400)
+        self.assertEqual(self.callback("CB002", paid_at="2024-02-30T09:00:00").status_code, 400)
+        response = self.client.post(
+            reverse("payment_callback"), "not json", content_type="application/json",
+            HTTP_X_CALLBACK_SIGNATURE=sign(b"not json", "s3cret"),
+        )
+        self.assertEqual(response.status_code, 400)
+
+        body = json.dumps({"transaction_id": "CB003", "payer_phone": "0712000000", "amount": "10"})
+        for signature in (None, sign(body.encode(), "other")):
+            response = self.client.post(
+                reverse("payment_callback"), body, content_type="application/json",
+                **({"HTTP_X_CALLBACK_SIGNATURE": signature} if signature else {}),
+            )
+            self.assertEqual(response.status_code, 403)
+        with override_settings(LENDING_CALLBACK_SECRET=""):  # no secret: nothing is accepted
+            self.assertEqual(self.callback("CB003").status_code, 403)
+        self.assertEqual(self.callback("CB003").status_code, 202)
+        self.assertEqual(PaymentCallback.objects.count(), 1)
+
+    def test_batches_load_only_the_loans_they_can_match(self):
+        other = Loan.objects.exclude(member=self.profile).first()
+        Loan.objects.filter(pk=other.pk).update(status="DISBURSED", balance=Decimal("5000"))
+        receipts = [Receipt("CB010", "0712000000", Decimal("10"), timezone.now())]
+        self.assertEqual(set(LoanIndex.load(receipts=receipts).balances), {self.loan.pk})
+        receipts.append(Receipt("CB011", "0799999999", Decimal("10"), timezone.now(), other.pk))
+        self.assertEqual(set(LoanIndex.load(receipts=receipts).balances), {self.loan.pk, other.pk})
+
+    def test_deploy_check_requires_a_callback_secret(self):
+        self.assertEqual(check_callback_secret(None), [])
+        with override_settings(LENDING_CALLBACK_SECRET=""):
+            self.assertEqual([e.id for e in check_callback_secret(None)], ["lending.E002"])
+
+    def test_drain_posts_each_payment_once(self):
+        self.callback("CB004")
+        self.callback("CB004")  # provider retry
+        self.callback("CB005", amount="500", payer_phone="0700000001", loan_id=self.loan.pk)
+        PaymentCallback.objects.create(transaction_id="CB006", payload={"transaction_id": "CB006"})
+
+        summary = drain_inbox(batch_size=2)
+        self.assertEqual(
+            {field: summary[field] for field in ("callbacks", "repayments", "duplicates", "failed")},
+            {"callbacks": 4, "repayments": 2, "duplicates": 1, "failed": 1},
+        )
+        self.assertEqual(Repayment.objects.get(transaction_id="CB005").loan, self.loan)
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).balance, self.loan.balance - Decimal("1500"))
+        self.assertEqual(PaymentCallback.objects.get(transaction_id="CB006").status, "FAILED")
+        self.assertFalse(PaymentCallback.objects.filter(status="PENDING").exists())
+
+        self.callback("CB004")
+        self.assertEqual((drain_inbox()["duplicates"], Repayment.objects.filter(transaction_id="CB004").count()), (1, 1))
+
+
+# -------------------------------
+# Report snapshots
+# -------------------------------
+class ReportSnapshotTests(LoanBookTestCase):
+    def test_fresh_snapshots_are_reused(self):
+        self.login_as("MANAGER")
+        url = reverse("manager_report_list") + "?group_by=officer"
+        first = self.client.get(url)
+        with self.assertNumQueries(6):
+            second = self.client.get(url)
+        self.assertEqual(first.context["report_log"], second.context["report_log"])
+        self.assertEqual(second.context["reports"]["total_loans"], 4)
+        self.assertEqual(second.context["rows"][0]["officer_id"], self.officer.pk)
+
+        refreshed = self.client.get(url + "&refresh=1").context["report_log"]
+        self.assertNotEqual(refreshed, first.context["report_log"])
+        with override_settings(LENDING_REPORT_MAX_AGE=0):
+            self.assertNotEqual(self.client.get(url).context["report_log"], refreshed)
+
+    def test_snapshots_reopen_from_one_row(self):
+        log = get_report("officer", self.officer.pk, {"group_by": "month"}, self.officer)
+        self.login_as("OFFICER")
+        response = self.client.get(reverse("officer_report_detail", args=[log.pk]))
+        self.assertEqual(response.context["reports"]["outstanding"], self.loan.balance)
+        self.assertIsInstance(response.context["rows"][0]["month"], datetime.datetime)
+        self.assertEqual(response.context["par"]["par_ratio"], Decimal("100"))
+
+        # other scopes' snapshots are not found
+        self.assertEqual(self.client.get(reverse("officer_report_detail", args=[self.office_report.pk])).status_code, 404)
+        self.login_as("MANAGER")
+        self.assertEqual(self.client.get(reverse("manager_report_detail", args=[log.pk])).status_code, 404)
+
+    @override_settings(LENDING_REPORT_RUNNER="worker")
+    def test_company_report_runs_in_the_background(self):
+        self.login_as("ADMIN")
+        log = self.client.get(reverse("report_list")).context["report_log"]
+        status_url = reverse("report_status", args=[log.pk])
+        self.assertEqual(self.client.get(status_url).json()["status"], "PENDING")
+
+        self.assertEqual(run_pending_reports(), 1)
+        self.assertEqual(self.client.get(status_url).json()["status"], "DONE")
+        response = self.client.get(reverse("report_list"))
+        self.assertEqual(response.context["report_log"], log)
+        self.assertEqual(
+            {row["officer__office__name"]: row["total_loans"] for row in response.context["rows"]},
+            {"Nairobi CBD": 4, "Kisumu": 1},
+        )
+
+    @override_settings(LENDING_REPORT_RUNNER="worker")
+    def test_reports_abandoned_while_running_are_run_again(self):
+        log = get_report("company", user=self.admin)
+        ReportLog.objects.filter(pk=log.pk).update(status="RUNNING", claimed_at=timezone.now())
+        self.assertEqual(run_pending_reports(), 0)  # its runner may still be at it
+
+        # the runner died an hour ago
+        ReportLog.objects.filter(pk=log.pk).update(claimed_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(run_pending_reports(), 1)
+        self.assertEqual(ReportLog.objects.get(pk=log.pk).status, "DONE")
+
+
+# -------------------------------
+# Daily rollups
+# -------------------------------
+class RollupTests(LoanBookTestCase):
+    def rollups(self):
+        return {
+            (row.key, row.day): (row.amount_repaid, row.repayments_count, row.principal_disbursed,
+                                 row.loans_disbursed, row.applications)
+            for row in DailyRollup.objects.all()
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = {slot: values for slot, values in self.rollups().items() if any(values)}
+        rebuild_rollups()
+        self.assertEqual(incremental, self.rollups())
+
+    def test_write_paths_match_a_rebuild(self):
+        approved = Loan.objects.get(status="APPROVED")
+        transition_loans([approved.pk], "disburse", self.officer.pk)
+        reconcile_receipts([{"transaction_id": "RB001", "payer_phone": "0712000001", "amount": "1500"}])
+        Repayment.objects.create(
+            loan=self.loan, transaction_id="RB002", payer_phone="0712000000", amount=Decimal("500"),
+            paid_at=timezone.now() - datetime.timedelta(days=40),
+        )
+        Repayment.objects.get(transaction_id="QK1A2B3C40").delete()
+        Loan.objects.filter(status="REJECTED").get().delete()
+        self.assertMatchesRebuild()
+
+        today = timezone.localdate()
+        self.assertEqual(
+            self.rollups()[(GLOBAL, today)],
+            (Decimal("5500"), 3, Decimal("20000"), 1, 4),
+        )
+        # member rows are monthly
+        days = DailyRollup.objects.filter(key=member_key(self.profile.pk)).values_list("day", flat=True)
+        self.assertEqual({day.day for day in days}, {1})
+
+    def test_queries_do_not_grow_with_rows(self):
+        scopes = {self.loan.pk: LoanScope(self.officer.pk, self.office.pk, self.policy.pk, self.profile.pk)}
+        before = DailyRollup.objects.filter(key=GLOBAL).aggregate(total=Sum("amount_repaid"))["total"]
+
+        def count(days):
+            repayments = [
+                Repayment(loan=self.loan, amount=Decimal("10"), paid_at=timezone.now() - datetime.timedelta(days=n))
+                for n in range(days)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                record_repayments(repayments, scopes)
+            return len(queries)
+
+        # 20 days: 80 daily rows and the member's monthly ones
+        self.assertEqual(count(3), count(20))
+        self.assertEqual(
+            DailyRollup.objects.filter(key=GLOBAL).aggregate(total=Sum("amount_repaid"))["total"], before + 230,
+        )
+
+    def test_trend_endpoints(self):
+        self.login_as("ADMIN")
+        series = self.client.get(reverse("admin_trend"), {"interval": "month", "officer": self.officer.pk}).json()["series"]
+        self.assertEqual(sum(Decimal(row["amount_repaid"]) for row in series), Decimal("6000"))
+        self.assertEqual(sum(row["applications"] for row in series), 4)
+        self.assertEqual(sum(Decimal(row["principal_disbursed"]) for row in series), Decimal("60000"))
+        self.assertEqual(self.client.get(reverse("admin_trend"), {"office": 1, "policy": 1}).status_code, 400)
+
+        self.login_as("MANAGER")
+        url = reverse("manager_trend")
+        self.assertEqual(self.client.get(url, {"officer": self.officer.pk}).json()["scope"], officer_key(self.officer.pk))
+        self.assertEqual(self.client.get(url, {"officer": self.other_officer.pk}).status_code, 404)
+        self.assertEqual(self.client.get(url, {"policy": self.policy.pk}).status_code, 400)
+
+        # the range bounds the rows read
+        self.login_as("OFFICER")
+        today = timezone.localdate()
+        response = self.client.get(reverse("officer_trend"), {"start_date": today, "end_date": today})
+        self.assertEqual([row["period"] for row in response.json()["series"]], [today.isoformat()])
+
+    def test_backfill_command(self):
+        DailyRollup.objects.all().delete()
+        out = io.StringIO()
+        call_command("backfill_rollups", "--chunk-months", "2", stdout=out)
+        self.assertIn("daily rollup rows", out.getvalue())
+        self.assertEqual(
+            DailyRollup.objects.filter(key=GLOBAL).aggregate(total=Sum("amount_repaid"))["total"], Decimal("6000"),
+        )
+
+
+# -------------------------------
+# Member summaries
+# -------------------------------
+class MemberSummaryTests(LoanBookTestCase):
+    def stored(self):
+        return {
+            row.pk: (row.loans_total, row.loans_pending, row.loans_disbursed, row.principal_total,
+                     row.outstanding_balance, row.total_repaid, row.active_loans, row.recent_repayments)
+            for row in MemberSummary.objects.all()
+        }
+
+    def test_write_paths_match_a_rebuild(self):
+        transition_loans([self.pending_loan.pk], "approve", self.officer.pk)
+        reconcile_receipts([{"transaction_id": "MS001", "payer_phone": "0712000000", "amount": "700"}])
+        Repayment.objects.get(transaction_id="QK1A2B3C40").delete()
+        Loan.objects.filter(status="REJECTED").get().delete()
+        incremental = self.stored()
+        rebuild_summaries()
+        self.assertEqual(incremental, self.stored())
+
+        summary = MemberSummary.objects.get(pk=self.profile.pk)
+        self.loan.refresh_from_db()
+        # the maintained balance, interest included
+        self.assertEqual(summary.outstanding_balance, self.loan.balance)
+        self.assertEqual((summary.loans_pending, summary.loans_approved, summary.total_repaid), (0, 1, Decimal("4700")))
+        self.assertEqual(summary.recent_repayments[0]["id"], Repayment.objects.get(transaction_id="MS001").pk)
+
+    def test_dashboard_is_served_from_the_cache(self):
+        self.login_as("MEMBER")
+        url = reverse("member_dashboard")
+        self.client.get(url)
+        with self.assertNumQueries(2):  # session and user
+            response = self.client.get(url)
+        self.assertEqual(response.context["total_repaid"], Decimal("6000"))
+        self.assertEqual(response.context["outstanding_balance"], self.loan.balance)
+
+        Repayment.objects.create(loan=self.loan, transaction_id="MS002", payer_phone="0712000000", amount=Decimal("1000"))
+        response = self.client.get(url)
+        self.assertEqual(response.context["total_repaid"], Decimal("7000"))
+        self.assertEqual(response.context["recent_repayments"][0]["amount"], Decimal("1000"))
+        self.assertEqual(response.context["repayment_trend"][-1]["amount_repaid"], Decimal("7000"))
+
+    async def test_async_dashboard_reads_the_same_summary(self):
+        summary, monthly = await sync_to_async(get_summary)(self.profile.pk)
+        await cache.aclear()
+
+        asummary, amonthly = await aget_summary(self.profile.pk)
+        self.assertEqual(amonthly, monthly)
+        self.assertEqual(
+            (asummary.outstanding_balance, asummary.recent_repayments),
+            (summary.outstanding_balance, summary.recent_repayments),
+        )
+        self.assertIsNotNone(await cache.aget(member_summary.cache_key(self.profile.pk)))
+
+    def test_deleting_a_member_takes_their_summary(self):
+        get_summary(self.profile.pk)
+        self.member.delete()
+        self.assertFalse(MemberSummary.objects.filter(pk=self.profile.pk).exists())
+
+
+# -------------------------------
+# Ledger
+# -------------------------------
+class LedgerTests(LoanBookTestCase):
+    def booked(self):
+        return dict(Loan.objects.filter(status__in=ledger.BOOKED_STATUSES).values_list("pk", "balance"))
+
+    def test_write_paths_keep_the_loan_balance(self):
+        opening = self.loan.balance
+        approved = Loan.objects.get(status="APPROVED")
+        transition_loans([approved.pk], "disburse", self.officer.pk)
+        reconcile_receipts([{"transaction_id": "LG001", "payer_phone": "0712000001", "amount": "1500"}])
+        Repayment.objects.create(loan=self.loan, transaction_id="LG002", payer_phone="0712000000", amount=Decimal("500"))
+        self.assertEqual(ledger.balances(self.booked()), self.booked())
+
+        # a deleted repayment is reversed, not erased
+        Repayment.objects.get(transaction_id="LG002").delete()
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).balance, opening)
+        reversal = JournalEntry.objects.get(kind="REVERSAL")
+        self.assertEqual((reversal.debit, reversal.credit, reversal.amount), (ledger.RECEIVABLE, "CASH", Decimal("500")))
+        self.assertEqual(ledger.balance(self.loan.pk), opening)
+        with self.assertRaises(ValueError):
+            reversal.save()
+
+        # replaying the stored repayments gives the same journal balances
+        JournalEntry.objects.all().delete()
+        call_command("backfill_ledger", stdout=io.StringIO())
+        self.assertEqual(ledger.balances(self.booked()), self.booked())
+
+
+    def test_a_deleted_repayment_is_taken_back_off_the_schedule(self):
+        age_portfolio()
+        statuses = lambda: list(Installment.objects.filter(loan=self.loan).values_list("status", flat=True)[:4])
+        before = LoanAging.objects.get(loan=self.loan)
+        self.assertEqual((statuses(), before.bucket), (["PARTIAL", "DUE", "DUE", "DUE"], "PAR61_90"))
+
+        Repayment.objects.create(loan=self.loan, transaction_id="LG010", payer_phone="0712000000", amount=Decimal("20000"))
+        self.assertEqual(statuses(), ["PAID", "PAID", "PARTIAL", "DUE"])
+        self.assertEqual(LoanAging.objects.get(loan=self.loan).bucket, "PAR1_30")
+
+        Repayment.objects.get(transaction_id="LG010").delete()
+        self.assertEqual(statuses(), ["PARTIAL", "DUE", "DUE", "DUE"])
+        self.assertEqual(Installment.objects.get(loan=self.loan, number=1).amount_paid, Decimal("6000"))
+        after = LoanAging.objects.get(loan=self.loan)
+        self.assertEqual((after.bucket, after.amount_overdue), (before.bucket, before.amount_overdue))
+
+    def test_balance_as_of_reads_a_checkpoint_and_the_entries_since(self):
+        opening, before = self.loan.balance, timezone.now()
+        Repayment.objects.create(loan=self.loan, transaction_id="LG003", payer_phone="0712000000", amount=Decimal("600"))
+        call_command("checkpoint_ledger", stdout=io.StringIO())
+        Repayment.objects.create(loan=self.loan, transaction_id="LG004", payer_phone="0712000000", amount=Decimal("400"))
+
+        with self.assertNumQueries(2):
+            self.assertEqual(ledger.balance(self.loan.pk), opening - Decimal("1000"))
+        self.assertEqual(ledger.balance(self.loan.pk, before), opening)
+        self.assertEqual(ledger.balance(self.loan.pk, self.loan.disbursed_at), self.loan.total_payable)
+
+        # a backdated repayment drops the checkpoints it lands before
+        Repayment.objects.create(
+            loan=self.loan, transaction_id="LG005", payer_phone="0712000000", amount=Decimal("100"), paid_at=before,
+        )
+        self.assertFalse(LedgerCheckpoint.objects.filter(loan=self.loan).exists())
+        self.assertEqual(ledger.balance(self.loan.pk), opening - Decimal("1100"))
+
+        self.login_as("MANAGER")
+        url = reverse("manager_loan_detail", kwargs={"loan_id": self.loan.pk})
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        self.assertEqual(self.client.get(url, {"as_of": yesterday}).context["balance"], self.loan.total_payable)
+
+    def test_loans_with_and_without_checkpoints_read_together(self):
+        call_command("checkpoint_ledger", stdout=io.StringIO())
+        approved = Loan.objects.get(status="APPROVED")
+        transition_loans([approved.pk], "disburse", self.officer.pk)  # booked after the checkpoints
+        Repayment.objects.create(loan=self.loan, transaction_id="LG006", payer_phone="0712000000", amount=Decimal("300"))
+
+        with self.assertNumQueries(2):
+            positions = ledger._positions([self.loan.pk, approved.pk], timezone.now())
+        # the checkpointed loan reads only the repayment since its checkpoint, the other its disbursement
+        self.assertEqual({pk: count for pk, (_, count) in positions.items()}, {self.loan.pk: 1, approved.pk: 2})
+        self.assertEqual(ledger.balances(self.booked()), self.booked())
+
+    def test_write_off_closes_the_loan(self):
+        self.assertEqual(ledger.write_off_loans([self.loan.pk, self.pending_loan.pk]), {self.loan.pk: self.loan.balance})
+        self.loan.refresh_from_db()
+        self.assertEqual((self.loan.status, self.loan.balance), ("CLOSED", Decimal("0")))
+        self.assertEqual(ledger.balance(self.loan.pk), Decimal("0"))
+        self.assertEqual(get_stats(officer_key(self.officer.pk)).outstanding_balance, Decimal("0"))
+        self.assertEqual(ledger.write_off_loans([self.pending_loan.pk]), {})
+
+
+# -------------------------------
+# Balance verification
+# -------------------------------
+class BalanceCheckTests(LoanBookTestCase):
+    def test_finds_and_repairs_balances_that_drifted(self):
+        expected = self.loan.balance
+        Loan.objects.filter(pk=self.loan.pk).update(balance=Decimal("1"))
+        Loan.objects.filter(pk=self.pending_loan.pk).update(balance=None)
+
+        run = verify_balances(chunk_size=2)
+        self.assertEqual((run.status, run.loans_checked, run.discrepancies), ("DONE", 5, 2))
+        found = BalanceDiscrepancy.objects.get(run=run, loan_id=self.loan.pk)
+        self.assertEqual((found.recorded, found.expected, found.repaid), (Decimal("1"), expected, Decimal("6000")))
+
+        out = io.StringIO()
+        call_command("verify_balances", "--workers", "1", "--repair", stdout=out)
+        self.assertIn("2 discrepancies, 2 repaired", out.getvalue())
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).balance, expected)
+        self.assertEqual(Loan.objects.get(pk=self.pending_loan.pk).balance, self.pending_loan.total_payable)
+        self.assertEqual(get_stats(officer_key(self.officer.pk)).outstanding_balance, expected)
+        self.assertEqual(verify_balances().discrepancies, 0)
+
+    def test_write_offs_and_paid_off_loans_are_not_discrepancies(self):
+        ledger.write_off_loans([self.loan.pk])
+        self.loan.refresh_from_db()
+        self.loan.save()  # a zero balance used to be reset to total_payable here
+        self.assertEqual(Loan.objects.get(pk=self.loan.pk).balance, Decimal("0"))
+        self.assertEqual(verify_balances().discrepancies, 0)
+
+
+# -------------------------------
+# Late charges
+# -------------------------------
+class AccrualTests(LoanBookTestCase):
+    def setUp(self):
+        super().setUp()
+        LoanPolicy.objects.filter(pk=self.policy.pk).update(
+            penalty_rate=Decimal("36.5"), penalty_grace_days=5, default_interest_rate=Decimal("18.25"),
+        )
+
+    def test_charges_loans_in_arrears_once_a_day(self):
+        aging = LoanAging.objects.get(loan=self.loan)
+        balance = self.loan.balance
+        # one day: 0.1% of the amount overdue and 0.05% of the balance
+        penalty = (aging.amount_overdue / 1000).quantize(Decimal("0.01"))
+        interest = (balance / 2000).quantize(Decimal("0.01"))
+
+        out = io.StringIO()
+        call_command("accrue_charges", stdout=out)
+        self.assertIn("Charged 1 loans", out.getvalue())
+        self.loan.refresh_from_db()
+        self.assertEqual(self.loan.balance, balance + penalty + interest)
+        self.assertEqual(self.loan.accrued_through, timezone.localdate())
+        self.assertEqual(JournalEntry.objects.get(kind="PENALTY").amount, penalty)
+        self.assertEqual(ledger.balance(self.loan.pk), self.loan.balance)
+        self.assertEqual(get_stats(officer_key(self.officer.pk)).outstanding_balance, self.loan.balance)
+        self.assertEqual(LoanAging.objects.get(loan=self.loan).outstanding, self.loan.balance)
+        self.assertEqual(verify_balances().discrepancies, 0)
+
+        # the same day again: nothing; three days on: three days' worth
+        self.assertEqual(accrual.accrue_charges()["loans"], 0)
+        summary = accrual.accrue_charges(as_of=timezone.localdate() + datetime.timedelta(days=3))
+        self.assertEqual(summary["penalties"], (aging.amount_overdue * 3 / 1000).quantize(Decimal("0.01")))
+
+    def test_loans_within_the_grace_period_are_not_charged(self):
+        LoanPolicy.objects.filter(pk=self.policy.pk).update(penalty_grace_days=1000)
+        self.assertEqual(accrual.accrue_charges()["loans"], 0)
+
+    def test_charges_round_half_up_to_the_cent_exactly(self):
+        # 4128.15 at 50% for 23 days is 130.065 exactly (floats made it 130.06);
+        # the largest amount and rate the columns hold must not overflow
+        columns = (
+            [23, 30], [23, 30], [0, 0], [Decimal("4128.15"), Decimal("9999999999.99")],
+            [Decimal("0"), Decimal("9999999999.99")], [Decimal("50"), Decimal("999.99")], [Decimal("0"), Decimal("999.99")],
+        )
+        largest = int((Decimal("9999999999.99") * Decimal("999.99") * 30 / 36500).quantize(Decimal("0.01")) * 100)
+        expected = ([13007, largest], [0, largest])
+        self.assertEqual(accrual.compute_charges(*columns, vectorized=False), expected)
+        if accrual.np is not None:
+            self.assertEqual(accrual.compute_charges(*columns), expected)
+
+    @skipUnless(accrual.np, "NumPy is not installed")
+    def test_vectorized_and_plain_charges_agree(self):
+        columns = (
+            [1, 3, 1, 40], [10, 40, 2, 400], [5, 0, 5, 30],
+            [Decimal("25800.55"), Decimal("0.05"), Decimal("100"), Decimal("99999999.99")],
+            [Decimal("57600"), Decimal("10"), Decimal("100"), Decimal("123456.78")],
+            [Decimal("36.5"), Decimal("12"), Decimal("0"), Decimal("99.99")],
+            [Decimal("18.25"), Decimal("0"), Decimal("5"), Decimal("0.01")],
+        )
+        self.assertEqual(
+            accrual.compute_charges(*columns), accrual.compute_charges(*columns, vectorized=False),
+        )
+
+    @skipUnless(accrual.np, "NumPy is not installed")
+    def test_vectorized_and_plain_accruals_agree(self):
+        as_of = timezone.localdate() + datetime.timedelta(days=30)
+
+        def accrue(numpy):
+            savepoint = transaction.savepoint()
+            with mock.patch.object(accrual, "np", numpy):
+                summary = accrual.accrue_charges(as_of=as_of)
+                balance = Loan.objects.get(pk=self.loan.pk).balance
+            transaction.savepoint_rollback(savepoint)
+            return summary, balance
+
+        vectorized = accrue(accrual.np)
+        self.assertEqual(vectorized[0]["loans"], 1)
+        self.assertEqual(vectorized, accrue(None))
+
+
+# -------------------------------
+# Benchmarks
+# -------------------------------
+BENCHMARK_DIR = settings.BASE_DIR / "benchmarks"
+BENCHMARK_OUTPUT = Path(os.environ.get("LENDING_BENCHMARK_OUTPUT", BENCHMARK_DIR / "views.json"))
+DASHBOARD_BENCHMARK_OUTPUT = Path(os.environ.get("LENDING_DASHBOARD_BENCHMARK_OUTPUT", BENCHMARK_DIR / "dashboards.json"))
+DASHBOARD_ROUTES = [(name, role) for name, role, _ in ROUTES if name.endswith("_dashboard")]
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))]
+
+
+def seed_benchmark_book(target):
+    """Seed a loan book sized by LENDING_BENCHMARK_SCALE and set ROUTES' attributes on `target`."""
+    target.scale = int(os.environ.get("LENDING_BENCHMARK_SCALE", "500"))
+    target.repeat = int(os.environ.get("LENDING_BENCHMARK_REPEAT", "10"))
+    seed_loan_book(
+        offices=3, officers_per_office=3, members=target.scale,
+        loans=target.scale * 5 // 2, repayments=target.scale * 15, seed=1,
+    )
+
+    target.loan = Loan.objects.filter(status="DISBURSED").select_related("officer__office", "member__user").order_by("id").first()
+    target.officer = target.loan.officer
+    target.office = target.officer.office
+    target.company = target.office.company
+    target.manager = User.objects.filter(role="MANAGER", office=target.office).first()
+    target.profile = target.loan.member
+    target.member = target.profile.user
+    target.pending_loan = Loan.objects.create(
+        member=target.profile, officer=target.officer, policy=target.loan.policy, principal_amount=Decimal("5000"),
+        term_months=3, interest_rate=target.loan.interest_rate,
+    )
+    target.admin = User.objects.create_user("bench-admin", "bench-admin@seed.test", "pw", role="ADMIN")
+    target.users = {
+        "ADMIN": target.admin, "MANAGER": target.manager,
+        "OFFICER": target.officer, "MEMBER": target.member,
+    }
+
+
+def latency_summary(timings):
+    return {
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "max_ms": round(max(timings), 2),
+    }
+
+
+@skipUnless(os.environ.get("LENDING_BENCHMARK"), "set LENDING_BENCHMARK=1 to run the view benchmarks")
+class ViewBenchmarkTests(RouteClientMixin, TestCase):
+    """
+    Time every page against a seeded loan book and write latency percentiles
+    and query counts to a JSON baseline (LENDING_BENCHMARK_OUTPUT, by default
+    benchmarks/views.json). Keep the file in git: a slower page or an extra
+    query then shows up as a diff. LENDING_BENCHMARK_SCALE sets the number of
+    members (loans and repayments grow with it), LENDING_BENCHMARK_REPEAT the
+    requests per page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_benchmark_book(cls)
+
+    def test_benchmark_views(self):
+        results = {}
+        for name, role, url in self.all_routes():
+            self.login_as(role)
+            timings, query_counts = [], []
+            for _ in range(self.repeat):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = self.fetch(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                query_counts.append(len(queries))
+                self.assertLess(response.status_code, 400, url)
+
+            results[f"{role or 'ANON'} {url}"] = {
+                "view": name,
+                "queries": max(query_counts),
+                **latency_summary(timings),
+            }
+
+        BENCHMARK_OUTPUT.parent.mkdir(parents=True, exist_ok=True)
+        BENCHMARK_OUTPUT.write_text(json.dumps({
+            "database": connection.vendor,
+            "scale": {"members": self.scale, "loans": Loan.objects.count(), "repayments": Repayment.objects.count()},
+            "repeat": self.repeat,
+            "views": results,
+        }, indent=2, sort_keys=True) + "\n")
+
+
+@skipUnless(os.environ.get("LENDING_BENCHMARK"), "set LENDING_BENCHMARK=1 to run the view benchmarks")
+class DashboardBenchmarkTests(RouteClientMixin, TransactionTestCase):
+    """
+    Time the async dashboards on the sync path (the WSGI test client, which
+    runs each view in an event loop of its own, with LENDING_CONCURRENT_QUERIES
+    off) against the async one (the ASGI handler, independent reads on
+    connections of their own) and write both to benchmarks/dashboards.json.
+    The cache is cleared before every request so the member dashboard's
+    reads are timed rather than a cache hit. Committed rows are needed for
+    the worker connections to see the data, hence a TransactionTestCase.
+    """
+
+    def setUp(self):
+        seed_benchmark_book(self)
+
+    def time_requests(self, get, url):
+        timings = []
+        for _ in range(self.repeat):
+            cache.clear()
+            started = time.perf_counter()
+            response = get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            self.assertEqual(response.status_code, 200, url)
+        return timings
+
+    def test_benchmark_dashboards(self):
+        results = {}
+        for name, role in DASHBOARD_ROUTES:
+            url = reverse(name)
+            self.login_as(role)
+            self.async_client.force_login(self.users[role])
+            with override_settings(LENDING_CONCURRENT_QUERIES=False):
+                sync = self.time_requests(self.client.get, url)
+            asynchronous = self.time_requests(async_to_sync(self.async_client.get), url)
+            results[f"{role} {url}"] = {
+                "view": name,
+                "sync": latency_summary(sync),
+                "async": latency_summary(asynchronous),
+            }
+
+        DASHBOARD_BENCHMARK_OUTPUT.parent.mkdir(parents=True, exist_ok=True)
+        DASHBOARD_BENCHMARK_OUTPUT.write_text(json.dumps({
+            "database": connection.vendor,
+            "scale": {"members": self.scale, "loans": Loan.objects.count(), "repayments": Repayment.objects.count()},
+            "repeat": self.repeat,
+            "dashboards": results,
+        }, indent=2, sort_keys=True) + "\n")
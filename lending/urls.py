@@ -3,6 +3,7 @@ from django.urls import path
 from .views import admin as admin_views
 from .views import manager as manager_views
 from .views import auth, member, admin as admin_views, manager as manager_views, officer as officer_views
+from .views import payments, trends
 
 
 
@@ -15,6 +16,9 @@ urlpatterns = [
     path("logout/", auth.CustomLogoutView.as_view(), name="logout"),
     path("register/", auth.member_register, name="member_register"),
 
+    # Payment provider callbacks
+    path("payments/callback/", payments.payment_callback, name="payment_callback"),
+
     # Dashboards
     path("dashboard/admin/", admin_views.admin_dashboard, name="admin_dashboard"),
     path("dashboard/member/", member.member_dashboard, name="member_dashboard"),
@@ -28,9 +32,12 @@ urlpatterns = [
     # -------------------------------
     path("officer/members/", officer_views.member_list, name="officer_member_list"),
     path("officer/loans/", officer_views.loan_list, name="officer_loan_list"),
+    path("officer/loans/batch/", officer_views.loan_batch_action, name="officer_loan_batch"),
     path("officer/loans/<int:loan_id>/", officer_views.loan_detail, name="officer_loan_detail"),
     path("officer/repayments/", officer_views.repayment_list, name="officer_repayment_list"),
     path("officer/reports/", officer_views.report_list, name="officer_report_list"),
+    path("officer/reports/<int:report_id>/", officer_views.report_detail, name="officer_report_detail"),
+    path("officer/trends/", trends.officer_trend, name="officer_trend"),
 
 
     # Admin Features - Companies
@@ -51,7 +58,12 @@ urlpatterns = [
 
     # Admin Features - Reports
     path("dashboard/admin/reports/", admin_views.report_list, name="report_list"),
+    path("dashboard/admin/reports/<int:report_id>/", admin_views.report_detail, name="report_detail"),
+    path("dashboard/admin/reports/<int:report_id>/status/", admin_views.report_status, name="report_status"),
+    path("dashboard/admin/trends/", trends.admin_trend, name="admin_trend"),
     path("dashboard/admin/reports/export-members-csv/", admin_views.export_members_csv, name="export_members_csv"),
+    path("dashboard/admin/reports/export-loans-csv/", admin_views.export_loans_csv, name="export_loans_csv"),
+    path("dashboard/admin/reports/export-repayments-csv/", admin_views.export_repayments_csv, name="export_repayments_csv"),
 
     # Admin Features - Users
     path("dashboard/admin/users/", admin_views.user_list, name="user_list"),
@@ -63,6 +75,7 @@ urlpatterns = [
     # Admin Features - Members
     path("dashboard/admin/members/", admin_views.member_list, name="member_list"),
     path("dashboard/admin/members/create/", admin_views.member_create, name="member_create"),
+    path("dashboard/admin/members/import/", admin_views.member_import, name="member_import"),
     path("dashboard/admin/members/<int:member_id>/edit/", admin_views.member_edit, name="member_edit"),
     path("dashboard/admin/members/<int:member_id>/suspend/", admin_views.member_suspend, name="member_suspend"),
 
@@ -70,7 +83,7 @@ urlpatterns = [
     path("member/profile/", member.member_profile, name="member_profile"),
     path("member/loan/apply/", member.loan_apply, name="loan_apply"),
     path("member/loans/", member.loan_list, name="loan_list"),
-    path("member/loans/<int:loan_id>/", member.loan_detail, name="loan_detail"),
+    path("member/loans/<int:pk>/", member.loan_detail, name="loan_detail"),
     path("member/repayments/", member.repayment_history, name="repayment_history"),
     path('member/loans/<int:pk>/edit/', member.loan_edit, name='loan_edit'),   # <-- make sure this exists
     path('member/loans/<int:pk>/delete/', member.loan_delete, name='loan_delete'),
@@ -82,5 +95,9 @@ urlpatterns = [
     path("manager/loans/<int:loan_id>/", manager_views.loan_detail, name="manager_loan_detail"),
     path("manager/repayments/", manager_views.repayment_list, name="manager_repayment_list"),
     path("manager/reports/", manager_views.report_list, name="manager_report_list"),
+    path("manager/reports/<int:report_id>/", manager_views.report_detail, name="manager_report_detail"),
+    path("manager/trends/", trends.manager_trend, name="manager_trend"),
     path("manager/export/members/", manager_views.export_members_csv, name="manager_export_members_csv"),
+    path("manager/export/loans/", manager_views.export_loans_csv, name="manager_export_loans_csv"),
+    path("manager/export/repayments/", manager_views.export_repayments_csv, name="manager_export_repayments_csv"),
 ]
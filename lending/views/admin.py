@@ -1,31 +1,43 @@
 # lending/views/admin.py
 
-import csv
 import datetime
 
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
+from django.http import JsonResponse
+from django.urls import reverse
 
 from ..decorators import admin_required
+from ..pagination import keyset_paginate, offset_paginate
 from ..forms import ( CompanyForm,OfficeForm, AdminUserForm,AdminAssignOfficersForm,LoanPolicyForm,
 )
 from ..models import (Company,Office,User,Loan,MemberProfile,ManagerOfficerAssignment,LoanPolicy,ReportLog,
+    Repayment,
 )
+from ..services import exports
+from ..services.member_import import import_members, read_rows
+from ..services.report_snapshots import get_report, report_context
+from ..services.search import search_members
+from ..services.stats import GLOBAL, aget_stats
+
+IMPORT_ERRORS_SHOWN = 100
+REPORT_LOG_SHOWN = 50
 
 
 @login_required
 @admin_required
-def admin_dashboard(request):
+async def admin_dashboard(request):
+    row = await aget_stats(GLOBAL)
     stats = {
-        "companies": Company.objects.count(),
-        "offices": Office.objects.count(),
-        "users": User.objects.count(),
-        "loans": Loan.objects.count(),
+        "companies": row.companies_count,
+        "offices": row.offices_count,
+        "users": row.users_count,
+        "loans": row.loans_total,
     }
-    return render(request, "admin/dashboard.html", {"stats": stats})
+    return await sync_to_async(render)(request, "admin/dashboard.html", {"stats": stats})
 
 @login_required
 @admin_required
@@ -144,8 +156,32 @@ def policy_create(request):
 @login_required
 @admin_required
 def report_list(request):
-    reports = ReportLog.objects.select_related("generated_by").order_by("-created_at")
-    return render(request, "admin/report_list.html", {"reports": reports})
+    # company-wide: computed in the background, the page polls report_status
+    log = get_report("company", filters={"group_by": "office"}, user=request.user, refresh="refresh" in request.GET)
+    reports = ReportLog.objects.defer("payload", "params").select_related("generated_by").order_by("-created_at")
+    return render(request, "admin/report_list.html", {
+        **report_context(log),
+        "status_url": reverse("report_status", args=[log.pk]),
+        "report_logs": reports[:REPORT_LOG_SHOWN],
+    })
+
+
+@login_required
+@admin_required
+def report_detail(request, report_id):
+    log = get_object_or_404(ReportLog.objects.select_related("generated_by"), pk=report_id)
+    return render(request, "admin/report_detail.html", report_context(log))
+
+
+@login_required
+@admin_required
+def report_status(request, report_id):
+    log = get_object_or_404(ReportLog.objects.only("status", "error"), pk=report_id)
+    return JsonResponse({
+        "status": log.status,
+        "error": log.error,
+        "url": reverse("report_detail", args=[log.pk]),
+    })
 
 
 
@@ -204,9 +240,11 @@ def user_list(request):
             Q(username__icontains=search)
         )
 
+    page = keyset_paginate(request, users, ("-date_joined", "-id"))
     roles = User.ROLE_CHOICES
     return render(request, "admin/user_list.html", {
-        "users": users,
+        "users": page.object_list,
+        "page": page,
         "roles": roles,
         "selected_role": role,
         "search_query": search,
@@ -263,11 +301,7 @@ def member_create(request):
     if request.method == "POST":
         form = MemberRegistrationForm(request.POST)
         if form.is_valid():
-            member_profile = form.save(commit=False)
-            # Ensure the related user is active by default
-            member_profile.user.is_active = True
-            member_profile.user.save()
-            member_profile.save()
+            form.save()  # the user (active by default) and their profile
             messages.success(request, "✅ Member created successfully.")
             return redirect("member_list")
     else:
@@ -276,6 +310,41 @@ def member_create(request):
     return render(request, "admin/member_form.html", {"form": form, "title": "Create Member"})
 
 
+# -------------------------------
+# Bulk Member Import
+# -------------------------------
+@login_required
+@admin_required
+def member_import(request):
+    from ..forms import MemberImportForm
+
+    result = None
+    if request.method == "POST":
+        form = MemberImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            try:
+                result = import_members(
+                    read_rows(upload.file, upload.name), office=form.cleaned_data["office"],
+                )
+            except (ValueError, UnicodeDecodeError) as exc:
+                messages.error(request, f"Could not read {upload.name}: {exc}")
+            else:
+                messages.success(
+                    request, f"✅ Imported {result['created']} members, skipped {result['skipped']} rows."
+                )
+                if not result["errors"]:
+                    return redirect("member_list")
+    else:
+        form = MemberImportForm()
+
+    return render(request, "admin/member_import.html", {
+        "form": form,
+        "errors": result["errors"][:IMPORT_ERRORS_SHOWN] if result else [],
+        "more_errors": max(len(result["errors"]) - IMPORT_ERRORS_SHOWN, 0) if result else 0,
+    })
+
+
 # -------------------------------
 # Edit Member
 # -------------------------------
@@ -326,39 +395,48 @@ def member_list(request):
     members = MemberProfile.objects.select_related("user").all()
 
     if search:
-        members = members.filter(
-            Q(user__first_name__icontains=search) |
-            Q(user__last_name__icontains=search) |
-            Q(user__email__icontains=search) |
-            Q(national_id__icontains=search)
+        # ranked matches from the search index, best first, paged by number
+        page = offset_paginate(
+            request, lambda offset, limit: search_members(members, search, limit=limit, offset=offset),
         )
+    else:
+        page = keyset_paginate(request, members, ("-id",))
 
     return render(request, "admin/member_list.html", {
-        "members": members,
+        "members": page.object_list,
+        "page": page,
         "search_query": search,
     })
 
 
 # -------------------------------
-# Export Members to CSV
+# CSV Exports (streamed)
 # -------------------------------
 @login_required
 @admin_required
 def export_members_csv(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="members_{datetime.date.today()}.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow(['ID', 'Name', 'Email', 'Phone', 'National ID', 'Active'])
-
-    for member in MemberProfile.objects.select_related("user").all():
-        writer.writerow([
-            member.id,
-            f"{member.user.first_name} {member.user.last_name}",
-            member.user.email,
-            member.phone_number,
-            member.national_id,
-            "Yes" if member.user.is_active else "No"  # Correctly reflects active status
-        ])
-
-    return response
+    return exports.stream_csv(
+        f"members_{datetime.date.today()}.csv",
+        exports.ADMIN_MEMBER_HEADER,
+        exports.member_rows(MemberProfile.objects.all(), active=True),
+    )
+
+
+@login_required
+@admin_required
+def export_loans_csv(request):
+    return exports.stream_csv(
+        f"loans_{datetime.date.today()}.csv",
+        exports.LOAN_HEADER,
+        exports.loan_rows(Loan.objects.all()),
+    )
+
+
+@login_required
+@admin_required
+def export_repayments_csv(request):
+    return exports.stream_csv(
+        f"repayments_{datetime.date.today()}.csv",
+        exports.REPAYMENT_HEADER,
+        exports.repayment_rows(Repayment.objects.all()),
+    )
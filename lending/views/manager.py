@@ -1,18 +1,23 @@
 # lending/views/manager.py
 
 import datetime
-import csv
 
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Sum, Count
 
 from ..decorators import manager_required
+from ..forms import BalanceAsOfForm, ManagerReportForm
+from ..pagination import keyset_paginate, offset_paginate
 from ..models import (
-    User, Loan, MemberProfile, Repayment, ManagerOfficerAssignment, ReportLog
+    User, Loan, MemberProfile, Repayment, ReportLog
 )
+from ..services import exports
+from ..services.ledger import loan_balance
+from ..services.report_snapshots import get_report, recent_reports, report_context
+from ..services.search import search_members
+from ..services.stats import aget_stats, office_key
 
 
 # -------------------------------
@@ -20,25 +25,19 @@ from ..models import (
 # -------------------------------
 @login_required
 @manager_required
-def manager_dashboard(request):
+async def manager_dashboard(request):
     # Manager should only see stats for their own office
-    office = request.user.office
-    officers = User.objects.filter(role="OFFICER", office=office)
-    officer_ids = officers.values_list("id", flat=True)
-
-    loans = Loan.objects.filter(officer_id__in=officer_ids)
-    repayments = Repayment.objects.filter(loan__officer_id__in=officer_ids)
-
+    row = await aget_stats(office_key(request.principal.office_id))
     stats = {
-        "officers_count": officers.count(),
-        "members_count": MemberProfile.objects.filter(user__office=office).count(),
-        "loans_total": loans.count(),
-        "loans_pending": loans.filter(status="PENDING").count(),
-        "loans_disbursed": loans.filter(status="DISBURSED").count(),
-        "repayments_total": repayments.aggregate(total=Sum("amount"))["total"] or 0,
+        "officers_count": row.officers_count,
+        "members_count": row.members_count,
+        "loans_total": row.loans_total,
+        "loans_pending": row.loans_pending,
+        "loans_disbursed": row.loans_disbursed,
+        "repayments_total": row.total_repaid,
     }
 
-    return render(request, "manager/dashboard.html", {"stats": stats})
+    return await sync_to_async(render)(request, "manager/dashboard.html", {"stats": stats})
 
 
 # -------------------------------
@@ -48,7 +47,7 @@ def manager_dashboard(request):
 @manager_required
 def officer_list(request):
     office = request.user.office
-    officers = User.objects.filter(role="OFFICER", office=office)
+    officers = User.objects.filter(role="OFFICER", office_id=request.principal.office_id)
 
     return render(request, "manager/officer_list.html", {
         "officers": officers,
@@ -62,21 +61,22 @@ def officer_list(request):
 @login_required
 @manager_required
 def member_list(request):
-    office = request.user.office
+    office_id = request.principal.office_id
     search = request.GET.get("q")
 
-    members = MemberProfile.objects.filter(user__office=office).select_related("user")
+    members = MemberProfile.objects.filter(user__office_id=office_id).select_related("user")
 
     if search:
-        members = members.filter(
-            Q(user__first_name__icontains=search) |
-            Q(user__last_name__icontains=search) |
-            Q(user__email__icontains=search) |
-            Q(national_id__icontains=search)
+        # ranked matches from the search index, best first, paged by number
+        page = offset_paginate(
+            request, lambda offset, limit: search_members(members, search, office_id=office_id, limit=limit, offset=offset),
         )
+    else:
+        page = keyset_paginate(request, members, ("-id",))
 
     return render(request, "manager/member_list.html", {
-        "members": members,
+        "members": page.object_list,
+        "page": page,
         "search_query": search,
     })
 
@@ -87,15 +87,17 @@ def member_list(request):
 @login_required
 @manager_required
 def loan_list(request):
-    office = request.user.office
-    loans = Loan.objects.filter(officer__office=office).select_related("member", "officer")
+    office_id = request.principal.office_id
+    loans = Loan.objects.filter(officer__office_id=office_id).select_related("member__user", "officer")
 
     status = request.GET.get("status")
     if status:
         loans = loans.filter(status=status)
 
+    page = keyset_paginate(request, loans, ("-created_at", "-id"))
     return render(request, "manager/loan_list.html", {
-        "loans": loans,
+        "loans": page.object_list,
+        "page": page,
         "status": status,
     })
 
@@ -103,14 +105,17 @@ def loan_list(request):
 @login_required
 @manager_required
 def loan_detail(request, loan_id):
-    office = request.user.office
-    loan = get_object_or_404(Loan, id=loan_id, officer__office=office)
+    office_id = request.principal.office_id
+    loan = get_object_or_404(Loan.objects.select_related("member__user", "officer"), id=loan_id, officer__office_id=office_id)
 
     repayments = loan.repayments.all()
+    as_of = BalanceAsOfForm(request.GET).day()
 
     return render(request, "manager/loan_detail.html", {
         "loan": loan,
         "repayments": repayments,
+        "balance": loan_balance(loan, as_of),
+        "as_of": as_of,
     })
 
 
@@ -120,11 +125,13 @@ def loan_detail(request, loan_id):
 @login_required
 @manager_required
 def repayment_list(request):
-    office = request.user.office
-    repayments = Repayment.objects.filter(loan__officer__office=office).select_related("loan")
+    office_id = request.principal.office_id
+    repayments = Repayment.objects.filter(loan__officer__office_id=office_id).select_related("loan__member__user")
 
+    page = keyset_paginate(request, repayments, ("-paid_at", "-id"))
     return render(request, "manager/repayment_list.html", {
-        "repayments": repayments,
+        "repayments": page.object_list,
+        "page": page,
     })
 
 
@@ -134,50 +141,69 @@ def repayment_list(request):
 @login_required
 @manager_required
 def report_list(request):
-    office = request.user.office
-    officers = User.objects.filter(role="OFFICER", office=office)
-    loans = Loan.objects.filter(officer__in=officers)
-
-    reports = {
-        "total_loans": loans.count(),
-        "active_loans": loans.exclude(status__in=["CLOSED", "REJECTED"]).count(),
-        "closed_loans": loans.filter(status="CLOSED").count(),
-        "pending_loans": loans.filter(status="PENDING").count(),
-        "overdue_loans": loans.filter(balance__gt=0, status="DISBURSED").count(),
-        "total_repayments": Repayment.objects.filter(loan__in=loans).aggregate(Sum("amount"))["amount__sum"] or 0,
-    }
+    office_id = request.principal.office_id
+    form = ManagerReportForm(request.GET or None, office=office_id)
+    filters = form.cleaned_data if form.is_valid() else {}
+
+    log = get_report("office", office_id, filters, request.user, refresh="refresh" in request.GET)
+    return render(request, "manager/report_list.html", {
+        **report_context(log),
+        "form": form,
+        "history": recent_reports(office_key(office_id)),
+    })
 
-    # Log report
-    ReportLog.objects.create(
-        generated_by=request.user,
-        report_type="Manager Office Report"
-    )
 
-    return render(request, "manager/report_list.html", {"reports": reports})
+@login_required
+@manager_required
+def report_detail(request, report_id):
+    # a stored snapshot of this office: one row read
+    log = get_object_or_404(ReportLog, pk=report_id, scope=office_key(request.principal.office_id))
+    return render(request, "manager/report_list.html", report_context(log))
 
 
 # -------------------------------
-# Export members/loans to CSV
+# Export members/loans/repayments to CSV (streamed)
 # -------------------------------
+def _no_office(request):
+    # office_id=None would match every office-less member, loan and repayment
+    messages.error(request, "You are not assigned to an office, so there is nothing to export.")
+    return redirect("manager_dashboard")
+
+
 @login_required
 @manager_required
 def export_members_csv(request):
-    office = request.user.office
-    members = MemberProfile.objects.filter(user__office=office)
+    office_id = request.principal.office_id
+    if office_id is None:
+        return _no_office(request)
+    return exports.stream_csv(
+        f"members_office_{office_id}_{datetime.date.today()}.csv",
+        exports.MEMBER_HEADER,
+        exports.member_rows(MemberProfile.objects.filter(user__office_id=office_id)),
+    )
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="members_office_{office.id}_{datetime.date.today()}.csv"'
 
-    writer = csv.writer(response)
-    writer.writerow(['ID', 'Name', 'Email', 'Phone', 'National ID'])
+@login_required
+@manager_required
+def export_loans_csv(request):
+    office_id = request.principal.office_id
+    if office_id is None:
+        return _no_office(request)
+    return exports.stream_csv(
+        f"loans_office_{office_id}_{datetime.date.today()}.csv",
+        exports.LOAN_HEADER,
+        exports.loan_rows(Loan.objects.filter(officer__office_id=office_id)),
+    )
 
-    for m in members:
-        writer.writerow([
-            m.id,
-            f"{m.user.first_name} {m.user.last_name}",
-            m.user.email,
-            m.phone_number,
-            m.national_id,
-        ])
 
-    return response
+@login_required
+@manager_required
+def export_repayments_csv(request):
+    office_id = request.principal.office_id
+    if office_id is None:
+        return _no_office(request)
+    return exports.stream_csv(
+        f"repayments_office_{office_id}_{datetime.date.today()}.csv",
+        exports.REPAYMENT_HEADER,
+        exports.repayment_rows(Repayment.objects.filter(loan__officer__office_id=office_id)),
+    )
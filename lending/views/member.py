@@ -1,43 +1,31 @@
 # lending/views/member.py
 
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum
-from django.db.models.functions import TruncMonth
 from ..models import Loan, Repayment, MemberProfile, LoanPolicy
-from ..forms import MemberProfileForm, LoanApplicationForm
+from ..services.assignment import pick_officer
+from ..services.ledger import loan_balance
+from ..services.member_summary import aget_summary
+from ..forms import BalanceAsOfForm, MemberProfileForm, LoanApplicationForm
 from .mixins import member_required
 
 @login_required
 @member_required
-def member_dashboard(request):
-    profile = getattr(request.user, "profile", None)
-    loans = Loan.objects.filter(member=profile).order_by("-created_at")
-    active_loans = loans.filter(status__in=["PENDING", "APPROVED", "DISBURSED"])
-    closed_loans = loans.filter(status="CLOSED")
-    repayments = Repayment.objects.filter(loan__member=profile).order_by("-paid_at")
-    recent_repayments = repayments[:5]
-
-    total_loans = loans.count()
-    total_principal = loans.aggregate(total=Sum("principal_amount"))["total"] or 0
-    total_repaid = repayments.aggregate(total=Sum("amount"))["total"] or 0
-    outstanding_balance = max(total_principal - total_repaid, 0)
-
-    repayment_trend = (
-        repayments.annotate(month=TruncMonth("paid_at"))
-        .values("month").annotate(total=Sum("amount")).order_by("month")
-    )
-
-    return render(request, "dashboard/member.html", {
-        "profile": profile,
-        "active_loans": active_loans,
-        "closed_loans": closed_loans,
-        "recent_repayments": recent_repayments,
-        "total_loans": total_loans,
-        "total_principal": total_principal,
-        "total_repaid": total_repaid,
-        "outstanding_balance": outstanding_balance,
+async def member_dashboard(request):
+    # the member's summary and trend, from the cache (two row reads on a miss)
+    summary, repayment_trend = await aget_summary(request.principal.profile_id)
+
+    return await sync_to_async(render)(request, "dashboard/member.html", {
+        "active_loans": summary.active_loans,
+        "recent_repayments": summary.recent_repayments,
+        "total_loans": summary.loans_total,
+        "active_count": summary.loans_active,
+        "closed_count": summary.loans_closed,
+        "total_principal": summary.principal_total,
+        "total_repaid": summary.total_repaid,
+        "outstanding_balance": summary.outstanding_balance,
         "repayment_trend": repayment_trend,
     })
 
@@ -66,59 +54,75 @@ from django.contrib import messages
 from ..models import LoanPolicy, MemberProfile, Loan
 from ..forms import LoanApplicationForm
 from ..decorators import member_required
+from ..pagination import keyset_paginate
+from ..services.schedule import amount_in_arrears, next_installment
 
 @login_required
 @member_required
 def loan_apply(request):
-    profile = get_object_or_404(MemberProfile, user=request.user)
+    profile = get_object_or_404(MemberProfile, pk=request.principal.profile_id)
+    company_id = request.principal.company_id
     if request.method == "POST":
-        form = LoanApplicationForm(request.POST, member=profile)
+        form = LoanApplicationForm(request.POST, member=profile, company_id=company_id)
         if form.is_valid():
             loan = form.save(commit=False)
             loan.member = profile
             loan.interest_rate = loan.policy.interest_rate
+            loan.interest_method = loan.policy.interest_method
+            loan.officer_id = pick_officer(request.principal.office_id)
             loan.save()
             messages.success(request, "✅ Loan application submitted successfully.")
             return redirect("loan_list")
     else:
-        form = LoanApplicationForm(member=profile)
+        form = LoanApplicationForm(member=profile, company_id=company_id)
     return render(request, "member/loan_apply.html", {"form": form})
 
 
 @login_required
 @member_required
 def loan_list(request):
-    profile = get_object_or_404(MemberProfile, user=request.user)
-    loans = profile.loans.order_by("-created_at")
-    return render(request, "member/loan_list.html", {"loans": loans})
+    loans = Loan.objects.filter(member_id=request.principal.profile_id).select_related("policy")
+    page = keyset_paginate(request, loans, ("-created_at", "-id"))
+    return render(request, "member/loan_list.html", {"loans": page.object_list, "page": page})
 
 
 @login_required
 @member_required
 def loan_detail(request, pk):
-    loan = get_object_or_404(Loan, pk=pk, member__user=request.user)
-    return render(request, "member/loan_detail.html", {"loan": loan})
+    loan = get_object_or_404(Loan.objects.select_related("policy"), pk=pk, member_id=request.principal.profile_id)
+    as_of = BalanceAsOfForm(request.GET).day()
+    return render(request, "member/loan_detail.html", {
+        "loan": loan,
+        "balance": loan_balance(loan, as_of),
+        "as_of": as_of,
+        "repayments": loan.repayments.order_by("-paid_at"),
+        "installments": loan.installments.all(),
+        "next_installment": next_installment(loan),
+        "arrears": amount_in_arrears(loan),
+    })
 
 
 @login_required
 @member_required
 def loan_edit(request, pk):
-    loan = get_object_or_404(Loan, pk=pk, member__user=request.user, status="PENDING")
+    loan = get_object_or_404(Loan, pk=pk, member_id=request.principal.profile_id, status="PENDING")
     if request.method == "POST":
-        form = LoanApplicationForm(request.POST, instance=loan, member=loan.member)
+        form = LoanApplicationForm(
+            request.POST, instance=loan, member=loan.member, company_id=request.principal.company_id
+        )
         if form.is_valid():
             form.save()
             messages.success(request, "✏️ Loan application updated successfully.")
             return redirect("loan_list")
     else:
-        form = LoanApplicationForm(instance=loan, member=loan.member)
+        form = LoanApplicationForm(instance=loan, member=loan.member, company_id=request.principal.company_id)
     return render(request, "member/loan_edit.html", {"form": form, "loan": loan})
 
 
 @login_required
 @member_required
 def loan_delete(request, pk):
-    loan = get_object_or_404(Loan, pk=pk, member__user=request.user, status="PENDING")
+    loan = get_object_or_404(Loan, pk=pk, member_id=request.principal.profile_id, status="PENDING")
     if request.method == "POST":
         loan.delete()
         messages.success(request, "🗑️ Loan application deleted.")
@@ -130,6 +134,6 @@ def loan_delete(request, pk):
 @login_required
 @member_required
 def repayment_history(request):
-    profile = get_object_or_404(MemberProfile, user=request.user)
-    repayments = Repayment.objects.filter(loan__member=profile).order_by("-paid_at")
-    return render(request, "member/repayment_history.html", {"repayments": repayments})
+    repayments = Repayment.objects.filter(loan__member_id=request.principal.profile_id)
+    page = keyset_paginate(request, repayments, ("-paid_at", "-id"))
+    return render(request, "member/repayment_history.html", {"repayments": page.object_list, "page": page})
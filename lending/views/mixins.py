@@ -1,12 +1,25 @@
 # lending/views/mixins.py
+from asgiref.sync import iscoroutinefunction
 from django.core.exceptions import PermissionDenied
 from functools import wraps
 
+from ..principal import aget_principal, get_principal
+
 def role_required(*allowed_roles):
     def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                principal = await aget_principal(request)
+                if principal is not None and principal.role in allowed_roles:
+                    return await view_func(request, *args, **kwargs)
+                raise PermissionDenied
+            return async_wrapper
+
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            if request.user.is_authenticated and request.user.role in allowed_roles:
+            principal = get_principal(request)
+            if principal is not None and principal.role in allowed_roles:
                 return view_func(request, *args, **kwargs)
             raise PermissionDenied
         return wrapper
@@ -1,15 +1,26 @@
 # lending/views/officer.py
 
-import datetime
-import csv
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Sum
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 
 from ..decorators import officer_required
-from ..models import User, Loan, MemberProfile, Repayment, ReportLog
+from ..forms import BalanceAsOfForm, ManagerReportForm
+from ..pagination import keyset_paginate, offset_paginate
+from ..models import Loan, MemberProfile, Repayment, ReportLog
+from ..services.ledger import loan_balance
+from ..services.report_snapshots import get_report, recent_reports, report_context
+from ..services.search import search_members
+from ..services.loan_actions import TRANSITIONS, transition_loans
+from ..services.stats import aget_stats, officer_key
+
+ACTION_MESSAGES = {"approve": "✅ Loan approved.", "reject": "❌ Loan rejected.", "disburse": "💸 Loan disbursed."}
+ACTION_VERBS = {"approve": "approved", "reject": "rejected", "disburse": "disbursed"}
+SKIPPED_SHOWN = 20
 
 
 # -------------------------------
@@ -17,17 +28,15 @@ from ..models import User, Loan, MemberProfile, Repayment, ReportLog
 # -------------------------------
 @login_required
 @officer_required
-def officer_dashboard(request):
-    loans = Loan.objects.filter(officer=request.user)
-    repayments = Repayment.objects.filter(loan__officer=request.user)
-
+async def officer_dashboard(request):
+    row = await aget_stats(officer_key(request.principal.user_id))
     stats = {
-        "my_loans_total": loans.count(),
-        "my_loans_pending": loans.filter(status="PENDING").count(),
-        "my_loans_disbursed": loans.filter(status="DISBURSED").count(),
-        "repayments_total": repayments.aggregate(Sum("amount"))["amount__sum"] or 0,
+        "my_loans_total": row.loans_total,
+        "my_loans_pending": row.loans_pending,
+        "my_loans_disbursed": row.loans_disbursed,
+        "repayments_total": row.total_repaid,
     }
-    return render(request, "officer/dashboard.html", {"stats": stats})
+    return await sync_to_async(render)(request, "officer/dashboard.html", {"stats": stats})
 
 
 # -------------------------------
@@ -36,20 +45,21 @@ def officer_dashboard(request):
 @login_required
 @officer_required
 def member_list(request):
-    office = request.user.office
+    office_id = request.principal.office_id
     search = request.GET.get("q")
 
-    members = MemberProfile.objects.filter(user__office=office).select_related("user")
+    members = MemberProfile.objects.filter(user__office_id=office_id).select_related("user")
     if search:
-        members = members.filter(
-            Q(user__first_name__icontains=search) |
-            Q(user__last_name__icontains=search) |
-            Q(user__email__icontains=search) |
-            Q(national_id__icontains=search)
+        # ranked matches from the search index, best first, paged by number
+        page = offset_paginate(
+            request, lambda offset, limit: search_members(members, search, office_id=office_id, limit=limit, offset=offset),
         )
+    else:
+        page = keyset_paginate(request, members, ("-id",))
 
     return render(request, "officer/member_list.html", {
-        "members": members,
+        "members": page.object_list,
+        "page": page,
         "search_query": search,
     })
 
@@ -60,15 +70,18 @@ def member_list(request):
 @login_required
 @officer_required
 def loan_list(request):
-    loans = Loan.objects.filter(officer=request.user).select_related("member")
+    loans = Loan.objects.filter(officer=request.user).select_related("member__user")
 
     status = request.GET.get("status")
     if status:
         loans = loans.filter(status=status)
 
+    page = keyset_paginate(request, loans, ("-created_at", "-id"))
     return render(request, "officer/loan_list.html", {
-        "loans": loans,
+        "loans": page.object_list,
+        "page": page,
         "status": status,
+        "loan_statuses": Loan.STATUS_CHOICES,
     })
 
 
@@ -78,47 +91,73 @@ def loan_list(request):
 @login_required
 @officer_required
 def loan_detail(request, loan_id):
-    loan = get_object_or_404(Loan, id=loan_id, officer=request.user)
+    loan = get_object_or_404(Loan.objects.select_related("member__user"), id=loan_id, officer=request.user)
 
     if request.method == "POST":
         action = request.POST.get("action")
-        if action == "approve":
-            loan.status = "APPROVED"
-            loan.approved_at = datetime.datetime.now()
-            loan.save()
-            messages.success(request, "✅ Loan approved.")
-        elif action == "reject":
-            loan.status = "REJECTED"
-            loan.save()
-            messages.success(request, "❌ Loan rejected.")
-        elif action == "disburse":
-            if loan.status == "APPROVED":
-                loan.status = "DISBURSED"
-                loan.disbursed_at = datetime.datetime.now()
-                loan.save()
-                messages.success(request, "💸 Loan disbursed.")
+        if action in TRANSITIONS:
+            result = transition_loans([loan.id], action, officer_id=request.principal.user_id)
+            if result["changed"]:
+                messages.success(request, ACTION_MESSAGES[action])
             else:
-                messages.error(request, "⚠️ Only approved loans can be disbursed.")
+                messages.error(request, f"⚠️ Loan {result['skipped'][loan.id]}; it can't be {ACTION_VERBS[action]}.")
 
         return redirect("officer_loan_detail", loan_id=loan.id)
 
     repayments = loan.repayments.all()
+    as_of = BalanceAsOfForm(request.GET).day()
     return render(request, "officer/loan_detail.html", {
         "loan": loan,
         "repayments": repayments,
+        "installments": loan.installments.all(),
+        "balance": loan_balance(loan, as_of),
+        "as_of": as_of,
     })
 
 
+# -------------------------------
+# Batch approve/reject/disburse (from the loan list)
+# -------------------------------
+@login_required
+@officer_required
+@require_POST
+def loan_batch_action(request):
+    action = request.POST.get("action")
+    loan_ids = [pk for pk in request.POST.getlist("loan_ids") if pk.isdigit()]
+    next_url = request.POST.get("next")
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        next_url = reverse("officer_loan_list")
+
+    if action not in TRANSITIONS or not loan_ids:
+        messages.error(request, "⚠️ Select some loans and an action.")
+        return redirect(next_url)
+
+    result = transition_loans(loan_ids, action, officer_id=request.principal.user_id)
+    if result["changed"]:
+        messages.success(request, f"✅ {len(result['changed'])} loan(s) {ACTION_VERBS[action]}.")
+    if result["skipped"]:
+        shown = ", ".join(f"#{pk} {reason}" for pk, reason in list(result["skipped"].items())[:SKIPPED_SHOWN])
+        more = len(result["skipped"]) - SKIPPED_SHOWN
+        messages.warning(
+            request,
+            f"⚠️ Skipped {len(result['skipped'])} loan(s) that can't be {ACTION_VERBS[action]}: {shown}"
+            + (f" and {more} more." if more > 0 else "."),
+        )
+    return redirect(next_url)
+
+
 # -------------------------------
 # Repayment List (Officer’s loans only)
 # -------------------------------
 @login_required
 @officer_required
 def repayment_list(request):
-    repayments = Repayment.objects.filter(loan__officer=request.user).select_related("loan")
+    repayments = Repayment.objects.filter(loan__officer=request.user).select_related("loan__member__user")
 
+    page = keyset_paginate(request, repayments, ("-paid_at", "-id"))
     return render(request, "officer/repayment_list.html", {
-        "repayments": repayments,
+        "repayments": page.object_list,
+        "page": page,
     })
 
 
@@ -128,20 +167,21 @@ def repayment_list(request):
 @login_required
 @officer_required
 def report_list(request):
-    loans = Loan.objects.filter(officer=request.user)
-    reports = {
-        "total_loans": loans.count(),
-        "active_loans": loans.exclude(status__in=["CLOSED", "REJECTED"]).count(),
-        "closed_loans": loans.filter(status="CLOSED").count(),
-        "pending_loans": loans.filter(status="PENDING").count(),
-        "overdue_loans": loans.filter(balance__gt=0, status="DISBURSED").count(),
-        "total_repayments": Repayment.objects.filter(loan__in=loans).aggregate(Sum("amount"))["amount__sum"] or 0,
-    }
+    form = ManagerReportForm(request.GET or None, officer=request.user)
+    filters = form.cleaned_data if form.is_valid() else {}
+
+    officer_id = request.principal.user_id
+    log = get_report("officer", officer_id, filters, request.user, refresh="refresh" in request.GET)
+    return render(request, "officer/report_list.html", {
+        **report_context(log),
+        "form": form,
+        "history": recent_reports(officer_key(officer_id)),
+    })
 
-    # log officer report
-    ReportLog.objects.create(
-        generated_by=request.user,
-        report_type="Officer Performance Report"
-    )
 
-    return render(request, "officer/report_list.html", {"reports": reports})
+@login_required
+@officer_required
+def report_detail(request, report_id):
+    # a stored snapshot of this officer's book: one row read
+    log = get_object_or_404(ReportLog, pk=report_id, scope=officer_key(request.principal.user_id))
+    return render(request, "officer/report_list.html", report_context(log))
@@ -0,0 +1,23 @@
+# lending/views/payments.py
+
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from ..services.payment_inbox import SIGNATURE_HEADER, InvalidCallback, receive
+
+
+# -------------------------------
+# Payment provider callbacks
+# -------------------------------
+@csrf_exempt
+@require_POST
+def payment_callback(request):
+    """Queue the payment for drain_payment_inbox and acknowledge at once."""
+    try:
+        callback = receive(request.body, request.headers.get(SIGNATURE_HEADER))
+    except PermissionError:
+        return JsonResponse({"error": "bad signature"}, status=403)
+    except InvalidCallback as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse({"accepted": callback.transaction_id}, status=202)
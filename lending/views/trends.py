@@ -0,0 +1,90 @@
+# lending/views/trends.py
+
+import datetime
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+
+from ..decorators import admin_required, manager_required, officer_required
+from ..forms import TrendForm
+from ..models import User
+from ..services.rollups import policy_key, trend
+from ..services.stats import GLOBAL, office_key, officer_key
+
+DEFAULT_DAYS = 365
+
+
+def _trend_response(form, key):
+    """The series of `key` over the form's range: the last DEFAULT_DAYS days by default."""
+    end = form.cleaned_data["end_date"] or timezone.localdate()
+    start = form.cleaned_data["start_date"] or end - datetime.timedelta(days=DEFAULT_DAYS - 1)
+    interval = form.cleaned_data["interval"] or "day"
+    return JsonResponse({
+        "scope": key,
+        "start": start,
+        "end": end,
+        "interval": interval,
+        "series": trend(key, start, end, interval),
+    })
+
+
+def _valid(form, allowed=()):
+    """Validate the form, refusing the scope parameters not in `allowed`."""
+    if form.is_valid():
+        for name in {"office", "officer", "policy"} - set(allowed):
+            if form.cleaned_data[name]:
+                form.add_error(name, "You can't choose this scope.")
+    return form.is_valid()
+
+
+def _invalid(form):
+    return JsonResponse({"errors": form.errors}, status=400)
+
+
+# -------------------------------
+# Trend series (read from the daily rollups)
+# -------------------------------
+@login_required
+@admin_required
+def admin_trend(request):
+    """Company-wide, or one office / officer / policy."""
+    form = TrendForm(request.GET)
+    if not _valid(form, ("office", "officer", "policy")):
+        return _invalid(form)
+    data = form.cleaned_data
+    if data["office"]:
+        key = office_key(data["office"])
+    elif data["officer"]:
+        key = officer_key(data["officer"])
+    elif data["policy"]:
+        key = policy_key(data["policy"])
+    else:
+        key = GLOBAL
+    return _trend_response(form, key)
+
+
+@login_required
+@manager_required
+def manager_trend(request):
+    """The manager's office, or one officer of it."""
+    office_id = request.principal.office_id
+    form = TrendForm(request.GET)
+    if not _valid(form, ("officer",)):
+        return _invalid(form)
+    officer_id = form.cleaned_data["officer"]
+    if officer_id is None:
+        return _trend_response(form, office_key(office_id))
+    if not User.objects.filter(pk=officer_id, role="OFFICER", office_id=office_id).exists():
+        return JsonResponse({"errors": {"officer": ["Not an officer of your office."]}}, status=404)
+    return _trend_response(form, officer_key(officer_id))
+
+
+@login_required
+@officer_required
+def officer_trend(request):
+    """The officer's own book."""
+    form = TrendForm(request.GET)
+    if not _valid(form):
+        return _invalid(form)
+    return _trend_response(form, officer_key(request.principal.user_id))
@@ -2,6 +2,9 @@
 ASGI config for lending_system project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn lending_system.asgi:application``)
+so the async dashboard views run on the event loop; under WSGI Django runs
+them through async_to_sync, one event loop per request.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
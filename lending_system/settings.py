@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'lending.querycount.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -122,6 +123,49 @@ AUTH_USER_MODEL = "lending.User"
 
 # settings.py
 AUTHENTICATION_BACKENDS = [
-    "lending.auth_backends.EmailOrPhoneBackend",  # custom
-    "django.contrib.auth.backends.ModelBackend", # fallback
+    "lending.auth_backends.EmailOrPhoneBackend",  # email / phone / username, one lookup
 ]
+
+# Country code added to local phone numbers when normalizing login identifiers
+LENDING_DEFAULT_COUNTRY_CODE = "254"
+
+# Count SQL per request and log N+1 patterns (lending.querycount)
+LENDING_QUERY_INSPECTOR = DEBUG
+
+# Caches. The cached principals (lending.principal), member summaries and
+# officer workload counters are dropped by the write paths, and those drops
+# reach every web worker and command only through a shared cache: set
+# LENDING_CACHE_URL (e.g. redis://127.0.0.1:6379/0) wherever more than one
+# process runs. The per-process default is for development and tests;
+# `manage.py check --deploy` reports it (lending.checks).
+LENDING_CACHE_URL = os.environ.get("LENDING_CACHE_URL", "")
+if LENDING_CACHE_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": LENDING_CACHE_URL}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Async dashboards run their independent reads at once, one connection per
+# query thread (lending.concurrency); False runs them one after another
+LENDING_CONCURRENT_QUERIES = True
+LENDING_QUERY_THREADS = 8
+
+# New applications go to the office's officer with the fewest open loans
+# ("least_loaded") or to each officer in turn ("round_robin")
+LENDING_ASSIGNMENT_STRATEGY = "least_loaded"
+
+# Order in which a receipt pays a member's active loans when reconciling by
+# phone (lending.services.reconciliation): "oldest_due_first" or
+# "smallest_balance_first"
+LENDING_RECONCILIATION_RULE = "oldest_due_first"
+
+# Shared secret payment providers sign callbacks with (X-Callback-Signature,
+# HMAC-SHA256 of the body); empty refuses every callback
+LENDING_CALLBACK_SECRET = os.environ.get("LENDING_CALLBACK_SECRET", "")
+
+# Stored report snapshots (lending.services.report_snapshots): reused for this
+# many seconds; background reports run on a thread pool ("thread") or wait for
+# `manage.py run_report_jobs` ("worker"); a report still running after
+# LENDING_REPORT_TIMEOUT seconds is taken to have lost its runner and is run again
+LENDING_REPORT_MAX_AGE = 15 * 60
+LENDING_REPORT_RUNNER = "thread"
+LENDING_REPORT_TIMEOUT = 30 * 60